@@ -2,7 +2,7 @@
 import streamlit as st
 from ui_component import UIComponents
 from config import PAGE_CONFIG
-import joblib
+from model_registry import phishing_model_registry
 import os
 import logging
 
@@ -31,6 +31,9 @@ logger = logging.getLogger(__name__)
 # 로그 기록 테스트
 logger.info("DeepMail 로그 시스템 작동 시작")
 
+# 첫 화면을 기다리지 않도록 피싱 모델을 백그라운드에서 미리 로드
+phishing_model_registry.warm_up()
+
 def main():
     UIComponents.initialize_session_state()
     st.set_page_config(**PAGE_CONFIG)
@@ -38,11 +41,8 @@ def main():
 
     UIComponents.render_sidebar()
     
-    # 모델 로드
-    model_dict = None
-    model_path = os.path.join(os.path.dirname(__file__), '../models/rf_phishing_model.pkl')
-    if os.path.exists(model_path):
-        model_dict = joblib.load(model_path)
+    # 모델 로드 (프로세스당 한 번, 파일이 바뀌었을 때만 다시 로드)
+    model_dict = phishing_model_registry.get()
 
     # 메일 데이터 준비
     messages = st.session_state.get('gmail_messages', [])
@@ -0,0 +1,402 @@
+"""
+DeepMail - 피싱 판별 모델 오프라인 벤치마크 모듈
+
+사용 예시:
+    python benchmark.py --sizes 100,1000
+    python benchmark.py --compare cache/benchmarks/이전.json cache/benchmarks/이후.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from config import BENCHMARK_CONFIG, MODEL_CONFIG, ONLINE_MODEL_CONFIG, BULK_PARSE_CONFIG
+
+MAIL_KINDS = ('plain', 'html', 'url_dense', 'mixed')
+
+EN_WORDS = (
+    'meeting schedule report attached please review invoice payment account update team project '
+    'quarterly budget deadline follow up thanks regards customer support delivery order shipping '
+    'security password verify login urgent suspended confirm identity bank transfer refund prize'
+).split()
+KO_WORDS = (
+    '안녕하세요 회의 일정 보고서 첨부 확인 부탁드립니다 결제 계정 업데이트 프로젝트 예산 마감 '
+    '감사합니다 고객 지원 배송 주문 보안 비밀번호 로그인 긴급 정지 본인 인증 은행 이체 환불 당첨'
+).split()
+DOMAINS = (
+    'example.com', 'mail.example.org', 'secure-login.example.net', 'bank.example.co.kr',
+    'bit.example.ly', 'cdn.example.com', 'shop.example.kr', 'verify-account.example.info'
+)
+
+
+def _sentence(rng, words, length):
+    return ' '.join(rng.choice(words) for _ in range(length))
+
+
+def _url(rng):
+    path = '/'.join(rng.choice(EN_WORDS) for _ in range(rng.randint(1, 3)))
+    return f"{rng.choice(('http', 'https'))}://{rng.choice(DOMAINS)}/{path}?id={rng.randint(1000, 99999)}"
+
+
+def _make_mail(rng, kind, index, seed):
+    subject = _sentence(rng, EN_WORDS, rng.randint(3, 8))
+    body_text, body_html = '', ''
+
+    if kind == 'plain':
+        body_text = '\n\n'.join(_sentence(rng, EN_WORDS, rng.randint(20, 60)) for _ in range(rng.randint(2, 6)))
+    elif kind == 'html':
+        # 스타일/표/중첩 태그가 많은 마케팅 메일 형태 (텍스트 본문 없음)
+        rows = ''.join(
+            f'<tr><td style="padding:4px;color:#333">{_sentence(rng, EN_WORDS, 6)}</td>'
+            f'<td><a href="{_url(rng)}"><img src="https://{rng.choice(DOMAINS)}/img{i}.png" width="80"></a></td></tr>'
+            for i in range(rng.randint(5, 20))
+        )
+        body_html = (
+            '<html><head><style>td { font-family: sans-serif; }</style></head><body>'
+            f'<div class="wrapper"><h1>{subject}</h1><table>{rows}</table>'
+            f'<p>{_sentence(rng, EN_WORDS, 40)}</p></div></body></html>'
+        )
+    elif kind == 'url_dense':
+        lines = [f"{_sentence(rng, EN_WORDS, rng.randint(3, 8))} {_url(rng)}" for _ in range(rng.randint(10, 40))]
+        body_text = '\n'.join(lines)
+        body_html = '<br>'.join(f'<a href="{_url(rng)}">{line}</a>' for line in lines[:10])
+    else:
+        subject = f"[{rng.choice(KO_WORDS)}] {_sentence(rng, KO_WORDS + EN_WORDS, rng.randint(3, 8))}"
+        body_text = '\n'.join(
+            f"{_sentence(rng, KO_WORDS, rng.randint(8, 20))} {_sentence(rng, EN_WORDS, rng.randint(2, 6))}"
+            for _ in range(rng.randint(3, 10))
+        )
+        if rng.random() < 0.5:
+            body_text += f"\n{_url(rng)}"
+
+    return {
+        'id': f'bench-{seed}-{index:06d}',
+        'kind': kind,
+        'subject': subject,
+        'body_text': body_text,
+        'body_html': body_html
+    }
+
+
+def generate_corpus(size, seed=None):
+    """결정적 합성 메일 말뭉치 생성 (같은 size/seed면 항상 같은 메일)
+
+    네 종류(plain, html, url_dense, mixed)를 순서대로 번갈아 만듭니다.
+    반환값: [{'id', 'kind', 'subject', 'body_text', 'body_html'}, ...]
+    """
+    seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+    rng = random.Random(seed)
+    return [_make_mail(rng, MAIL_KINDS[index % len(MAIL_KINDS)], index, seed) for index in range(size)]
+
+
+def _load_rf_sklearn(paths):
+    """rf_phishing_model.pkl을 sklearn predict_proba 그대로 사용"""
+    import joblib
+    from features import feature_extractor
+
+    model = joblib.load(paths['rf_model'], mmap_mode=MODEL_CONFIG['mmap_mode'])
+    vectorizer, classifier = model['vectorizer'], model['classifier']
+    column = list(classifier.classes_).index(1)
+
+    def score_many(messages):
+        X = feature_extractor.raw_text_matrix(feature_extractor.extract_many(messages), vectorizer)
+        return classifier.predict_proba(X)[:, column]
+
+    return score_many, None
+
+
+def _load_rf_flat(paths):
+    """rf_phishing_model.pkl을 배열 포레스트 엔진(forest_engine)으로 컴파일해 사용"""
+    import joblib
+    from features import feature_extractor
+    from forest_engine import compile_forest
+
+    model = joblib.load(paths['rf_model'], mmap_mode=MODEL_CONFIG['mmap_mode'])
+    vectorizer = model['vectorizer']
+    engine = compile_forest(model['classifier'])
+    if engine is None:
+        raise RuntimeError('배열 엔진으로 컴파일할 수 없는 모델입니다.')
+    column = list(engine.classes_).index(1)
+
+    def score_many(messages):
+        X = feature_extractor.raw_text_matrix(feature_extractor.extract_many(messages), vectorizer)
+        return engine.predict_proba(X)[:, column]
+
+    return score_many, None
+
+
+def _load_model_pred(paths):
+    """models/model_pred - 메일별 지연은 predict_phishing, 처리량은 배치 예측기로 측정"""
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
+    if models_dir not in sys.path:
+        sys.path.append(models_dir)
+    from model_pred import get_predictor, predict_phishing
+
+    for path in (paths['tfidf'], paths['pred_model']):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+    predictor = get_predictor(paths['tfidf'], paths['pred_model'])
+
+    def score_one(message):
+        body = message['body_text'] if len(message['body_text'].strip()) >= 10 else message['body_html']
+        return predict_phishing(message['subject'], body, paths['tfidf'], paths['pred_model'])['phishing_prob']
+
+    return predictor.predict_proba_messages, score_one
+
+
+def _load_online(paths):
+    """사용자 피드백으로 학습된 온라인 모델 (학습 전이면 건너뜀)"""
+    from online_model import OnlinePhishingModel
+
+    if not os.path.exists(paths['online_model']):
+        raise FileNotFoundError(paths['online_model'])
+    model = OnlinePhishingModel(paths['online_model'])
+    if not model.is_ready:
+        raise RuntimeError('정상/피싱 예시를 모두 학습하지 않은 온라인 모델입니다.')
+    return model.predict_proba, None
+
+
+# 벤치마크 대상 - 새 엔진을 추가하면 여기에 로더를 등록
+TARGETS = {
+    'rf_sklearn': _load_rf_sklearn,
+    'rf_flat': _load_rf_flat,
+    'model_pred': _load_model_pred,
+    'online': _load_online
+}
+
+
+def default_paths():
+    return {
+        'rf_model': MODEL_CONFIG['path'],
+        'tfidf': BENCHMARK_CONFIG['tfidf_path'],
+        'pred_model': BENCHMARK_CONFIG['pred_model_path'],
+        'online_model': ONLINE_MODEL_CONFIG['path']
+    }
+
+
+def _peak_rss_mb():
+    """현재 프로세스의 최대 RSS (MB, 측정 불가 플랫폼이면 None)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 바이트, Linux는 KB 단위
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _percentiles_ms(seconds):
+    if not seconds:
+        return {}
+    values = np.array(seconds) * 1000
+    return {
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p90': round(float(np.percentile(values, 90)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+        'max': round(float(values.max()), 3)
+    }
+
+
+def run_case(target, size, paths, seed, latency_samples):
+    """대상 하나를 말뭉치 크기 하나로 측정 (벤치마크 워커 프로세스에서 실행)"""
+    from features import feature_extractor
+
+    result = {'target': target, 'size': size}
+    started = time.perf_counter()
+    try:
+        score_many, score_one = TARGETS[target](paths)
+    except FileNotFoundError as e:
+        return {**result, 'status': 'missing', 'detail': str(e)}
+    except Exception as e:
+        return {**result, 'status': 'error', 'detail': f"{type(e).__name__}: {str(e)}"}
+    result['load_seconds'] = round(time.perf_counter() - started, 4)
+
+    score_one = score_one or (lambda message: score_many([message])[0])
+    corpus = generate_corpus(size, seed)
+
+    # 첫 호출(지연 초기화 포함)은 말뭉치 밖의 메일로 따로 기록
+    started = time.perf_counter()
+    score_one({'id': 'bench-warmup', 'subject': 'warm up', 'body_text': 'warm up mail body', 'body_html': ''})
+    result['first_call_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+    # 메일별 지연 - 특징 캐시를 비우고 메일마다 한 번씩 (앱의 단일 메일 검사와 같은 조건)
+    feature_extractor.clear()
+    latencies, by_kind = [], {}
+    for message in corpus[:latency_samples]:
+        started = time.perf_counter()
+        score_one(message)
+        elapsed = time.perf_counter() - started
+        latencies.append(elapsed)
+        by_kind.setdefault(message['kind'], []).append(elapsed)
+    result['latency_ms'] = _percentiles_ms(latencies)
+    result['latency_ms_by_kind'] = {kind: _percentiles_ms(values) for kind, values in by_kind.items()}
+
+    # 배치 처리량 - 캐시를 다시 비우고 말뭉치 전체를 한 번에
+    feature_extractor.clear()
+    started = time.perf_counter()
+    scores = np.asarray(score_many(corpus), dtype=float)
+    elapsed = time.perf_counter() - started
+    result['batch_seconds'] = round(elapsed, 4)
+    result['throughput_per_sec'] = round(size / elapsed, 1) if elapsed > 0 else None
+    result['mean_score'] = round(float(scores.mean()), 6) if len(scores) else None
+
+    result['peak_rss_mb'] = _peak_rss_mb()
+    result['status'] = 'ok'
+    return result
+
+
+def _git_commit():
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10
+        )
+        return output.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _versions():
+    versions = {'python': platform.python_version()}
+    for name in ('numpy', 'scipy', 'sklearn', 'joblib'):
+        try:
+            versions[name] = __import__(name).__version__
+        except ImportError:
+            versions[name] = None
+    return versions
+
+
+def run_benchmark(targets=None, sizes=None, paths=None, seed=None, latency_samples=None, isolate=True):
+    """대상 × 크기 조합을 모두 측정해 결과 dict 반환
+
+    isolate=True면 조합마다 새 프로세스에서 실행하므로 로드 시간과 최대 RSS가 서로 섞이지 않습니다.
+    """
+    targets = targets or list(TARGETS)
+    sizes = sizes or BENCHMARK_CONFIG['sizes']
+    paths = {**default_paths(), **(paths or {})}
+    seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+    latency_samples = latency_samples or BENCHMARK_CONFIG['latency_samples']
+
+    results = []
+    for target in targets:
+        for size in sizes:
+            print(f"⏱️ [벤치마크] {target} / {size}통 측정 중...")
+            args = (target, size, paths, seed, latency_samples)
+            if isolate:
+                context = multiprocessing.get_context(BULK_PARSE_CONFIG['start_method'])
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_case, *args).result()
+            else:
+                result = run_case(*args)
+            results.append(result)
+            if result['status'] != 'ok':
+                print(f"⚠️ [벤치마크] {target}: {result['status']} ({result['detail']})")
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': _versions(),
+        'seed': seed,
+        'latency_samples': latency_samples,
+        'paths': {name: os.path.abspath(path) for name, path in paths.items()},
+        'results': results
+    }
+
+
+def save_results(report, output=None):
+    """결과를 JSON으로 저장하고 경로 반환 (기본: output_dir/benchmark-<커밋>-<시각>.json)"""
+    if output is None:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(BENCHMARK_CONFIG['output_dir'], f"benchmark-{report.get('commit') or 'local'}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def compare(old_path, new_path):
+    """두 결과 파일의 (대상, 크기)별 p50 지연/처리량/최대 RSS 비교 행 목록"""
+    def load(path):
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+        return {(item['target'], item['size']): item for item in report['results'] if item['status'] == 'ok'}
+
+    old, new = load(old_path), load(new_path)
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        rows.append({
+            'target': key[0],
+            'size': key[1],
+            'p50_ms': (before['latency_ms']['p50'], after['latency_ms']['p50']),
+            'throughput_per_sec': (before['throughput_per_sec'], after['throughput_per_sec']),
+            'peak_rss_mb': (before['peak_rss_mb'], after['peak_rss_mb'])
+        })
+    return rows
+
+
+def _print_report(report):
+    for item in report['results']:
+        if item['status'] != 'ok':
+            continue
+        latency = item['latency_ms']
+        print(
+            f"  {item['target']:<11} {item['size']:>6}통 | 로드 {item['load_seconds']:.3f}s | "
+            f"p50 {latency['p50']:.3f}ms p99 {latency['p99']:.3f}ms | "
+            f"{item['throughput_per_sec']}통/s | RSS {item['peak_rss_mb']}MB"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DeepMail 피싱 판별 모델 벤치마크')
+    parser.add_argument('--targets', default=','.join(TARGETS), help='쉼표로 구분한 대상 (기본: 전체)')
+    parser.add_argument('--sizes', default=','.join(map(str, BENCHMARK_CONFIG['sizes'])), help='말뭉치 크기 목록')
+    parser.add_argument('--seed', type=int, default=BENCHMARK_CONFIG['seed'])
+    parser.add_argument('--latency-samples', type=int, default=BENCHMARK_CONFIG['latency_samples'])
+    parser.add_argument('--rf-model', default=MODEL_CONFIG['path'])
+    parser.add_argument('--tfidf', default=BENCHMARK_CONFIG['tfidf_path'])
+    parser.add_argument('--pred-model', default=BENCHMARK_CONFIG['pred_model_path'])
+    parser.add_argument('--online-model', default=ONLINE_MODEL_CONFIG['path'])
+    parser.add_argument('--output', help='결과 JSON 경로')
+    parser.add_argument('--in-process', action='store_true', help='조합별 프로세스 분리 없이 실행')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='두 결과 JSON 비교')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        for row in compare(*args.compare):
+            print(
+                f"  {row['target']:<11} {row['size']:>6}통 | p50 {row['p50_ms'][0]} → {row['p50_ms'][1]}ms | "
+                f"{row['throughput_per_sec'][0]} → {row['throughput_per_sec'][1]}통/s | "
+                f"RSS {row['peak_rss_mb'][0]} → {row['peak_rss_mb'][1]}MB"
+            )
+        return
+
+    targets = [name.strip() for name in args.targets.split(',') if name.strip()]
+    unknown = [name for name in targets if name not in TARGETS]
+    if unknown:
+        parser.error(f"알 수 없는 대상: {', '.join(unknown)} (가능: {', '.join(TARGETS)})")
+
+    report = run_benchmark(
+        targets=targets,
+        sizes=[int(size) for size in args.sizes.split(',') if size.strip()],
+        paths={'rf_model': args.rf_model, 'tfidf': args.tfidf, 'pred_model': args.pred_model, 'online_model': args.online_model},
+        seed=args.seed,
+        latency_samples=args.latency_samples,
+        isolate=not args.in_process
+    )
+    _print_report(report)
+    print(f"✅ [벤치마크] 결과 저장: {save_results(report, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
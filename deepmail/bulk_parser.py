@@ -0,0 +1,70 @@
+"""
+DeepMail - 프로세스 풀 기반 대량 메일 파싱 모듈
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import BULK_PARSE_CONFIG, PARSE_CONFIG
+
+
+def parse_compact(message_id, raw_data, max_chars):
+    """원본 메일 바이트를 파싱하여 부모 프로세스로 보낼 작은 결과만 반환
+
+    반환값: {'id', 'subject', 'from', 'to', 'date', 'body_text', 'body_html',
+            'attachments', 'error'} - body_html은 max_chars까지만 포함
+    body_html은 태그를 그대로 둡니다 (model_registry 피싱 모델의 입력은 제목 + 텍스트 + HTML 원문이므로 HTML→텍스트 변환이 필요 없음).
+    """
+    from gmail_service import email_parser
+
+    try:
+        parsed = email_parser.parse_capped(raw_data, max_chars)
+    except Exception as e:
+        return {'id': message_id, 'error': True, 'body_text': f"❌ 메일 파싱 중 오류가 발생했습니다: {str(e)}"}
+
+    return {
+        'id': message_id,
+        'subject': parsed['subject'],
+        'from': parsed['from'],
+        'to': parsed['to'],
+        'date': parsed['date'],
+        'body_text': parsed['text'],
+        'body_html': parsed['html'],
+        'attachments': parsed['attachments'],
+        'error': False
+    }
+
+
+def _parse_chunk(chunk, max_chars):
+    """워커 프로세스에서 청크 단위로 파싱 (프로세스 간 전송 횟수 최소화)"""
+    return [parse_compact(message_id, raw_data, max_chars) for message_id, raw_data in chunk]
+
+
+def iter_bulk_parse(raw_messages, max_chars=None, max_workers=None, chunk_size=None):
+    """{message_id: 원본 bytes}를 청크로 나눠 병렬 파싱하고 완료되는 대로 결과를 yield
+
+    메일 수가 min_parallel보다 적거나 워커가 1개면 프로세스 시작 비용을 피해 현재 프로세스에서 파싱합니다.
+    """
+    max_chars = max_chars or PARSE_CONFIG['classify_max_chars']
+    max_workers = max_workers or BULK_PARSE_CONFIG['max_workers']
+    chunk_size = chunk_size or BULK_PARSE_CONFIG['chunk_size']
+    items = [(message_id, raw_data) for message_id, raw_data in raw_messages.items() if raw_data is not None]
+
+    if max_workers <= 1 or len(items) < BULK_PARSE_CONFIG['min_parallel']:
+        for message_id, raw_data in items:
+            yield parse_compact(message_id, raw_data, max_chars)
+        return
+
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    context = multiprocessing.get_context(BULK_PARSE_CONFIG['start_method'])
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks)), mp_context=context) as executor:
+        futures = [executor.submit(_parse_chunk, chunk, max_chars) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def bulk_parse(raw_messages, max_chars=None, max_workers=None, chunk_size=None):
+    """iter_bulk_parse 결과를 {message_id: 결과} 딕셔너리로 수집"""
+    return {
+        result['id']: result
+        for result in iter_bulk_parse(raw_messages, max_chars, max_workers, chunk_size)
+    }
@@ -3,6 +3,7 @@ DeepMail - 설정 및 상수
 """
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # 환경변수 로드
@@ -24,10 +25,127 @@ PAGE_CONFIG = {
 # 메일 설정
 MAIL_CONFIG = {
     'max_results': 50,
+    'page_size': 100,
+    'batch_size': 100,
+    'modify_batch_size': 1000,
     'default_page_size': 10,
     'page_size_options': [10, 15, 20, 25, 30]
 }
 
+# Gmail API 할당량 설정 (사용자당 초당 250 할당량 단위)
+RATE_LIMIT_CONFIG = {
+    'units_per_second': 250,
+    'burst': 250,
+    'max_retries': 3,
+    'backoff_seconds': 1.0
+}
+
+# Gmail HTTP 전송 설정 (스레드별 연결 풀)
+TRANSPORT_CONFIG = {
+    'max_workers': 4,
+    'timeout': 60
+}
+
+# 메일 본문 디스크 캐시 설정
+CACHE_CONFIG = {
+    'dir': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'),
+    'max_bytes': int(os.getenv('DEEPMAIL_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+}
+
+# 로컬 메일 인덱스(SQLite) 설정
+INDEX_CONFIG = {
+    'path': os.getenv('DEEPMAIL_INDEX_PATH', os.path.join(CACHE_CONFIG['dir'], 'mailbox.sqlite3'))
+}
+
+# 첨부파일 설정 - 기준 크기를 넘는 첨부파일은 메모리 대신 임시 파일로 저장
+ATTACHMENT_CONFIG = {
+    'max_in_memory_bytes': 5 * 1024 * 1024,
+    # 큰 첨부파일 API 응답을 임시 파일로 받을 때의 요청 단위
+    'download_chunk_bytes': 4 * 1024 * 1024,
+    'temp_dir': os.path.join(tempfile.gettempdir(), 'deepmail_attachments')
+}
+
+# 제한 파싱 설정 - 분류/LLM 경로에서 디코딩할 최대 본문 글자 수
+PARSE_CONFIG = {
+    'classify_max_chars': 100_000,
+    'link_scan_max_chars': 20_000,
+    'llm_max_chars': 2000
+}
+
+# 피싱 판별 모델 설정 - mmap_mode는 비압축 joblib 모델에만 적용 ('' 이면 사용 안 함)
+MODEL_CONFIG = {
+    'path': os.getenv(
+        'DEEPMAIL_MODEL_PATH',
+        os.path.join(os.path.dirname(__file__), '..', 'models', 'rf_phishing_model.pkl')
+    ),
+    'mmap_mode': os.getenv('DEEPMAIL_MODEL_MMAP_MODE', 'r') or None,
+    'n_jobs': -1,
+    'parallel_min': 200,
+    # 랜덤 포레스트를 배열로 펼친 추론 엔진 사용 여부 (forest_engine)
+    'flat_forest': os.getenv('DEEPMAIL_FLAT_FOREST', '1') != '0'
+}
+
+# 온라인 학습 피싱 모델 설정 - 삭제는 약한 신호이므로 명시적 피드백보다 가중치를 낮게 둠
+ONLINE_MODEL_CONFIG = {
+    'path': os.getenv('DEEPMAIL_ONLINE_MODEL_PATH', os.path.join(CACHE_CONFIG['dir'], 'online_phishing_model.joblib')),
+    'n_features': 2 ** 18,
+    'delete_weight': 0.5,
+    'feedback_weight': 1.0
+}
+
+# 특징 추출 설정 - 정제 결과를 캐시할 최대 메일 수 (원문은 캐시하지 않음)
+FEATURE_CONFIG = {
+    'cache_entries': 4096
+}
+
+# 대량 파싱 설정 - min_parallel개 이상일 때만 프로세스 풀 사용
+# spawn 워커는 시작할 때 앱 모듈을 다시 import하므로, 기본 50개를 검사하는 일괄 피싱 검사는 현재 프로세스에서
+# 파싱하고 max_mails가 min_parallel 이상일 때만 풀을 씁니다 (mailbox_scan은 자체 워커에서 parse_compact 호출).
+BULK_PARSE_CONFIG = {
+    'max_workers': os.cpu_count() or 1,
+    'chunk_size': 50,
+    'min_parallel': 200,
+    'start_method': 'spawn'
+}
+
+# 피싱 사전 필터 설정 - 과거 모델 점수(score_threshold 이상을 피싱으로 집계)로 만든 발신자 평판 기준
+# authserv_ids: 인증 결과를 믿을 수신 서버 (Gmail이 붙인 Authentication-Results 헤더만 사용)
+PREFILTER_CONFIG = {
+    'enabled': os.getenv('DEEPMAIL_PREFILTER', '1') != '0',
+    'authserv_ids': ['mx.google.com'],
+    'score_threshold': 0.5,
+    'trusted_min_mails': 20,
+    'blocked_min_mails': 5,
+    'blocked_ratio': 0.9
+}
+
+# 전체 메일함 피싱 검사 설정 - 청크마다 체크포인트, 워커당 prefetch_chunks개까지 미리 가져옴
+# 처리 중인 원본 크기 합은 max_in_flight_bytes까지, strip_min_bytes보다 큰 메일은 첨부파일 본문을 빼고 전송
+SCAN_CONFIG = {
+    'list_page_size': 500,
+    'chunk_size': 200,
+    'max_workers': os.cpu_count() or 1,
+    'prefetch_chunks': 2,
+    'max_in_flight_bytes': 128 * 1024 * 1024,
+    'strip_min_bytes': 256 * 1024,
+    'threshold': 0.5
+}
+
+# 피싱 모델 벤치마크 설정 - 합성 말뭉치 크기와 결과 저장 위치
+BENCHMARK_CONFIG = {
+    'sizes': [100, 1000],
+    'seed': 0,
+    'latency_samples': 200,
+    'output_dir': os.path.join(CACHE_CONFIG['dir'], 'benchmarks'),
+    'tfidf_path': os.path.join(os.path.dirname(__file__), '..', 'models', 'tfidf_vectorizer.joblib'),
+    'pred_model_path': os.path.join(os.path.dirname(__file__), '..', 'models', 'phishing_Detecting_model.joblib')
+}
+
+# HTML 처리 설정 - 메모이즈할 최대 결과 수
+HTML_CONFIG = {
+    'cache_entries': 256
+}
+
 # OpenAI 설정
 OPENAI_CONFIG = {
     'model': "gpt-4o",
@@ -42,6 +160,7 @@ SESSION_KEYS = {
     'gmail_credentials': 'gmail_credentials',
     'gmail_messages': 'gmail_messages',
     'gmail_last_fetch': 'gmail_last_fetch',
+    'gmail_history_id': 'gmail_history_id',
     'mail_page': 'mail_page',
     'mail_page_size': 'mail_page_size',
     'needs_refresh': 'needs_refresh'
@@ -0,0 +1,129 @@
+"""
+DeepMail - 메일 본문 영구 저장소 모듈
+"""
+
+import os
+import pickle
+import tempfile
+import threading
+import time
+from config import CACHE_CONFIG
+
+
+class ContentStore:
+    """메일 ID별 파싱 결과를 디스크에 저장하는 LRU 캐시
+
+    - 파일 형식: <cache_dir>/<message_id>.pkl
+    - 임시 파일에 쓴 뒤 os.replace로 교체하여 원자적으로 저장
+    - 전체 용량이 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 삭제
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or CACHE_CONFIG['dir']
+        self.max_bytes = max_bytes if max_bytes is not None else CACHE_CONFIG['max_bytes']
+        self._lock = threading.Lock()
+        self._index = None  # {message_id: [size, last_used]}
+        self._total_bytes = 0
+
+    def _path(self, message_id):
+        return os.path.join(self.cache_dir, f"{message_id}.pkl")
+
+    def _load_index(self):
+        """캐시 디렉토리를 한 번만 스캔하여 크기/사용 시각 인덱스 구성"""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                self._index[entry.name[:-4]] = [stat.st_size, stat.st_mtime]
+                self._total_bytes += stat.st_size
+
+    def get(self, message_id):
+        """저장된 메일 내용 반환 (없거나 손상된 경우 None)"""
+        with self._lock:
+            self._load_index()
+            if message_id not in self._index:
+                return None
+            path = self._path(message_id)
+            try:
+                with open(path, 'rb') as f:
+                    content = pickle.load(f)
+            except Exception:
+                self._remove(message_id)
+                return None
+
+            # 본문이 없는 예전 형식(목록 요약) 파일은 캐시 미스로 처리
+            if not isinstance(content, dict) or 'body_text' not in content:
+                return None
+
+            now = time.time()
+            self._index[message_id][1] = now
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+            return content
+
+    def put(self, message_id, content):
+        """메일 내용을 원자적으로 저장하고 용량 초과 시 LRU 삭제"""
+        if content.get('error', False):
+            return
+        data = pickle.dumps(content, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._load_index()
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(message_id))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            if message_id in self._index:
+                self._total_bytes -= self._index[message_id][0]
+            self._index[message_id] = [len(data), time.time()]
+            self._total_bytes += len(data)
+            self._evict()
+
+    def delete(self, message_id):
+        """저장된 메일 내용 삭제"""
+        with self._lock:
+            self._load_index()
+            self._remove(message_id)
+
+    def clear(self):
+        """저장된 메일 내용 전체 삭제 (로그아웃 시)"""
+        with self._lock:
+            self._load_index()
+            for message_id in list(self._index):
+                self._remove(message_id)
+
+    def _remove(self, message_id):
+        entry = self._index.pop(message_id, None)
+        if entry:
+            self._total_bytes -= entry[0]
+        try:
+            os.remove(self._path(message_id))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """max_bytes 이하가 될 때까지 가장 오래 사용하지 않은 항목부터 삭제"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for message_id, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(message_id)
+
+
+# 전역 저장소 인스턴스
+content_store = ContentStore()
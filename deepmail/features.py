@@ -0,0 +1,172 @@
+"""
+DeepMail - 피싱 모델 공용 특징 추출 모듈
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from urllib.parse import urlparse
+import numpy as np
+from bs4 import BeautifulSoup
+from scipy import sparse
+from config import FEATURE_CONFIG
+
+URL_RE = re.compile(r'http[s]?://\S+')
+NON_WORD_RE = re.compile(r'[^a-zA-Z0-9가-힣\s]')
+SPACE_RE = re.compile(r'\s+')
+
+# TF-IDF 뒤에 붙는 수치 피처 (models/model_pred 학습 시 컬럼 순서와 동일)
+NUMERIC_FEATURES = ['subject_len', 'body_len', 'num_urls', 'num_unique_domains']
+
+
+def clean_text(text):
+    """HTML 태그와 특수문자를 제거하고 소문자로 정규화 (model_pred 학습 전처리와 동일)"""
+    if not isinstance(text, str):
+        return ''
+    text = BeautifulSoup(text, 'html.parser').get_text()
+    text = NON_WORD_RE.sub(' ', text)
+    return SPACE_RE.sub(' ', text).strip().lower()
+
+
+def extract_urls(text):
+    return URL_RE.findall(str(text))
+
+
+def extract_domains(urls):
+    domains = []
+    for url in urls:
+        try:
+            domain = urlparse(url).netloc
+            if domain:
+                domains.append(domain.lower())
+        except ValueError:
+            continue
+    return domains
+
+
+class MailFeatures:
+    """메일 한 통의 특징 - 각 값은 처음 사용할 때 한 번만 계산
+
+    - raw_text: 제목 + 텍스트 본문 + HTML 본문 (rf_phishing_model 입력)
+    - clean_subject / clean_body / urls / domains / numeric: models/model_pred 입력
+    원문과 raw_text는 이 객체에만 두고, 계산 비용이 큰 정제 결과(DERIVED)만
+    derived에 저장하여 FeatureExtractor 캐시가 본문 전체를 붙잡지 않도록 합니다.
+    """
+
+    DERIVED = ('clean_subject', 'clean_body', 'numeric')
+
+    def __init__(self, subject='', body_text='', body_html='', body=None, derived=None):
+        self.subject = subject or ''
+        self.body_text = body_text or ''
+        self.body_html = body_html or ''
+        # model_pred의 본문 - 텍스트 본문이 거의 비어 있으면 HTML 본문 사용
+        if body is None:
+            body = self.body_text if len(self.body_text.strip()) >= 10 else (self.body_html or self.body_text)
+        self.body = body or ''
+        self.derived = {} if derived is None else derived
+
+    def _derive(self, name, compute):
+        value = self.derived.get(name)
+        if value is None:
+            value = self.derived[name] = compute()
+        return value
+
+    @cached_property
+    def raw_text(self):
+        return ' '.join((self.subject, self.body_text, self.body_html))
+
+    @property
+    def clean_subject(self):
+        return self._derive('clean_subject', lambda: clean_text(self.subject))
+
+    @property
+    def clean_body(self):
+        return self._derive('clean_body', lambda: clean_text(self.body))
+
+    @cached_property
+    def urls(self):
+        return extract_urls(self.body)
+
+    @cached_property
+    def domains(self):
+        return extract_domains(self.urls)
+
+    @property
+    def numeric(self):
+        """NUMERIC_FEATURES 순서의 수치 피처"""
+        return self._derive(
+            'numeric', lambda: (len(self.clean_subject), len(self.clean_body), len(self.urls), len(set(self.domains)))
+        )
+
+
+class FeatureExtractor:
+    """메일별 정제 특징(MailFeatures.derived)을 (메일 ID, 내용 해시)로 캐시하고 배치 특징 행렬을 만드는 추출기
+
+    messages: [{'id'(선택), 'subject', 'body_text', 'body_html', 'body'(선택)}, ...]
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or FEATURE_CONFIG['cache_entries']
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(message):
+        digest = hashlib.blake2b(digest_size=16)
+        for field in ('subject', 'body_text', 'body_html', 'body'):
+            value = message.get(field)
+            digest.update(b'\0' if value is None else value.encode('utf-8', 'surrogatepass'))
+            digest.update(b'\1')
+        return (message.get('id') or '', digest.hexdigest())
+
+    def extract(self, message):
+        """메일 한 통의 MailFeatures 반환 (같은 메일의 정제 결과는 캐시 재사용)"""
+        key = self._key(message)
+        with self._lock:
+            derived = self._cache.get(key)
+            if derived is None:
+                derived = self._cache[key] = {}
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+
+        return MailFeatures(
+            message.get('subject'), message.get('body_text'), message.get('body_html'), message.get('body'), derived
+        )
+
+    def extract_many(self, messages):
+        return [self.extract(message) for message in messages]
+
+    @staticmethod
+    def raw_text_matrix(features, vectorizer):
+        """rf_phishing_model용 희소 행렬 (원문 텍스트 벡터화)"""
+        return vectorizer.transform([item.raw_text for item in features])
+
+    @staticmethod
+    def numeric_matrix(features):
+        return np.array([item.numeric for item in features], dtype=float).reshape(len(features), len(NUMERIC_FEATURES))
+
+    @staticmethod
+    def tfidf_numeric_matrix(features, vectorizer):
+        """model_pred용 CSR 행렬 (정제 본문 TF-IDF + 수치 피처)"""
+        X_tfidf = vectorizer.transform([item.clean_body for item in features])
+        return sparse.hstack([X_tfidf, sparse.csr_matrix(FeatureExtractor.numeric_matrix(features))], format='csr')
+
+    def clear(self):
+        """캐시된 특징 전체 제거"""
+        with self._lock:
+            self._cache.clear()
+
+    def forget(self, message_ids):
+        """삭제된 메일의 캐시된 특징 제거"""
+        message_ids = set(message_ids)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in message_ids]:
+                del self._cache[key]
+
+
+# 전역 특징 추출기 인스턴스
+feature_extractor = FeatureExtractor()
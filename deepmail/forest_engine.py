@@ -0,0 +1,147 @@
+"""
+DeepMail - 배열 기반 랜덤 포레스트 추론 엔진 모듈
+"""
+
+import numpy as np
+from scipy import sparse
+
+
+class FlatForest:
+    """학습된 sklearn 포레스트를 연속된 numpy 배열로 펼친 추론 엔진
+
+    모든 트리의 노드를 하나의 배열(feature, threshold, left, right, value)로 합치고,
+    (행 × 트리) 노드 인덱스 행렬을 깊이 단위로 한 번에 전진시킵니다.
+    트리별 Python 호출과 joblib 스레드 시작 비용이 없어 단일 메일 지연이 작습니다.
+    반복 횟수는 가장 깊은 트리의 깊이이므로 지연은 트리 깊이에 비례합니다.
+    포레스트가 실제로 쓰는 특징 열만 dense로 모으므로 어휘가 커도 메모리가 작습니다.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, used_features, n_features, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.used_features = used_features
+        self.n_features = n_features
+        self.classes_ = classes
+        self.max_cells = 1 << 22
+        # 원래 특징 번호 -> used_features 안의 위치 (사용하지 않는 특징은 -1)
+        self.column_map = np.full(n_features, -1, dtype=np.int64)
+        self.column_map[used_features] = np.arange(len(used_features))
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """RandomForestClassifier / ExtraTreesClassifier를 배열로 컴파일"""
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError('다중 출력 포레스트는 지원하지 않습니다.')
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, -1, tree.feature))
+            thresholds.append(tree.threshold)
+            # 리프는 자기 자신을 가리키게 하여 깊이가 다른 트리도 같은 반복으로 처리
+            node_ids = np.arange(tree.node_count) + offset
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            value = tree.value[:, 0, :]
+            values.append(value / np.maximum(value.sum(axis=1, keepdims=True), np.finfo(float).tiny))
+            roots.append(offset)
+            offset += tree.node_count
+
+        feature = np.concatenate(features).astype(np.int64)
+        used_features = np.unique(feature[feature >= 0])
+        engine = cls(
+            feature=feature,
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.int64),
+            right=np.concatenate(rights).astype(np.int64),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int64),
+            used_features=used_features,
+            n_features=forest.n_features_in_,
+            classes=np.asarray(forest.classes_)
+        )
+        # 리프의 특징 위치는 0으로 두고(비교 결과는 무시됨) 내부 노드는 압축된 열 위치로 변환
+        engine.feature_pos = np.where(feature >= 0, engine.column_map[np.maximum(feature, 0)], 0)
+        engine.max_depth = max(estimator.tree_.max_depth for estimator in forest.estimators_)
+        return engine
+
+    def _gather(self, X):
+        """포레스트가 쓰는 특징 열만 float32 dense 행렬로 추출 (sklearn과 같은 정밀도)"""
+        if sparse.issparse(X):
+            X = X.tocsr()
+            columns = self.column_map[X.indices]
+            rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+            mask = columns >= 0
+            dense = np.zeros((X.shape[0], max(len(self.used_features), 1)), dtype=np.float32)
+            dense[rows[mask], columns[mask]] = X.data[mask]
+            return dense
+        return np.asarray(X, dtype=np.float32)[:, self.used_features]
+
+    def predict_proba(self, X):
+        """sklearn predict_proba와 같은 (행 수 × 클래스 수) 확률 행렬
+
+        dense 변환 크기가 max_cells를 넘지 않도록 행을 나눠 평가합니다.
+        """
+        n_rows = X.shape[0]
+        step = max(1, self.max_cells // max(len(self.used_features), len(self.roots), 1))
+        if n_rows <= step:
+            return self._predict_block(X)
+        return np.vstack([self._predict_block(X[start:start + step]) for start in range(0, n_rows, step)])
+
+    def _predict_block(self, X):
+        dense = self._gather(X)
+        n_rows = dense.shape[0]
+        row_ids = np.arange(n_rows)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+
+        for _ in range(self.max_depth):
+            go_left = dense[row_ids, self.feature_pos[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def verify(self, forest, n_rows=64, seed=0, atol=1e-9):
+        """무작위 입력으로 sklearn predict_proba와 결과가 같은지 확인
+
+        각 특징 값을 포레스트 분기 임계값 주변에서 뽑아 양쪽 분기를 모두 지나게 합니다.
+        반환값: 최대 절대 오차 (atol을 넘으면 ValueError)
+        """
+        rng = np.random.default_rng(seed)
+        X = np.zeros((n_rows, self.n_features), dtype=np.float32)
+        internal = self.feature >= 0
+        split_features, split_thresholds = self.feature[internal], self.threshold[internal]
+        if len(split_features):
+            picks = rng.integers(0, len(split_features), size=(n_rows, min(len(split_features), 200)))
+            jitter = rng.choice([-1e-3, 0.0, 1e-3], size=picks.shape)
+            rows = np.repeat(np.arange(n_rows), picks.shape[1])
+            X[rows, split_features[picks].ravel()] = (split_thresholds[picks] + jitter).ravel()
+        X_sparse = sparse.csr_matrix(X)
+
+        expected = forest.predict_proba(X_sparse)
+        actual = self.predict_proba(X_sparse)
+        error = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+        if error > atol:
+            raise ValueError(f'배열 포레스트 결과가 sklearn과 다릅니다. (최대 오차={error})')
+        return error
+
+
+def compile_forest(classifier):
+    """포레스트 분류기면 FlatForest로 컴파일하고 sklearn 결과와 대조 (지원하지 않으면 None)"""
+    if not hasattr(classifier, 'estimators_') or not all(hasattr(est, 'tree_') for est in classifier.estimators_):
+        return None
+    try:
+        engine = FlatForest.from_sklearn(classifier)
+        engine.verify(classifier)
+    except Exception as e:
+        print(f"⚠️ [포레스트 엔진] sklearn 예측으로 대체합니다: {str(e)}")
+        return None
+    return engine
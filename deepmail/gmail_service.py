@@ -5,21 +5,44 @@ DeepMail - Gmail 서비스 모듈
 import streamlit as st
 import os
 import pickle
+import base64
+import io
+import tempfile
 from datetime import datetime
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
 import email
 from email import policy
+from email.parser import BytesFeedParser, BytesHeaderParser
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 import quopri
 import re
-from bs4 import BeautifulSoup
-from config import SCOPES, MAIL_CONFIG
+from html_backend import html_processor
+from config import SCOPES, MAIL_CONFIG, RATE_LIMIT_CONFIG, ATTACHMENT_CONFIG
+from rate_limiter import gmail_rate_limiter, is_rate_limit_error, get_retry_after
+from gmail_transport import build_gmail_service, map_concurrent
+
+# 메일 목록에서 제외되는 라벨 (messages.list 기본 동작과 동일)
+HIDDEN_LABELS = {'TRASH', 'SPAM'}
+
+# 목록 조회용 부분 응답(fields) 마스크 - 필요한 필드만 내려받음
+LIST_FIELDS = 'messages/id,nextPageToken'
+# 인증 결과/구독 해지 헤더는 피싱 사전 필터(prefilter)가 본문 없이 판단할 때 사용
+SUMMARY_HEADERS = ['Subject', 'From', 'Date', 'Authentication-Results', 'List-Unsubscribe']
+SUMMARY_FIELDS = 'id,threadId,snippet,internalDate,labelIds,sizeEstimate,payload/headers'
+# 첨부파일 조회용 - 파트 트리만 받아 part_path에 해당하는 attachmentId를 찾음
+ATTACHMENT_FIELDS = 'payload'
+# 첨부파일 API 응답({"data": "..."})에서 base64url 값이 시작되는 위치
+ATTACHMENT_DATA_RE = re.compile(rb'\s*\{\s*"data"\s*:\s*"')
+
+# parse_capped에서 본문을 버린 파트에 붙이는 내부 헤더
+SKIPPED_PART_HEADER = 'X-DeepMail-Skipped-Part'
 
 class GmailService:
     """Gmail 서비스 클래스"""
@@ -60,59 +83,242 @@ class GmailService:
             with open('token.pickle', 'wb') as token:
                 pickle.dump(creds, token)
         
-        self.credentials = creds
-        if creds:
-            self.service = build('gmail', 'v1', credentials=creds)
+        self.set_credentials(creds)
         return creds
     
+    def set_credentials(self, creds):
+        """인증 정보를 설정하고 스레드별 전송 풀을 쓰는 서비스 생성"""
+        self.credentials = creds
+        self.service = build_gmail_service(creds) if creds else None
+    
     def get_messages(self, max_results=None):
         """Gmail 메시지 목록 조회 (배치 요청으로 최적화)"""
         if not self.service:
             st.error("❌ Gmail 서비스가 초기화되지 않았습니다.")
             return []
         
-        try:
-            max_results = max_results or MAIL_CONFIG['max_results']
-            results = self.service.users().messages().list(userId='me', maxResults=max_results).execute()
-            messages = results.get('messages', [])
-            
-            if not messages:
-                return []
-            
-            # 배치 요청으로 메일 상세 정보 가져오기
-            batch = self.service.new_batch_http_request()
-            message_details = []
-            
-            def callback(request_id, response, exception):
-                if exception is None:
-                    headers = response['payload']['headers']
-                    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '제목 없음')
-                    sender = next((h['value'] for h in headers if h['name'] == 'From'), '발신자 없음')
-                    
-                    message_details.append({
-                        'id': response['id'],
-                        'subject': subject,
-                        'sender': sender,
-                        'snippet': response.get('snippet', '')
-                    })
-                else:
-                    st.warning(f"메일 정보 가져오기 실패: {exception}")
+        max_results = max_results or MAIL_CONFIG['max_results']
+        message_details = []
+        for batch in self.iter_messages(limit=max_results):
+            message_details.extend(batch)
+        return message_details
+    
+    def iter_messages(self, query=None, label_ids=None, page_size=None, limit=None):
+        """Gmail 메시지 목록을 페이지 단위로 순회하는 제너레이터
+        
+        nextPageToken을 따라가며 페이지마다 요약 정보 리스트를 yield 합니다.
+        호출 측에서 순회를 멈추면 이후 페이지는 요청하지 않습니다.
+        """
+        if not self.service:
+            st.error("❌ Gmail 서비스가 초기화되지 않았습니다.")
+            return
+        
+        page_size = min(page_size or MAIL_CONFIG['page_size'], MAIL_CONFIG['batch_size'])
+        page_token = None
+        fetched = 0
+        
+        while True:
+            if limit is not None:
+                page_size = min(page_size, limit - fetched)
+                if page_size <= 0:
+                    return
             
-            # 배치 요청에 메일 ID들 추가
-            for message in messages:
-                batch.add(
-                    self.service.users().messages().get(userId='me', id=message['id']),
-                    callback=callback
-                )
+            try:
+                params = {'userId': 'me', 'maxResults': page_size, 'fields': LIST_FIELDS}
+                if query:
+                    params['q'] = query
+                if label_ids:
+                    params['labelIds'] = label_ids
+                if page_token:
+                    params['pageToken'] = page_token
+                gmail_rate_limiter.acquire('messages.list')
+                results = self.service.users().messages().list(**params).execute()
+            except Exception as e:
+                st.error(f"❌ 메일 목록 조회 실패: {str(e)}")
+                return
             
-            # 배치 요청 실행
-            batch.execute()
+            messages = results.get('messages', [])
+            if not messages:
+                return
             
-            return message_details
+            fetched += len(messages)
+            yield self.get_message_summaries([message['id'] for message in messages])
             
-        except Exception as e:
-            st.error(f"❌ 메일 목록 조회 실패: {str(e)}")
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+    
+    def iter_message_ids(self, query=None, page_token=None, page_size=500):
+        """메일 ID만 페이지 단위로 순회 (요약 정보 요청 없음)
+
+        (ID 리스트, 다음 페이지 토큰)을 yield 하며, 마지막 페이지의 토큰은 None입니다.
+        page_token을 주면 그 페이지부터 이어서 조회합니다.
+        오류는 호출 측에서 체크포인트 후 재개할 수 있도록 그대로 전달합니다.
+        """
+        if not self.service:
+            raise RuntimeError("Gmail 서비스가 초기화되지 않았습니다.")
+
+        while True:
+            params = {'userId': 'me', 'maxResults': page_size, 'fields': LIST_FIELDS}
+            if query:
+                params['q'] = query
+            if page_token:
+                params['pageToken'] = page_token
+            for attempt in range(RATE_LIMIT_CONFIG['max_retries']):
+                gmail_rate_limiter.acquire('messages.list')
+                try:
+                    results = self.service.users().messages().list(**params).execute()
+                    break
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == RATE_LIMIT_CONFIG['max_retries'] - 1:
+                        raise
+                    gmail_rate_limiter.backoff(get_retry_after(e, RATE_LIMIT_CONFIG['backoff_seconds'] * (2 ** attempt)))
+
+            page_token = results.get('nextPageToken')
+            yield [message['id'] for message in results.get('messages', [])], page_token
+            if not page_token:
+                return
+
+    def get_message_summaries(self, message_ids):
+        """메일 ID 목록의 요약 정보를 배치 요청으로 가져오기 (목록 순서 유지)
+
+        Gmail 배치는 요청 100개까지만 받으므로 MAIL_CONFIG['batch_size']개씩 나누어 보냅니다.
+        """
+        if not self.service:
+            st.error("❌ Gmail 서비스가 초기화되지 않았습니다.")
             return []
+        if not message_ids:
+            return []
+        
+        details_by_id = {}
+        
+        def callback(request_id, response, exception):
+            if exception is None:
+                headers = response.get('payload', {}).get('headers', [])
+                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '제목 없음')
+                sender = next((h['value'] for h in headers if h['name'] == 'From'), '발신자 없음')
+                date = next((h['value'] for h in headers if h['name'] == 'Date'), '날짜 없음')
+                auth_results = next((h['value'] for h in headers if h['name'].lower() == 'authentication-results'), '')
+                list_unsubscribe = next((h['value'] for h in headers if h['name'].lower() == 'list-unsubscribe'), '')
+                
+                details_by_id[response['id']] = {
+                    'id': response['id'],
+                    'threadId': response.get('threadId'),
+                    'subject': subject,
+                    'sender': sender,
+                    'date': date,
+                    'snippet': response.get('snippet', ''),
+                    'internalDate': int(response.get('internalDate', 0)),
+                    'labelIds': response.get('labelIds', []),
+                    'sizeEstimate': response.get('sizeEstimate', 0),
+                    'authResults': auth_results,
+                    'listUnsubscribe': list_unsubscribe
+                }
+            else:
+                st.warning(f"메일 정보 가져오기 실패: {exception}")
+        
+        batch_size = MAIL_CONFIG['batch_size']
+        for start in range(0, len(message_ids), batch_size):
+            chunk = message_ids[start:start + batch_size]
+            try:
+                # 배치 요청에 메일 ID들 추가
+                batch = self.service.new_batch_http_request()
+                for message_id in chunk:
+                    # 전체 payload 대신 메타데이터 헤더만 요청
+                    batch.add(
+                        self.service.users().messages().get(
+                            userId='me',
+                            id=message_id,
+                            format='metadata',
+                            metadataHeaders=SUMMARY_HEADERS,
+                            fields=SUMMARY_FIELDS
+                        ),
+                        callback=callback
+                    )
+                
+                # 배치 요청 실행 (하위 요청 수만큼 할당량 차감)
+                gmail_rate_limiter.acquire('messages.get', len(chunk))
+                batch.execute()
+            except Exception as e:
+                st.error(f"❌ 메일 정보 배치 조회 실패: {str(e)}")
+        
+        return [details_by_id[message_id] for message_id in message_ids if message_id in details_by_id]
+    
+    def get_history_id(self):
+        """현재 메일함의 최신 historyId 조회"""
+        if not self.service:
+            return None
+        
+        try:
+            gmail_rate_limiter.acquire('getProfile')
+            profile = self.service.users().getProfile(userId='me').execute()
+            return profile.get('historyId')
+        except Exception as e:
+            st.warning(f"historyId 조회 실패: {str(e)}")
+            return None
+    
+    def get_history_changes(self, start_history_id):
+        """start_history_id 이후 추가/삭제된 메일 ID 조회
+        
+        반환값: {'added': [...], 'deleted': [...], 'history_id': ...}
+        historyId가 만료되어 전체 동기화가 필요하면 None을 반환합니다.
+        """
+        if not self.service:
+            return None
+        
+        added = []
+        deleted = set()
+        history_id = start_history_id
+        page_token = None
+        
+        try:
+            while True:
+                params = {
+                    'userId': 'me',
+                    'startHistoryId': start_history_id,
+                    'historyTypes': ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+                }
+                if page_token:
+                    params['pageToken'] = page_token
+                gmail_rate_limiter.acquire('history.list')
+                results = self.service.users().history().list(**params).execute()
+                
+                for record in results.get('history', []):
+                    for item in record.get('messagesAdded', []):
+                        message = item['message']
+                        if not HIDDEN_LABELS.intersection(message.get('labelIds', [])):
+                            added.append(message['id'])
+                            deleted.discard(message['id'])
+                    for item in record.get('messagesDeleted', []):
+                        deleted.add(item['message']['id'])
+                    # 휴지통/스팸 이동은 삭제로, 복구는 추가로 취급
+                    for item in record.get('labelsAdded', []):
+                        if HIDDEN_LABELS.intersection(item.get('labelIds', [])):
+                            deleted.add(item['message']['id'])
+                    for item in record.get('labelsRemoved', []):
+                        message = item['message']
+                        if (HIDDEN_LABELS.intersection(item.get('labelIds', []))
+                                and not HIDDEN_LABELS.intersection(message.get('labelIds', []))):
+                            added.append(message['id'])
+                            deleted.discard(message['id'])
+                
+                history_id = results.get('historyId', history_id)
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as http_err:
+            if http_err.resp.status == 404:
+                # historyId 만료 - 전체 동기화 필요
+                return None
+            st.warning(f"메일 변경 이력 조회 실패: {str(http_err)}")
+            return None
+        except Exception as e:
+            st.warning(f"메일 변경 이력 조회 실패: {str(e)}")
+            return None
+        
+        # 중복 제거 (순서 유지), 이후 삭제된 메일 제외
+        added = [message_id for message_id in dict.fromkeys(added) if message_id not in deleted]
+        return {'added': added, 'deleted': list(deleted), 'history_id': history_id}
     
     def move_to_trash(self, message_id):
         """메일을 휴지통으로 이동"""
@@ -121,6 +327,7 @@ class GmailService:
             return False
         
         try:
+            gmail_rate_limiter.acquire('messages.trash')
             result = self.service.users().messages().trash(userId='me', id=message_id).execute()
             
             if result and 'id' in result:
@@ -139,141 +346,541 @@ class GmailService:
                 st.error(f"❌ 메일 이동 실패: {error_msg}")
             return False
     
+    def trash_many(self, message_ids):
+        """여러 메일을 batchModify로 한 번에 휴지통으로 이동
+        
+        요청당 최대 MAIL_CONFIG['modify_batch_size']개(1000개)씩 처리합니다.
+        반환값: {message_id: 성공 여부}
+        묶음별 할당량 대기 시간의 합은 gmail_rate_limiter.last_wait로 확인할 수 있습니다.
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        if not self.service:
+            st.error("❌ Gmail 인증이 필요합니다.")
+            return {message_id: False for message_id in message_ids}
+        
+        outcomes = {}
+        waited = 0.0
+        chunk_size = MAIL_CONFIG['modify_batch_size']
+        for start in range(0, len(message_ids), chunk_size):
+            chunk = message_ids[start:start + chunk_size]
+            try:
+                waited += gmail_rate_limiter.acquire('messages.batchModify')
+                # batchModify는 성공 시 빈 응답을 반환 - 묶음 단위로 결과 기록
+                self.service.users().messages().batchModify(
+                    userId='me',
+                    body={'ids': chunk, 'addLabelIds': ['TRASH']}
+                ).execute()
+                outcomes.update({message_id: True for message_id in chunk})
+            except Exception as e:
+                st.error(f"❌ 메일 일괄 이동 실패 ({len(chunk)}개): {str(e)}")
+                outcomes.update({message_id: False for message_id in chunk})
+        
+        gmail_rate_limiter.record_wait(waited)
+        return outcomes
+    
     def get_raw_message(self, message_id):
         """Raw 형식으로 메일 가져오기"""
+        raw_data = self.get_raw_bytes(message_id)
+        if raw_data is None:
+            return None
+        return email.message_from_bytes(raw_data, policy=policy.default)
+    
+    def get_attachment_data(self, message_id, part_path):
+        """part_path 위치 파트 내용을 원본 메일 전체 대신 첨부파일 API로 가져오기
+
+        Gmail partId는 MIME 트리 위치를 '.'로 이은 값이므로 part_path와 대응합니다.
+        반환값: base64url 문자열 (실패 시 None)
+        """
         if not self.service:
             st.error("❌ Gmail 서비스가 초기화되지 않았습니다.")
             return None
         
         try:
+            body = self._find_part_body(message_id, part_path)
+            if body is None:
+                return None
+            # 작은 파트는 본문이 응답에 바로 포함됨
+            if 'data' in body:
+                return body['data']
+            gmail_rate_limiter.acquire('messages.attachments.get')
+            attachment = self.service.users().messages().attachments().get(
+                userId='me', messageId=message_id, id=body['attachmentId']
+            ).execute()
+            return attachment.get('data', '')
+        except Exception as e:
+            st.error(f"첨부파일 가져오기 실패: {str(e)}")
+            return None
+    
+    def download_attachment(self, message_id, part_path, file_obj):
+        """part_path 위치 파트 내용을 디코딩하여 file_obj에 기록 (큰 첨부파일용, 반환값: 성공 여부)
+
+        첨부파일 API는 base64url 값을 JSON으로 감싸 돌려주므로 범위 요청으로 나눠 받을 수 없습니다.
+        응답 본문을 MediaIoBaseDownload로 임시 파일에 받은 뒤 파일에서 청크 단위로 디코딩하여
+        base64 문자열 전체를 JSON 파싱 결과로 메모리에 만들지 않습니다.
+        """
+        if not self.service:
+            st.error("❌ Gmail 서비스가 초기화되지 않았습니다.")
+            return False
+        
+        body = self._find_part_body(message_id, part_path)
+        if body is None:
+            return False
+        if 'data' in body:
+            EmailParser.write_base64url(body['data'], file_obj)
+            return True
+        
+        gmail_rate_limiter.acquire('messages.attachments.get')
+        request = self.service.users().messages().attachments().get(
+            userId='me', messageId=message_id, id=body['attachmentId'], fields='data'
+        )
+        with tempfile.TemporaryFile() as response_file:
+            downloader = MediaIoBaseDownload(response_file, request, chunksize=ATTACHMENT_CONFIG['download_chunk_bytes'])
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+            response_file.seek(0)
+            match = ATTACHMENT_DATA_RE.match(response_file.read(64))
+            if match:
+                response_file.seek(match.end())
+                EmailParser.write_base64url_stream(response_file, file_obj)
+        return True
+    
+    def _find_part_body(self, message_id, part_path):
+        """format=full 파트 트리에서 part_path 위치 파트의 body 반환 (없거나 내용이 없으면 None)"""
+        part_id = '.'.join(map(str, part_path))
+        gmail_rate_limiter.acquire('messages.get')
+        message = self.service.users().messages().get(
+            userId='me', id=message_id, format='full', fields=ATTACHMENT_FIELDS
+        ).execute()
+        parts = [message.get('payload', {})]
+        while parts:
+            part = parts.pop()
+            if part.get('partId', '') == part_id:
+                body = part.get('body', {})
+                return body if 'data' in body or body.get('attachmentId') else None
+            parts.extend(part.get('parts', []))
+        return None
+    
+    def get_raw_bytes(self, message_id):
+        """Raw 형식 메일을 파싱하지 않은 RFC 822 바이트로 가져오기"""
+        if not self.service:
+            st.error("❌ Gmail 서비스가 초기화되지 않았습니다.")
+            return None
+        
+        try:
+            gmail_rate_limiter.acquire('messages.get')
             msg = self.service.users().messages().get(userId='me', id=message_id, format='raw').execute()
+            return base64.urlsafe_b64decode(msg['raw'])
             
-            # Base64 디코딩
-            import base64
-            raw_data = base64.urlsafe_b64decode(msg['raw'])
-            
-            # 이메일 파싱
-            email_message = email.message_from_bytes(raw_data, policy=policy.default)
-            
-            return email_message
+        except HttpError:
+            # 429 등 HTTP 오류는 호출 측에서 상태 코드로 재시도 판단
+            raise
             
         except Exception as e:
             st.error(f"Raw 메일 가져오기 실패: {str(e)}")
             return None
+    
+    def get_raw_messages(self, message_ids, as_bytes=False):
+        """여러 메일을 Raw 형식으로 배치 요청하여 가져오기
+        
+        배치당 최대 MAIL_CONFIG['batch_size']개씩 나누어 요청합니다.
+        반환값: ({message_id: email.message.EmailMessage}, {message_id: 오류 메시지})
+        as_bytes=True이면 파싱하지 않은 RFC 822 바이트를 반환합니다.
+        워커 스레드들의 할당량 대기 시간 합은 gmail_rate_limiter.last_wait로 확인할 수 있습니다.
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        if not self.service:
+            st.error("❌ Gmail 서비스가 초기화되지 않았습니다.")
+            return {}, {message_id: "Gmail 서비스가 초기화되지 않았습니다." for message_id in message_ids}
+        
+        email_messages = {}
+        errors = {}
+        rate_limited = []
+        # 할당량 초과 응답의 Retry-After 값 (없으면 None)
+        retry_afters = []
+        
+        def callback(request_id, response, exception):
+            # request_id로 메일 ID를 사용
+            if exception is not None:
+                if is_rate_limit_error(exception):
+                    rate_limited.append(request_id)
+                    retry_afters.append(get_retry_after(exception, None))
+                errors[request_id] = str(exception)
+                return
+            try:
+                if as_bytes:
+                    email_messages[request_id] = base64.urlsafe_b64decode(response['raw'])
+                else:
+                    email_messages[request_id] = self._parse_raw_message(response['raw'])
+            except Exception as e:
+                errors[request_id] = f"메일 파싱 실패: {str(e)}"
+        
+        def fetch_chunk(chunk):
+            # 워커 스레드 안에서 요청을 만들어 해당 스레드의 전송을 사용
+            batch = self.service.new_batch_http_request(callback=callback)
+            for message_id in chunk:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=message_id, format='raw'),
+                    request_id=message_id
+                )
+            waited = gmail_rate_limiter.acquire('messages.get', len(chunk))
+            try:
+                batch.execute()
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    rate_limited.extend(message_id for message_id in chunk if message_id not in email_messages)
+                    retry_afters.append(get_retry_after(e, None))
+                for message_id in chunk:
+                    if message_id not in email_messages:
+                        errors.setdefault(message_id, f"배치 요청 실패: {str(e)}")
+            return waited
+        
+        batch_size = MAIL_CONFIG['batch_size']
+        pending = message_ids
+        waited = 0.0
+        for attempt in range(RATE_LIMIT_CONFIG['max_retries']):
+            # 배치 묶음들을 제한된 워커 풀에서 병렬 실행
+            chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+            waited += sum(map_concurrent(fetch_chunk, chunks))
+            
+            # 할당량 초과로 실패한 메일만 대기 후 재요청 (마지막 시도의 실패는 errors에 남기고 대기하지 않음)
+            if not rate_limited or attempt == RATE_LIMIT_CONFIG['max_retries'] - 1:
+                break
+            pending = list(dict.fromkeys(rate_limited))
+            rate_limited.clear()
+            # 서버가 알려준 Retry-After 중 가장 긴 값, 없으면 지수 백오프
+            delay = max(
+                (seconds for seconds in retry_afters if seconds is not None),
+                default=RATE_LIMIT_CONFIG['backoff_seconds'] * (2 ** attempt)
+            )
+            retry_afters.clear()
+            gmail_rate_limiter.backoff(delay)
+            for message_id in pending:
+                errors.pop(message_id, None)
+        
+        # 워커 스레드의 대기 시간은 해당 스레드에만 남으므로 합계를 호출한 스레드에 기록
+        gmail_rate_limiter.record_wait(waited)
+        return email_messages, errors
+    
+    @staticmethod
+    def _parse_raw_message(raw):
+        """Base64 raw 데이터를 email.message 객체로 파싱"""
+        raw_data = base64.urlsafe_b64decode(raw)
+        return email.message_from_bytes(raw_data, policy=policy.default)
 
 class EmailParser:
     """이메일 파싱 클래스"""
     
     @staticmethod
-    def extract_text_from_email(email_message):
-        """이메일에서 텍스트 추출"""
-        text_content = ""
-        html_content = ""
+    def parse_capped(raw_data, max_chars):
+        """분류/LLM용 제한 파싱 - BytesFeedParser로 스트리밍 파싱
         
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                # 첨부파일이 아닌 경우만 처리
-                if "attachment" not in content_disposition:
-                    if content_type == "text/plain":
-                        try:
-                            text_content += part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        except:
-                            text_content += part.get_payload(decode=True).decode('latin-1', errors='ignore')
-                    elif content_type == "text/html":
-                        try:
-                            html_content += part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        except:
-                            html_content += part.get_payload(decode=True).decode('latin-1', errors='ignore')
-        else:
-            # 단일 파트 메일
-            content_type = email_message.get_content_type()
-            if content_type == "text/plain":
-                try:
-                    text_content = email_message.get_payload(decode=True).decode('utf-8', errors='ignore')
-                except:
-                    text_content = email_message.get_payload(decode=True).decode('latin-1', errors='ignore')
-            elif content_type == "text/html":
-                try:
-                    html_content = email_message.get_payload(decode=True).decode('utf-8', errors='ignore')
-                except:
-                    html_content = email_message.get_payload(decode=True).decode('latin-1', errors='ignore')
+        첨부파일 본문은 파서에 넣지 않고(크기만 계산), 텍스트 파트도 예산을 넘는 줄은
+        넣지 않으므로 메일 크기와 관계없이 파싱 메모리가 제한됩니다.
+        텍스트/HTML은 합쳐서 max_chars까지만 디코딩합니다.
+        반환값: {'subject', 'from', 'to', 'date', 'text', 'html', 'attachments'}
+        """
+        skipped_sizes = []
+        parser = BytesFeedParser(policy=policy.default)
+        # base64 인코딩(4/3)과 UTF-8 최대 4바이트를 고려한 파트당 입력 상한
+        for line in EmailParser._iter_capped_lines(raw_data, max_chars * 8, skipped_sizes):
+            parser.feed(line)
+        email_message = parser.close()
         
-        return text_content, html_content
-    
-    @staticmethod
-    def extract_attachments(email_message):
-        """이메일에서 첨부파일 추출"""
+        text_parts = []
+        html_parts = []
         attachments = []
+        remaining = max_chars
+        for part_path, part in EmailParser.iter_parts(email_message):
+            if part.is_multipart():
+                continue
+            skipped_index = part.get(SKIPPED_PART_HEADER)
+            if skipped_index is not None:
+                filename = part.get_filename()
+                if filename:
+                    attachments.append({
+                        'filename': filename,
+                        'content_type': part.get_content_type(),
+                        'size': skipped_sizes[int(skipped_index)],
+                        'part_path': list(part_path)
+                    })
+                continue
+            
+            content_type = part.get_content_type()
+            if content_type not in ("text/plain", "text/html") or remaining <= 0:
+                continue
+            decoded = EmailParser.decode_text_part(part, max_chars=remaining)
+            remaining -= len(decoded)
+            (text_parts if content_type == "text/plain" else html_parts).append(decoded)
         
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                if "attachment" in content_disposition:
-                    filename = part.get_filename()
-                    if filename:
-                        try:
-                            file_data = part.get_payload(decode=True)
-                            attachments.append({
-                                'filename': filename,
-                                'data': file_data,
-                                'content_type': part.get_content_type(),
-                                'size': len(file_data)
-                            })
-                        except Exception as e:
-                            st.warning(f"첨부파일 {filename} 처리 실패: {str(e)}")
-        
-        return attachments
-    
+        return {
+            'subject': email_message.get('Subject', '제목 없음'),
+            'from': email_message.get('From', '발신자 없음'),
+            'to': email_message.get('To', '수신자 없음'),
+            'date': email_message.get('Date', '날짜 없음'),
+            'text': ''.join(text_parts),
+            'html': ''.join(html_parts),
+            'attachments': attachments
+        }
+
     @staticmethod
-    def clean_html_content(html_content):
-        """HTML 콘텐츠를 정리하고 안전하게 렌더링"""
-        try:
-            # BeautifulSoup으로 HTML 파싱
-            soup = BeautifulSoup(html_content, 'html.parser')
+    def strip_capped(raw_data, max_chars):
+        """parse_capped가 읽지 않는 첨부파일 본문과 예산을 넘는 줄을 뺀 원본 바이트
+
+        다른 프로세스로 보내기 전에 큰 메일을 줄이는 용도이며, 결과를 parse_capped에 넣으면
+        첨부파일 크기(0으로 표시)를 제외하고 같은 결과를 얻습니다.
+        """
+        return b''.join(EmailParser._iter_capped_lines(raw_data, max_chars * 8, []))
+
+    @staticmethod
+    def _iter_capped_lines(raw_data, max_part_bytes, skipped_sizes):
+        """파서에 넣을 줄만 골라내는 MIME 경계 인식 필터
+        
+        - 헤더와 경계 줄은 그대로 전달
+        - 본문이 아닌 파트(첨부파일, 비텍스트)는 본문을 버리고 크기만 skipped_sizes에 기록하며,
+          헤더에 SKIPPED_PART_HEADER로 skipped_sizes 인덱스를 표시
+        - 본문 파트도 max_part_bytes를 넘는 줄은 버림
+        - 첨부된 메일(message/rfc822)은 안쪽 메일의 헤더와 파트에 같은 규칙을 적용
+        """
+        boundaries = []
+        in_headers = True
+        header_lines = []
+        skip = False
+        base64_body = False
+        fed_bytes = 0
+        pos = 0
+        end = len(raw_data)
+        
+        while pos < end:
+            # 버리는 본문은 줄 단위로 읽지 않고 다음 경계 후보('\n--')로 바로 이동
+            if not in_headers and boundaries and (skip or fed_bytes >= max_part_bytes):
+                # 본문이 비어 경계 줄이 바로 이어지는 경우도 찾도록 앞 줄의 줄바꿈부터 검색
+                next_pos = raw_data.find(b'\n--', max(pos - 1, 0))
+                next_pos = end if next_pos < 0 else next_pos + 1
+                if skip:
+                    # 복사 없이 범위 내 공백을 빼서 인코딩된 길이 계산
+                    size = (next_pos - pos) - sum(
+                        raw_data.count(ws, pos, next_pos) for ws in (b'\n', b'\r', b' ', b'\t')
+                    )
+                    if base64_body:
+                        size = size * 3 // 4 - raw_data[max(pos, next_pos - 8):next_pos].rstrip()[-2:].count(b'=')
+                    skipped_sizes[-1] += size
+                pos = next_pos
+                if pos >= end:
+                    break
             
-            # 스크립트 태그 제거
-            for script in soup(["script", "style"]):
-                script.decompose()
+            line_end = raw_data.find(b'\n', pos)
+            line_end = end if line_end < 0 else line_end + 1
+            line = raw_data[pos:line_end]
+            pos = line_end
             
-            # 위험한 태그들 제거 또는 변환
-            dangerous_tags = ['iframe', 'object', 'embed', 'form', 'input', 'button']
-            for tag in dangerous_tags:
-                for element in soup.find_all(tag):
-                    element.decompose()
+            if in_headers:
+                if line.strip():
+                    header_lines.append(line)
+                    continue
+                # 헤더 끝 - 파트 종류 판단
+                headers = BytesHeaderParser(policy=policy.compat32).parsebytes(b''.join(header_lines))
+                maintype = headers.get_content_maintype()
+                disposition = str(headers.get('Content-Disposition', ''))
+                if maintype == 'multipart' and headers.get_param('boundary'):
+                    boundaries.append(('--' + headers.get_param('boundary')).encode('utf-8', 'surrogateescape'))
+                base64_body = str(headers.get('Content-Transfer-Encoding', '')).strip().lower() == 'base64'
+                if headers.get_content_type() == 'message/rfc822' and not base64_body:
+                    # 첨부된 메일은 parse_parts처럼 첨부 여부와 관계없이 안쪽 헤더와 파트를 같은 규칙으로 거름
+                    yield from header_lines
+                    yield line
+                    header_lines = []
+                    continue
+                skip = maintype not in ('text', 'multipart', 'message') or 'attachment' in disposition
+                if skip:
+                    skipped_sizes.append(0)
+                    header_lines.append(f"{SKIPPED_PART_HEADER}: {len(skipped_sizes) - 1}\r\n".encode('ascii'))
+                yield from header_lines
+                yield line
+                header_lines = []
+                in_headers = False
+                fed_bytes = 0
+                continue
             
-            # 외부 링크를 안전하게 처리
-            for link in soup.find_all('a'):
-                if link.get('href'):
-                    link['target'] = '_blank'
-                    link['rel'] = 'noopener noreferrer'
+            if line.startswith(b'--') and boundaries:
+                stripped = line.rstrip()
+                matched = next((b for b in reversed(boundaries) if stripped in (b, b + b'--')), None)
+                if matched is not None:
+                    skip = False
+                    fed_bytes = 0
+                    if stripped == matched + b'--':
+                        # 닫는 경계 - 해당 multipart 종료 (에필로그는 본문으로 처리)
+                        del boundaries[boundaries.index(matched):]
+                    else:
+                        del boundaries[boundaries.index(matched) + 1:]
+                        in_headers = True
+                    yield line
+                    continue
             
-            # 이미지 태그 정리
-            for img in soup.find_all('img'):
-                if not img.get('src'):
-                    img.decompose()
+            if skip or fed_bytes >= max_part_bytes:
+                # 경계가 없는(단일 파트) 메일의 나머지 본문
+                continue
+            fed_bytes += len(line)
+            yield line
+        
+        if in_headers and header_lines:
+            yield from header_lines
+    
+    @staticmethod
+    def extract_text_from_email(email_message):
+        """이메일에서 텍스트 추출"""
+        parsed = EmailParser.parse_parts(email_message, want_attachments=False)
+        return parsed['text'], parsed['html']
+    
+    @staticmethod
+    def extract_attachments(email_message):
+        """이메일에서 첨부파일 메타데이터 추출 (내용은 디코딩하지 않음)
+        
+        part_path는 MIME 트리에서의 위치(자식 인덱스 목록)로,
+        mail_utils.load_attachment에서 실제 파트를 다시 찾을 때 사용합니다.
+        """
+        return EmailParser.parse_parts(email_message, want_text=False, want_html=False)['attachments']
+    
+    @staticmethod
+    def parse_parts(email_message, want_text=True, want_html=True, want_attachments=True):
+        """MIME 트리를 한 번만 순회하며 텍스트, HTML, 첨부파일 메타데이터를 함께 추출
+        
+        요청하지 않은 종류의 파트는 디코딩하지 않습니다.
+        반환값: {'text': str, 'html': str, 'attachments': [...]}
+        """
+        text_parts = []
+        html_parts = []
+        attachments = []
+        
+        for part_path, part in EmailParser.iter_parts(email_message):
+            if part.is_multipart():
+                continue
             
-            return str(soup)
+            content_disposition = str(part.get("Content-Disposition"))
+            if "attachment" in content_disposition:
+                if not want_attachments:
+                    continue
+                filename = part.get_filename()
+                if filename:
+                    try:
+                        attachments.append({
+                            'filename': filename,
+                            'content_type': part.get_content_type(),
+                            'size': EmailParser.estimate_decoded_size(part),
+                            'part_path': list(part_path)
+                        })
+                    except Exception as e:
+                        st.warning(f"첨부파일 {filename} 처리 실패: {str(e)}")
+                continue
             
-        except Exception as e:
-            # HTML 파싱 실패 시 텍스트만 추출
-            return EmailParser.extract_text_from_html(html_content)
+            content_type = part.get_content_type()
+            if content_type == "text/plain" and want_text:
+                text_parts.append(EmailParser.decode_text_part(part))
+            elif content_type == "text/html" and want_html:
+                html_parts.append(EmailParser.decode_text_part(part))
+        
+        return {
+            'text': ''.join(text_parts),
+            'html': ''.join(html_parts),
+            'attachments': attachments
+        }
     
     @staticmethod
-    def extract_text_from_html(html_content):
-        """HTML에서 텍스트만 추출"""
+    def decode_text_part(part, max_chars=None):
+        """텍스트 파트를 선언된 charset으로 한 번만 디코딩
+        
+        max_chars가 주어지면 인코딩된 payload의 앞부분만 디코딩합니다.
+        """
+        if max_chars is None:
+            payload = part.get_payload(decode=True)
+        else:
+            # UTF-8 한 글자는 최대 4바이트
+            payload = EmailParser._decode_payload_prefix(part, max_chars * 4)
+        if not payload:
+            return ''
+        charset = part.get_content_charset() or 'utf-8'
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            return soup.get_text(separator='\n', strip=True)
-        except:
-            # HTML 태그 제거
-            clean_text = re.sub(r'<[^>]+>', '', html_content)
-            # HTML 엔티티 디코딩
-            clean_text = clean_text.replace('&nbsp;', ' ').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
-            return clean_text
+            text = payload.decode(charset, errors='ignore')
+        except LookupError:
+            # 알 수 없는 charset
+            text = payload.decode('utf-8', errors='ignore')
+        return text if max_chars is None else text[:max_chars]
+    
+    @staticmethod
+    def _decode_payload_prefix(part, max_bytes):
+        """전송 인코딩된 payload에서 약 max_bytes 바이트 분량의 앞부분만 디코딩"""
+        payload = part.get_payload()
+        encoding = str(part.get('Content-Transfer-Encoding', '')).lower()
+        if isinstance(payload, str):
+            if encoding == 'base64':
+                # base64는 4글자당 3바이트 + 줄바꿈 여유분
+                encoded = ''.join(payload[:max_bytes * 2].split())
+                return base64.b64decode(encoded[:len(encoded) - len(encoded) % 4])
+            if encoding == 'quoted-printable':
+                return quopri.decodestring(payload[:max_bytes * 3].encode('ascii', 'surrogateescape'))
+        return (part.get_payload(decode=True) or b'')[:max_bytes]
+    
+    @staticmethod
+    def iter_parts(email_message, part_path=()):
+        """MIME 트리를 순회하며 (part_path, part) 반환 - walk()와 같은 순서"""
+        yield part_path, email_message
+        if email_message.is_multipart():
+            for index, sub_part in enumerate(email_message.get_payload()):
+                yield from EmailParser.iter_parts(sub_part, part_path + (index,))
+    
+    @staticmethod
+    def estimate_decoded_size(part):
+        """디코딩하지 않고 인코딩된 길이로 첨부파일 크기 추정"""
+        payload = part.get_payload()
+        if not isinstance(payload, str):
+            return 0
+        return EmailParser.estimate_encoded_size(part, payload)
+    
+    @staticmethod
+    def estimate_encoded_size(part, payload):
+        """전송 인코딩된 payload의 디코딩 후 크기 추정"""
+        encoding = str(part.get('Content-Transfer-Encoding', '')).lower()
+        if encoding == 'base64':
+            encoded_len = len(payload) - payload.count('\n') - payload.count('\r') - payload.count(' ')
+            return max(0, encoded_len * 3 // 4 - payload.rstrip()[-2:].count('='))
+        return len(payload)
+    
+    @staticmethod
+    def write_base64url(data, file_obj, chunk_chars=1024 * 1024):
+        """첨부파일 API의 base64url 문자열을 청크 단위로 디코딩하여 기록"""
+        chunk_chars -= chunk_chars % 4
+        for start in range(0, len(data), chunk_chars):
+            chunk = data[start:start + chunk_chars]
+            file_obj.write(base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4)))
+    
+    @staticmethod
+    def write_base64url_stream(src, file_obj, chunk_bytes=1024 * 1024):
+        """바이너리 스트림의 base64url 값(닫는 따옴표 또는 스트림 끝까지)을 청크 단위로 디코딩하여 기록"""
+        rest = b''
+        while True:
+            chunk = src.read(chunk_bytes)
+            end = chunk.find(b'"')
+            if end != -1:
+                chunk = chunk[:end]
+            data = rest + chunk
+            if end == -1 and chunk:
+                # 4글자 단위로만 디코딩하고 나머지는 다음 청크와 합침
+                cut = len(data) - len(data) % 4
+                data, rest = data[:cut], data[cut:]
+            if data:
+                file_obj.write(base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4)))
+            if end != -1 or not chunk:
+                return
+    
+    @staticmethod
+    def clean_html_content(html_content, message_id=None):
+        """HTML 콘텐츠를 정리하고 안전하게 렌더링 (메일별로 메모이즈)"""
+        return html_processor.clean(html_content, message_id)
+    
+    @staticmethod
+    def extract_text_from_html(html_content, message_id=None):
+        """HTML에서 텍스트만 추출 (메일별로 메모이즈)"""
+        return html_processor.to_text(html_content, message_id)
 
 # 전역 Gmail 서비스 인스턴스
 gmail_service = GmailService()
@@ -0,0 +1,71 @@
+"""
+DeepMail - 스레드 안전 Gmail HTTP 전송 계층 모듈
+"""
+
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+import google_auth_httplib2
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+from config import TRANSPORT_CONFIG
+
+
+class ThreadLocalHttpPool:
+    """스레드마다 하나의 AuthorizedHttp를 두는 전송 풀
+
+    httplib2.Http는 스레드 안전하지 않으므로 스레드별로 따로 만들고,
+    같은 스레드 안에서는 재사용하여 keep-alive 연결을 유지합니다.
+    모든 전송은 하나의 credentials 객체를 공유하므로 토큰 갱신도 한 번이면 됩니다.
+    """
+
+    def __init__(self, credentials, timeout=None):
+        self.credentials = credentials
+        self.timeout = timeout or TRANSPORT_CONFIG['timeout']
+        self._local = threading.local()
+
+    def get(self):
+        """현재 스레드 전용 AuthorizedHttp 반환 (없으면 생성)"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(
+                self.credentials,
+                http=httplib2.Http(timeout=self.timeout)
+            )
+            self._local.http = http
+        return http
+
+    def build_request(self, http, *args, **kwargs):
+        """googleapiclient requestBuilder - 요청을 실행 스레드의 전송에 연결"""
+        return HttpRequest(self.get(), *args, **kwargs)
+
+
+def build_gmail_service(credentials):
+    """스레드별 전송 풀을 사용하는 Gmail API 서비스 생성"""
+    pool = ThreadLocalHttpPool(credentials)
+    return build('gmail', 'v1', credentials=credentials, requestBuilder=pool.build_request)
+
+
+# 스레드별 AuthorizedHttp(keep-alive 연결)가 호출 사이에도 유지되도록 워커 풀을 프로세스 동안 재사용
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TRANSPORT_CONFIG['max_workers'], thread_name_prefix='gmail')
+            atexit.register(_executor.shutdown, wait=False)
+        return _executor
+
+
+def map_concurrent(func, items, max_workers=None):
+    """공유 워커 풀에서 func(item)을 병렬 실행하고 입력 순서대로 결과 반환 (max_workers가 1 이하면 현재 스레드에서 실행)"""
+    items = list(items)
+    if not items:
+        return []
+    if min(max_workers or TRANSPORT_CONFIG['max_workers'], len(items)) <= 1:
+        return [func(item) for item in items]
+    return list(_get_executor().map(func, items))
@@ -0,0 +1,291 @@
+"""
+DeepMail - HTML 텍스트 추출/정리 백엔드 모듈
+"""
+
+import hashlib
+import html
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+from config import HTML_CONFIG
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# 텍스트 추출 시 내용을 무시하는 태그
+STRIP_TAGS = ('script', 'style')
+
+# 정리(sanitize) 결과 형식이 바뀌면 올려서 저장된 결과를 무효화
+SANITIZER_VERSION = 1
+
+# 내용까지 통째로 제거하는 태그 (embed/input 같은 빈 태그는 허용 목록에 없으므로 그냥 버려짐)
+DROP_CONTENT_TAGS = frozenset({
+    'script', 'style', 'head', 'title', 'iframe', 'frameset', 'object', 'applet',
+    'form', 'button', 'select', 'textarea', 'option', 'noscript', 'template', 'svg', 'math'
+})
+HEAD_TAGS = frozenset({'head', 'title'})
+
+# 렌더링을 허용하는 태그 (그 외 태그는 벗겨내고 내용만 유지)
+ALLOWED_TAGS = frozenset({
+    'a', 'abbr', 'address', 'article', 'b', 'bdi', 'bdo', 'big', 'blockquote', 'br', 'caption', 'center',
+    'cite', 'code', 'col', 'colgroup', 'dd', 'del', 'details', 'dfn', 'div', 'dl', 'dt', 'em', 'figcaption',
+    'figure', 'font', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'i', 'img', 'ins', 'kbd',
+    'li', 'main', 'mark', 'nav', 'ol', 'p', 'pre', 'q', 's', 'samp', 'section', 'small', 'span', 'strike',
+    'strong', 'sub', 'summary', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'time', 'tr', 'tt',
+    'u', 'ul', 'var', 'wbr'
+})
+
+VOID_TAGS = frozenset({'br', 'col', 'hr', 'img', 'wbr'})
+
+# 닫는 태그 없이 열려도 앞의 같은 종류 태그를 닫는 태그 (<td>1<td>2, <li>a<li>b)
+AUTO_CLOSE = {
+    'td': frozenset({'td', 'th'}),
+    'th': frozenset({'td', 'th'}),
+    'tr': frozenset({'tr', 'td', 'th'}),
+    'li': frozenset({'li'}),
+    'dt': frozenset({'dt', 'dd'}),
+    'dd': frozenset({'dt', 'dd'}),
+    'p': frozenset({'p'}),
+}
+SCOPE_TAGS = frozenset({'table', 'ul', 'ol', 'dl', 'div', 'blockquote'})
+
+# 태그 공통 허용 속성과 태그별 추가 허용 속성
+COMMON_ATTRS = frozenset({'align', 'bgcolor', 'dir', 'lang', 'style', 'title', 'valign', 'width', 'height'})
+TAG_ATTRS = {
+    'a': frozenset({'href', 'name'}),
+    'img': frozenset({'src', 'alt', 'border'}),
+    'font': frozenset({'color', 'face', 'size'}),
+    'table': frozenset({'border', 'cellpadding', 'cellspacing'}),
+    'td': frozenset({'colspan', 'rowspan', 'nowrap'}),
+    'th': frozenset({'colspan', 'rowspan', 'nowrap'}),
+    'col': frozenset({'span'}),
+    'colgroup': frozenset({'span'}),
+    'ol': frozenset({'start', 'type'}),
+    'ul': frozenset({'type'}),
+}
+URL_ATTRS = frozenset({'href', 'src'})
+SAFE_URL_RE = re.compile(r'^(?:https?:|mailto:|tel:|#|data:image/(?:png|gif|jpe?g|webp);)', re.IGNORECASE)
+UNSAFE_STYLE_RE = re.compile(r'expression\s*\(|javascript:|vbscript:|-moz-binding|behavior\s*:', re.IGNORECASE)
+
+
+class HtmlBackend(ABC):
+    """HTML 텍스트 추출 백엔드 인터페이스"""
+
+    name = 'base'
+
+    @abstractmethod
+    def to_text(self, html_content):
+        """HTML에서 텍스트만 추출"""
+
+
+class BeautifulSoupBackend(HtmlBackend):
+    """BeautifulSoup(html.parser) 기반 기본 백엔드"""
+
+    name = 'html.parser'
+
+    def to_text(self, html_content):
+        soup = BeautifulSoup(html_content, 'html.parser')
+        return soup.get_text(separator='\n', strip=True)
+
+
+class LxmlBackend(HtmlBackend):
+    """lxml(libxml2) 기반 고속 백엔드 - 결과 형식은 BeautifulSoupBackend와 동일"""
+
+    name = 'lxml'
+
+    @staticmethod
+    def _iter_strings(root):
+        # get_text(strip=True)와 같이 script/style/주석 내용은 제외
+        for element in root.iter():
+            if isinstance(element.tag, str) and element.tag not in STRIP_TAGS and element.text:
+                yield element.text
+            if element is not root and element.tail:
+                yield element.tail
+
+    def to_text(self, html_content):
+        root = lxml.html.fromstring(html_content)
+        return '\n'.join(s for s in (text.strip() for text in self._iter_strings(root)) if s)
+
+
+class HtmlSanitizer(HTMLParser):
+    """허용 목록 기반 단일 패스 HTML 정리기
+
+    트리를 만들지 않고 토큰을 한 번 훑으면서
+    - 허용되지 않은 태그는 벗겨내고(DROP_CONTENT_TAGS는 내용까지 제거)
+    - 허용되지 않은 속성, 안전하지 않은 URL/스타일을 제거하고
+    - 링크에 target/rel을 지정하고 src 없는 이미지를 버립니다.
+    열린 태그는 스택으로 추적하여 항상 닫힌 HTML을 출력합니다.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._out = []
+        self._open = []
+        self._skip = []
+
+    def sanitize(self, html_content):
+        self._out = []
+        self._open = []
+        self._skip = []
+        self.reset()
+        self.feed(html_content)
+        self.close()
+        self._close_to(0)
+        return ''.join(self._out)
+
+    @staticmethod
+    def _clean_attrs(tag, attrs):
+        allowed = TAG_ATTRS.get(tag, frozenset())
+        cleaned = {}
+        for name, value in attrs:
+            if value is None or (name not in COMMON_ATTRS and name not in allowed):
+                continue
+            value = value.strip()
+            if name in URL_ATTRS and not SAFE_URL_RE.match(value):
+                continue
+            if name == 'style' and UNSAFE_STYLE_RE.search(value):
+                continue
+            cleaned[name] = value
+        return cleaned
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'body' and all(skipped in HEAD_TAGS for skipped in self._skip):
+            # 닫히지 않은 <head>가 본문을 삼키지 않도록 body에서 종료
+            self._skip.clear()
+        if tag in DROP_CONTENT_TAGS:
+            self._skip.append(tag)
+            return
+        if self._skip or tag not in ALLOWED_TAGS:
+            return
+
+        if tag in AUTO_CLOSE:
+            self._auto_close(AUTO_CLOSE[tag])
+
+        cleaned = self._clean_attrs(tag, attrs)
+        if tag == 'img' and not cleaned.get('src'):
+            return
+        if tag == 'a' and cleaned.get('href'):
+            cleaned['target'] = '_blank'
+            cleaned['rel'] = 'noopener noreferrer'
+
+        attr_text = ''.join(f' {name}="{html.escape(value)}"' for name, value in cleaned.items())
+        self._out.append(f'<{tag}{attr_text}>')
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+
+    def _auto_close(self, closable):
+        # 가장 가까운 범위 태그 안에서 가장 바깥쪽의 닫을 태그까지 닫음
+        target = None
+        for index in range(len(self._open) - 1, -1, -1):
+            open_tag = self._open[index]
+            if open_tag in SCOPE_TAGS:
+                break
+            if open_tag in closable:
+                target = index
+        if target is not None:
+            self._close_to(target)
+
+    def _close_to(self, index):
+        while len(self._open) > index:
+            self._out.append(f'</{self._open.pop()}>')
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._skip:
+            while self._skip.pop() != tag:
+                pass
+            return
+        if self._skip or tag not in self._open:
+            return
+        # 중간에 닫히지 않은 태그는 함께 닫음
+        self._close_to(len(self._open) - 1 - self._open[::-1].index(tag))
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._out.append(html.escape(data, quote=False))
+
+
+def _strip_tags(html_content):
+    """파서 없이 태그만 제거하는 최후의 대체 경로"""
+    clean_text = re.sub(r'<[^>]+>', '', html_content)
+    return clean_text.replace('&nbsp;', ' ').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+
+
+class HtmlProcessor:
+    """텍스트 추출은 설치된 가장 빠른 백엔드, 정리는 HtmlSanitizer로 처리하고
+    결과를 (메일 ID, 내용 해시)로 메모이즈
+
+    같은 HTML 본문은 프로세스당 한 번만 파싱되며, Streamlit 재실행 시에는
+    캐시된 결과를 그대로 반환합니다. 빠른 백엔드가 실패하면 기본 백엔드로 재시도합니다.
+    """
+
+    def __init__(self, max_entries=None):
+        self.fallback = BeautifulSoupBackend()
+        self.backend = LxmlBackend() if LXML_AVAILABLE else self.fallback
+        self.max_entries = max_entries or HTML_CONFIG['cache_entries']
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind, html_content, message_id):
+        digest = hashlib.blake2b(html_content.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+        return (message_id or '', kind, digest)
+
+    def _run(self, kind, html_content, message_id, steps):
+        key = self._key(kind, html_content, message_id)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        result = None
+        for step in steps:
+            try:
+                result = step(html_content)
+                break
+            except Exception:
+                continue
+        if result is None:
+            result = _strip_tags(html_content)
+
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def to_text(self, html_content, message_id=None):
+        """HTML에서 텍스트만 추출"""
+        if not html_content:
+            return ''
+        steps = [backend.to_text for backend in dict.fromkeys((self.backend, self.fallback))]
+        return self._run('to_text', html_content, message_id, steps)
+
+    def clean(self, html_content, message_id=None):
+        """렌더링용으로 HTML 정리 (실패 시 텍스트만 추출)"""
+        if not html_content:
+            return ''
+        steps = [lambda content: HtmlSanitizer().sanitize(content), lambda content: self.to_text(content, message_id)]
+        return self._run('clean', html_content, message_id, steps)
+
+    def forget(self, message_ids):
+        """삭제된 메일의 메모이즈 결과 제거"""
+        message_ids = set(message_ids)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in message_ids]:
+                del self._cache[key]
+
+
+# 전역 HTML 처리기 인스턴스
+html_processor = HtmlProcessor()
@@ -0,0 +1,560 @@
+"""
+DeepMail - SQLite 기반 로컬 메일 인덱스 모듈
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterable
+from config import INDEX_CONFIG
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    subject TEXT NOT NULL DEFAULT '',
+    sender TEXT NOT NULL DEFAULT '',
+    sender_domain TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL DEFAULT '',
+    internal_date INTEGER NOT NULL DEFAULT 0,
+    snippet TEXT NOT NULL DEFAULT '',
+    label_ids TEXT NOT NULL DEFAULT '[]',
+    size_estimate INTEGER NOT NULL DEFAULT 0,
+    body_text TEXT NOT NULL DEFAULT '',
+    phishing_score REAL,
+    summary TEXT,
+    updated_at REAL NOT NULL DEFAULT 0,
+    auth_results TEXT NOT NULL DEFAULT '',
+    list_unsubscribe TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_messages_internal_date ON messages(internal_date DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_sender_domain ON messages(sender_domain);
+
+-- (메일 ID, 모델 해시, 특징 출처)별 피싱 점수 - 모델이 바뀌면 해시가 달라져 자동으로 무효화
+CREATE TABLE IF NOT EXISTS phishing_scores (
+    message_id TEXT NOT NULL,
+    model_hash TEXT NOT NULL,
+    feature_source TEXT NOT NULL,
+    score REAL NOT NULL,
+    scored_at REAL NOT NULL,
+    PRIMARY KEY (message_id, model_hash, feature_source)
+);
+CREATE TRIGGER IF NOT EXISTS messages_ad_scores AFTER DELETE ON messages BEGIN
+    DELETE FROM phishing_scores WHERE message_id = old.id;
+END;
+
+-- 모델이 점수를 낸 메일의 발신자 - 발신자/도메인 평판은 이 표를 집계 (메일당 한 행이라 중복 집계 없음)
+-- auth_domain: 메일이 통과한 인증 도메인, 위장 메일이 평판을 오염시키지 않도록 인증된 행만 집계
+CREATE TABLE IF NOT EXISTS sender_scores (
+    message_id TEXT PRIMARY KEY,
+    sender TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    score REAL NOT NULL,
+    scored_at REAL NOT NULL,
+    auth_domain TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_sender_scores_sender ON sender_scores(sender);
+CREATE INDEX IF NOT EXISTS idx_sender_scores_domain ON sender_scores(domain);
+
+-- 메일별 마지막 피싱 판정과 판정한 단계(prefilter/model)
+CREATE TABLE IF NOT EXISTS phishing_decisions (
+    message_id TEXT PRIMARY KEY,
+    tier TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    probability REAL,
+    reason TEXT NOT NULL DEFAULT '',
+    decided_at REAL NOT NULL
+);
+
+-- 전체 메일함 피싱 검사 작업과 메일별 진행 상태 (청크마다 커밋되는 체크포인트)
+CREATE TABLE IF NOT EXISTS scan_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'listing',
+    page_token TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    scanned INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scan_items (
+    job_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    subject TEXT NOT NULL DEFAULT '',
+    sender TEXT NOT NULL DEFAULT '',
+    score REAL,
+    error TEXT,
+    PRIMARY KEY (job_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_scan_items_pending ON scan_items(job_id, status, seq);
+
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, subject, sender, snippet, body_text)
+    VALUES (new.rowid, new.subject, new.sender, new.snippet, new.body_text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, subject, sender, snippet, body_text)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.snippet, old.body_text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF subject, sender, snippet, body_text ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, subject, sender, snippet, body_text)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.snippet, old.body_text);
+    INSERT INTO messages_fts(rowid, subject, sender, snippet, body_text)
+    VALUES (new.rowid, new.subject, new.sender, new.snippet, new.body_text);
+END;
+"""
+
+# 한국어는 띄어쓰기 단위 토큰화로는 부분 검색이 안 되므로 trigram 토크나이저 우선 사용
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, snippet, body_text,
+    content='messages', content_rowid='rowid', tokenize='{tokenizer}'
+);
+"""
+
+# SQLite 바인딩 변수 개수 제한을 넘지 않도록 IN 조회를 나누는 단위
+IN_CHUNK = 500
+
+SUMMARY_COLUMNS = (
+    "id, thread_id, subject, sender, date, internal_date, snippet, label_ids, size_estimate, "
+    "auth_results, list_unsubscribe"
+)
+
+# 기존 인덱스 파일에 없을 수 있는 컬럼 (CREATE TABLE IF NOT EXISTS로는 추가되지 않음)
+ADDED_COLUMNS = {
+    'messages': {
+        'auth_results': "TEXT NOT NULL DEFAULT ''",
+        'list_unsubscribe': "TEXT NOT NULL DEFAULT ''"
+    },
+    'sender_scores': {
+        'auth_domain': "TEXT NOT NULL DEFAULT ''"
+    }
+}
+
+
+def extract_sender_domain(sender: str) -> str:
+    """'이름 <user@example.com>' 형식에서 도메인 추출"""
+    address = sender.rsplit('<', 1)[-1].rstrip('> ').strip()
+    if '@' not in address:
+        return ''
+    return address.split('@')[-1].lower()
+
+
+class MailIndex:
+    """메일 헤더/스니펫/본문 텍스트/라벨/피싱 점수/요약을 저장하는 로컬 인덱스"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or INDEX_CONFIG['path']
+        self._lock = threading.RLock()
+        self._conn = None
+        self.trigram = True
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = self._connect()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            conn.execute(FTS_SCHEMA.format(tokenizer='trigram'))
+        except sqlite3.OperationalError:
+            # trigram 미지원 SQLite (3.34 미만)
+            self.trigram = False
+            conn.execute(FTS_SCHEMA.format(tokenizer='unicode61'))
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns.items():
+                if existing and name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _row_to_summary(row: sqlite3.Row) -> Dict[str, Any]:
+        """DB 행을 get_messages와 같은 형식의 요약 레코드로 변환"""
+        return {
+            'id': row['id'],
+            'threadId': row['thread_id'],
+            'subject': row['subject'],
+            'sender': row['sender'],
+            'date': row['date'],
+            'snippet': row['snippet'],
+            'internalDate': row['internal_date'],
+            'labelIds': json.loads(row['label_ids']),
+            'sizeEstimate': row['size_estimate'],
+            'authResults': row['auth_results'],
+            'listUnsubscribe': row['list_unsubscribe']
+        }
+
+    # ===== 쓰기 =====
+
+    def upsert_summaries(self, summaries: Iterable[Dict[str, Any]]) -> None:
+        """목록 요약 레코드 저장 (본문/점수/요약은 유지)"""
+        now = time.time()
+        rows = [(
+            msg['id'],
+            msg.get('threadId'),
+            msg.get('subject', ''),
+            msg.get('sender', ''),
+            extract_sender_domain(msg.get('sender', '')),
+            msg.get('date', ''),
+            int(msg.get('internalDate', 0) or 0),
+            msg.get('snippet', ''),
+            json.dumps(msg.get('labelIds', [])),
+            int(msg.get('sizeEstimate', 0) or 0),
+            msg.get('authResults', ''),
+            msg.get('listUnsubscribe', ''),
+            now
+        ) for msg in summaries]
+        if not rows:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO messages (id, thread_id, subject, sender, sender_domain, date,
+                                      internal_date, snippet, label_ids, size_estimate,
+                                      auth_results, list_unsubscribe, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    thread_id=excluded.thread_id, subject=excluded.subject, sender=excluded.sender,
+                    sender_domain=excluded.sender_domain, date=excluded.date,
+                    internal_date=excluded.internal_date, snippet=excluded.snippet,
+                    label_ids=excluded.label_ids, size_estimate=excluded.size_estimate,
+                    auth_results=excluded.auth_results, list_unsubscribe=excluded.list_unsubscribe,
+                    updated_at=excluded.updated_at
+            """, rows)
+
+    def set_body_text(self, message_id: str, body_text: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE messages SET body_text=?, updated_at=? WHERE id=?",
+                (body_text or '', time.time(), message_id)
+            )
+
+    def set_phishing_scores(self, scores: Dict[str, float]) -> None:
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE messages SET phishing_score=? WHERE id=?",
+                [(float(score), message_id) for message_id, score in scores.items()]
+            )
+
+    def put_cached_scores(self, scores: Dict[str, float], model_hash: str, feature_source: str) -> None:
+        """모델 버전/특징 출처별 피싱 점수 저장"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO phishing_scores (message_id, model_hash, feature_source, score, scored_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(message_id, model_hash, feature_source, float(score), now) for message_id, score in scores.items()])
+
+    def prune_cached_scores(self, model_hash: str) -> None:
+        """현재 모델이 아닌 버전의 점수 삭제"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM phishing_scores WHERE model_hash != ?", (model_hash,))
+
+    def put_sender_scores(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """모델 점수를 발신자 평판 집계용으로 저장 (rows: [{'id', 'sender', 'domain', 'auth_domain', 'score'}, ...])"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO sender_scores (message_id, sender, domain, auth_domain, score, scored_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(row['id'], row['sender'], row['domain'], row['auth_domain'], float(row['score']), now) for row in rows])
+
+    def record_phishing_decisions(self, decisions: Dict[str, Dict[str, Any]]) -> None:
+        """메일별 판정 저장 (decisions: {message_id: {'tier', 'rule', 'verdict', 'probability', 'reason'}})"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO phishing_decisions
+                    (message_id, tier, rule, verdict, probability, reason, decided_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (message_id, item['tier'], item['rule'], item['verdict'], item.get('probability'),
+                 item.get('reason', ''), now)
+                for message_id, item in decisions.items()
+            ])
+
+    def set_summary(self, message_id: str, summary: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE messages SET summary=? WHERE id=?", (summary, message_id))
+
+    def delete(self, message_ids: Iterable[str]) -> None:
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM messages WHERE id=?", [(message_id,) for message_id in message_ids])
+
+    def clear(self) -> None:
+        """로그아웃 시 인덱스 전체 삭제 (다른 계정에 이전 계정의 메일/점수/평판이 보이지 않도록)"""
+        with self._lock, self.conn:
+            for table in ('messages', 'phishing_scores', 'sender_scores', 'phishing_decisions', 'scan_items', 'scan_jobs'):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    def sync_window(self, summaries: List[Dict[str, Any]]) -> None:
+        """전체 동기화 결과 반영
+
+        목록 구간(가장 오래된 메일 이후) 안에 있었는데 이번 목록에 없는 메일은
+        Gmail에서 삭제된 것으로 보고 인덱스에서 제거합니다.
+        """
+        self.upsert_summaries(summaries)
+        # 수신 시각이 없는 요약이 섞여도 구간이 0까지 넓어져 전체가 지워지지 않도록 값이 있는 것만 사용
+        dates = [int(msg['internalDate']) for msg in summaries if msg.get('internalDate')]
+        if not dates:
+            return
+        oldest = min(dates)
+        with self._lock, self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS window_ids (id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM window_ids")
+            self.conn.executemany("INSERT OR IGNORE INTO window_ids VALUES (?)", [(msg['id'],) for msg in summaries])
+            self.conn.execute(
+                "DELETE FROM messages WHERE internal_date >= ? AND id NOT IN (SELECT id FROM window_ids)",
+                (oldest,)
+            )
+
+    # ===== 메일함 검사 체크포인트 =====
+
+    def create_scan_job(self, query: str = '') -> int:
+        now = time.time()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO scan_jobs (query, created_at, updated_at) VALUES (?, ?, ?)", (query, now, now)
+            )
+        return cursor.lastrowid
+
+    def get_scan_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM scan_jobs WHERE id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_unfinished_scan_job(self, query: str = '') -> Optional[Dict[str, Any]]:
+        """같은 검색 조건으로 끝나지 않은 가장 최근 작업"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM scan_jobs WHERE query=? AND status != 'done' ORDER BY id DESC LIMIT 1", (query,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def add_scan_items(self, job_id: int, message_ids: List[str], page_token: Optional[str]) -> None:
+        """목록 한 페이지의 메일 ID와 다음 페이지 토큰을 한 트랜잭션으로 저장 (토큰이 없으면 목록 완료)"""
+        with self._lock, self.conn:
+            start = self.conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM scan_items WHERE job_id=?", (job_id,)
+            ).fetchone()[0]
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO scan_items (job_id, seq, message_id) VALUES (?, ?, ?)",
+                [(job_id, start + offset, message_id) for offset, message_id in enumerate(message_ids, 1)]
+            )
+            self.conn.execute("""
+                UPDATE scan_jobs SET page_token=?, status=?, updated_at=?,
+                    total=(SELECT COUNT(*) FROM scan_items WHERE job_id=?)
+                WHERE id=?
+            """, (page_token, 'listing' if page_token else 'scanning', time.time(), job_id, job_id))
+
+    def get_pending_scan_items(self, job_id: int, after_seq: int, limit: int) -> List[Dict[str, Any]]:
+        """after_seq 이후 아직 검사하지 않은 메일 ({'seq', 'message_id'}, 목록 순서)"""
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT seq, message_id FROM scan_items
+                WHERE job_id=? AND status='pending' AND seq > ? ORDER BY seq LIMIT ?
+            """, (job_id, after_seq, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def finish_scan_items(self, job_id: int, results: List[Dict[str, Any]], errors: Dict[str, str]) -> None:
+        """청크 결과와 작업 진행 수를 한 트랜잭션으로 기록 (재시작하면 다음 청크부터 이어서 검사)
+
+        results: [{'id', 'subject', 'from', 'score'}, ...], errors: {message_id: 오류 메시지}
+        """
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                UPDATE scan_items SET status='done', subject=?, sender=?, score=?, error=NULL
+                WHERE job_id=? AND message_id=?
+            """, [(item['subject'], item['from'], float(item['score']), job_id, item['id']) for item in results])
+            self.conn.executemany(
+                "UPDATE scan_items SET status='error', error=? WHERE job_id=? AND message_id=?",
+                [(error, job_id, message_id) for message_id, error in errors.items()]
+            )
+            self.conn.execute(
+                "UPDATE scan_jobs SET scanned=scanned+?, failed=failed+?, updated_at=? WHERE id=?",
+                (len(results), len(errors), time.time(), job_id)
+            )
+
+    def retry_failed_scan_items(self, job_id: int) -> int:
+        """실패한 메일을 다시 검사 대상으로 되돌리고 그 개수 반환"""
+        with self._lock, self.conn:
+            count = self.conn.execute(
+                "UPDATE scan_items SET status='pending', error=NULL WHERE job_id=? AND status='error'", (job_id,)
+            ).rowcount
+            self.conn.execute("UPDATE scan_jobs SET failed=failed-? WHERE id=?", (count, job_id))
+        return count
+
+    def set_scan_job_status(self, job_id: int, status: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE scan_jobs SET status=?, updated_at=? WHERE id=?", (status, time.time(), job_id))
+
+    def get_scan_results(self, job_id: int, threshold: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """점수가 threshold 이상인 메일 (점수 높은 순)"""
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT message_id, subject, sender, score FROM scan_items
+                WHERE job_id=? AND status='done' AND score >= ? ORDER BY score DESC LIMIT ?
+            """, (job_id, threshold, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    # ===== 조회 =====
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def get_recent(self, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """최신순 메일 요약 목록"""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM messages ORDER BY internal_date DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [self._row_to_summary(row) for row in rows]
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM messages WHERE id=?", (message_id,)).fetchone()
+        if row is None:
+            return None
+        result = self._row_to_summary(row)
+        result.update({
+            'body_text': row['body_text'],
+            'phishing_score': row['phishing_score'],
+            'summary': row['summary']
+        })
+        return result
+
+    def get_cached_scores(self, message_ids: Iterable[str], model_hash: str, feature_source: str) -> Dict[str, float]:
+        """저장된 피싱 점수 조회 ({message_id: score}, 없는 메일은 제외)"""
+        message_ids = list(dict.fromkeys(message_ids))
+        scores = {}
+        with self._lock:
+            for i in range(0, len(message_ids), IN_CHUNK):
+                chunk = message_ids[i:i + IN_CHUNK]
+                rows = self.conn.execute(f"""
+                    SELECT message_id, score FROM phishing_scores
+                    WHERE model_hash=? AND feature_source=? AND message_id IN ({','.join('?' * len(chunk))})
+                """, (model_hash, feature_source, *chunk)).fetchall()
+                scores.update({row['message_id']: row['score'] for row in rows})
+        return scores
+
+    def get_sender_reputation(self, column: str, keys: Iterable[str], threshold: float) -> Dict[str, Dict[str, int]]:
+        """발신자 주소(column='sender') 또는 도메인(column='domain')별 과거 점수 집계
+
+        인증 도메인이 기록된 행만 집계합니다 (이전 버전이 인증 없이 저장한 행은 제외).
+        반환값: {key: {'mails': 점수가 있는 메일 수, 'phishing': threshold 이상인 메일 수}}
+        """
+        if column not in ('sender', 'domain'):
+            raise ValueError(f"알 수 없는 평판 기준: {column}")
+        keys = [key for key in dict.fromkeys(keys) if key]
+        reputation = {}
+        with self._lock:
+            for i in range(0, len(keys), IN_CHUNK):
+                chunk = keys[i:i + IN_CHUNK]
+                rows = self.conn.execute(f"""
+                    SELECT {column} AS key, COUNT(*) AS mails, SUM(score >= ?) AS phishing FROM sender_scores
+                    WHERE {column} IN ({','.join('?' * len(chunk))}) AND auth_domain != '' GROUP BY {column}
+                """, (threshold, *chunk)).fetchall()
+                reputation.update({row['key']: {'mails': row['mails'], 'phishing': row['phishing']} for row in rows})
+        return reputation
+
+    def get_phishing_decision(self, message_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM phishing_decisions WHERE message_id=?", (message_id,)).fetchone()
+        return dict(row) if row else None
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """제목/발신자/스니펫/본문 전문 검색 (최신순)"""
+        terms = query.split()
+        if not terms:
+            return []
+
+        with self._lock:
+            # trigram은 3글자 이상 검색어만 인덱스 사용 가능 - 짧은 검색어는 LIKE로 대체
+            if not self.trigram or all(len(term) >= 3 for term in terms):
+                match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+                rows = self.conn.execute(f"""
+                    SELECT {SUMMARY_COLUMNS} FROM messages
+                    WHERE rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)
+                    ORDER BY internal_date DESC LIMIT ?
+                """, (match, limit)).fetchall()
+            else:
+                conditions = ' AND '.join(
+                    "(subject LIKE ? OR sender LIKE ? OR snippet LIKE ? OR body_text LIKE ?)" for _ in terms
+                )
+                params = []
+                for term in terms:
+                    params.extend([f"%{term}%"] * 4)
+                rows = self.conn.execute(
+                    f"SELECT {SUMMARY_COLUMNS} FROM messages WHERE {conditions} ORDER BY internal_date DESC LIMIT ?",
+                    (*params, limit)
+                ).fetchall()
+        return [self._row_to_summary(row) for row in rows]
+
+    def get_statistics(self, max_mails: int, keywords: List[str], top_n: int = 10) -> Dict[str, Any]:
+        """최근 max_mails개 메일의 발신자/도메인/키워드 통계"""
+        recent = "SELECT * FROM messages ORDER BY internal_date DESC LIMIT :max_mails"
+        params = {'max_mails': max_mails, 'top_n': top_n}
+        with self._lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM ({recent})", params).fetchone()[0]
+            top_senders = self.conn.execute(f"""
+                SELECT sender, COUNT(*) AS cnt FROM ({recent})
+                GROUP BY sender ORDER BY cnt DESC LIMIT :top_n
+            """, params).fetchall()
+            unique_senders = self.conn.execute(
+                f"SELECT COUNT(DISTINCT sender) FROM ({recent})", params
+            ).fetchone()[0]
+            top_domains = self.conn.execute(f"""
+                SELECT sender_domain, COUNT(*) AS cnt FROM ({recent})
+                WHERE sender_domain != '' GROUP BY sender_domain ORDER BY cnt DESC LIMIT :top_n
+            """, params).fetchall()
+            unique_domains = self.conn.execute(
+                f"SELECT COUNT(DISTINCT sender_domain) FROM ({recent}) WHERE sender_domain != ''", params
+            ).fetchone()[0]
+
+            keyword_counts = {}
+            if keywords:
+                sums = ', '.join(
+                    f"SUM(instr(lower(subject || ' ' || snippet), :kw{i}) > 0)" for i in range(len(keywords))
+                )
+                params.update({f"kw{i}": keyword.lower() for i, keyword in enumerate(keywords)})
+                row = self.conn.execute(f"SELECT {sums} FROM ({recent})", params).fetchone()
+                keyword_counts = {keyword: count for keyword, count in zip(keywords, row) if count}
+
+        return {
+            'total_messages': total,
+            'total_all_messages': self.count(),
+            'sender_stats': {
+                'unique_senders': unique_senders,
+                'top_senders': [(row['sender'], row['cnt']) for row in top_senders]
+            },
+            'domain_stats': {
+                'unique_domains': unique_domains,
+                'top_domains': [(row['sender_domain'], row['cnt']) for row in top_domains]
+            },
+            'keyword_stats': {
+                'top_keywords': sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)[:15]
+            }
+        }
+
+
+# 전역 메일 인덱스 인스턴스
+mail_index = MailIndex()
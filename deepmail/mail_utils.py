@@ -1,7 +1,17 @@
 import streamlit as st
-import random
+import os
+import io
+import re
+import tempfile
 import time
 from gmail_service import gmail_service, email_parser
+from config import RATE_LIMIT_CONFIG, ATTACHMENT_CONFIG, ONLINE_MODEL_CONFIG
+from rate_limiter import gmail_rate_limiter, is_rate_limit_error, get_retry_after
+from content_store import content_store
+from mail_index import mail_index
+from html_backend import html_processor, SANITIZER_VERSION
+from features import feature_extractor
+from online_model import online_phishing_model
 from googleapiclient.errors import HttpError
 
 def get_mail_full_content(message_id: str) -> dict:
@@ -11,28 +21,33 @@ def get_mail_full_content(message_id: str) -> dict:
     if cache_key in st.session_state:
         return st.session_state[cache_key]
 
-    max_retries = 3
+    # 디스크 캐시에 있으면 네트워크 요청 없이 반환
+    stored = content_store.get(message_id)
+    if stored is not None:
+        st.session_state[cache_key] = stored
+        return stored
+
+    result = None
+    max_retries = RATE_LIMIT_CONFIG['max_retries']
     for attempt in range(max_retries):
         try:
-            # 재시도 시 더 긴 딜레이 (0.5~1.5초)
-            if attempt > 0:
-                delay = random.uniform(0.5, 1.5) * (2 ** attempt)  # 지수 백오프
-                time.sleep(delay)
-            else:
-                time.sleep(random.uniform(0.2, 0.6))  # 첫 시도는 짧은 딜레이
-            
+            # 고정 지연 없이 요청 - 할당량이 부족할 때만 속도 제한기가 대기
             email_message = gmail_service.get_raw_message(message_id)
+            if gmail_rate_limiter.last_wait >= 1.0:
+                st.info(f"⏳ Gmail 요청 한도로 {gmail_rate_limiter.last_wait:.1f}초 대기했습니다.")
             
             if not email_message:
                 return _create_error_result(cache_key, "메일을 가져올 수 없습니다.")
 
             result = _parse_email_message(email_message)
-            st.session_state[cache_key] = result
-            return result
+            break
 
         except HttpError as http_err:
-            if "429" in str(http_err) and attempt < max_retries - 1:
-                st.warning(f"⚠️ 요청이 너무 많습니다. 잠시 후 재시도합니다... ({attempt + 1}/{max_retries})")
+            if is_rate_limit_error(http_err) and attempt < max_retries - 1:
+                # Retry-After가 있으면 따르고, 없으면 지수 백오프
+                delay = get_retry_after(http_err, RATE_LIMIT_CONFIG['backoff_seconds'] * (2 ** attempt))
+                gmail_rate_limiter.backoff(delay)
+                st.warning(f"⚠️ 요청이 너무 많습니다. {delay:.1f}초 후 재시도합니다... ({attempt + 1}/{max_retries})")
                 continue
             else:
                 error_msg = str(http_err)
@@ -40,12 +55,241 @@ def get_mail_full_content(message_id: str) -> dict:
         except Exception as e:
             if attempt < max_retries - 1:
                 st.warning(f"⚠️ 메일 로딩 중 오류가 발생했습니다. 재시도합니다... ({attempt + 1}/{max_retries})")
+                time.sleep(RATE_LIMIT_CONFIG['backoff_seconds'] * (2 ** attempt))
                 continue
             else:
                 error_msg = f"❌ 메일 내용을 가져오는 중 오류가 발생했습니다: {str(e)}"
                 return _create_error_result(cache_key, error_msg)
 
-    return _create_error_result(cache_key, "최대 재시도 횟수를 초과했습니다.")
+    if result is None:
+        return _create_error_result(cache_key, "최대 재시도 횟수를 초과했습니다.")
+
+    st.session_state[cache_key] = result
+    _store_mail_content(message_id, result)
+    return result
+
+def _store_mail_content(message_id: str, result: dict) -> None:
+    """가져온 메일을 디스크 캐시와 검색 인덱스에 저장
+
+    저장 실패는 다시 가져와도 해결되지 않으므로 가져오기 재시도와 분리하여 기록만 합니다.
+    """
+    try:
+        content_store.put(message_id, result)
+    except Exception as e:
+        print(f"⚠️ [본문 캐시] 메일 {message_id} 디스크 저장 실패: {str(e)}")
+    try:
+        _index_body_text(message_id, result)
+    except Exception as e:
+        print(f"⚠️ [로컬 인덱스] 메일 {message_id} 본문 저장 실패: {str(e)}")
+
+def get_mail_full_contents(message_ids) -> dict:
+    """여러 메일의 전체 내용을 배치 요청으로 한 번에 가져오는 함수
+
+    캐시에 없는 메일만 Gmail에 요청하며, 실패한 메일은 메일별 오류 결과로 채워집니다.
+    """
+    results = {}
+    missing_ids = []
+    for message_id in dict.fromkeys(message_ids):
+        cache_key = f"mail_content_{message_id}"
+        if cache_key in st.session_state:
+            results[message_id] = st.session_state[cache_key]
+            continue
+        stored = content_store.get(message_id)
+        if stored is not None:
+            st.session_state[cache_key] = stored
+            results[message_id] = stored
+        else:
+            missing_ids.append(message_id)
+
+    if not missing_ids:
+        return results
+
+    email_messages, errors = gmail_service.get_raw_messages(missing_ids)
+    if gmail_rate_limiter.last_wait >= 1.0:
+        st.info(f"⏳ Gmail 요청 한도로 {gmail_rate_limiter.last_wait:.1f}초 대기했습니다.")
+    for message_id in missing_ids:
+        cache_key = f"mail_content_{message_id}"
+        email_message = email_messages.get(message_id)
+        if email_message is None:
+            error_msg = errors.get(message_id, "메일을 가져올 수 없습니다.")
+            results[message_id] = _create_error_result(cache_key, error_msg)
+            continue
+        try:
+            result = _parse_email_message(email_message)
+        except Exception as e:
+            results[message_id] = _create_error_result(cache_key, f"❌ 메일 파싱 중 오류가 발생했습니다: {str(e)}")
+            continue
+        st.session_state[cache_key] = result
+        _store_mail_content(message_id, result)
+        results[message_id] = result
+
+    return results
+
+def get_mail_text_preview(message_id: str, max_chars: int) -> dict:
+    """분류/LLM용 본문 미리보기 (최대 max_chars자)
+
+    이미 캐시된 메일은 캐시에서 자르고, 없으면 제한 파싱(parse_capped)으로
+    필요한 만큼만 디코딩합니다. 부분 결과이므로 전체 내용 캐시에는 저장하지 않습니다.
+    """
+    cached = st.session_state.get(f"mail_content_{message_id}") or content_store.get(message_id)
+    if cached is not None and not cached.get('error', False):
+        return {
+            'subject': cached.get('subject', ''),
+            'from': cached.get('from', ''),
+            'body_text': (cached.get('body_text') or '')[:max_chars],
+            'body_html': (cached.get('body_html') or '')[:max_chars],
+            'error': False
+        }
+
+    try:
+        raw_data = gmail_service.get_raw_bytes(message_id)
+    except Exception as e:
+        return {'subject': '', 'from': '', 'body_text': str(e), 'body_html': '', 'error': True}
+    if raw_data is None:
+        return {'subject': '', 'from': '', 'body_text': "메일을 가져올 수 없습니다.", 'body_html': '', 'error': True}
+
+    parsed = email_parser.parse_capped(raw_data, max_chars)
+    return {
+        'subject': parsed['subject'],
+        'from': parsed['from'],
+        'body_text': parsed['text'],
+        'body_html': parsed['html'],
+        'error': False
+    }
+
+def get_sanitized_html(message_id: str, full_content: dict) -> str:
+    """렌더링용으로 정리된 HTML 반환 (메일 내용과 함께 세션/디스크 캐시에 저장)"""
+    cached = full_content.get('sanitized_html')
+    if cached and cached.get('version') == SANITIZER_VERSION:
+        return cached['html']
+
+    sanitized = email_parser.clean_html_content(full_content.get('body_html', ''), message_id)
+    full_content['sanitized_html'] = {'version': SANITIZER_VERSION, 'html': sanitized}
+    if not full_content.get('error', False):
+        st.session_state[f"mail_content_{message_id}"] = full_content
+        content_store.put(message_id, full_content)
+    return sanitized
+
+def _online_sample(msg: dict) -> dict:
+    """온라인 모델 입력 - 추가 네트워크 요청 없이 캐시된 본문(없으면 스니펫) 사용"""
+    cached = st.session_state.get(f"mail_content_{msg['id']}") or content_store.get(msg['id'])
+    if cached is not None and not cached.get('error', False):
+        body_text, body_html = cached.get('body_text', ''), cached.get('body_html', '')
+    else:
+        body_text, body_html = msg.get('snippet', ''), ''
+    return {'id': msg['id'], 'subject': msg.get('subject', ''), 'body_text': body_text, 'body_html': body_html}
+
+def learn_from_feedback(messages, is_phishing: bool) -> None:
+    """메일 삭제 / "피싱 아님" 피드백으로 온라인 피싱 모델 갱신
+
+    삭제로 캐시를 지우기 전에 호출해야 합니다. 학습 실패는 사용자 작업을 막지 않습니다.
+    """
+    weight = ONLINE_MODEL_CONFIG['delete_weight'] if is_phishing else ONLINE_MODEL_CONFIG['feedback_weight']
+    try:
+        online_phishing_model.learn([_online_sample(msg) for msg in messages], 1 if is_phishing else 0, weight)
+    except Exception as e:
+        print(f"⚠️ [온라인 모델] 피드백 학습 실패: {str(e)}")
+
+def get_online_phishing_score(msg: dict):
+    """온라인 모델의 보조 피싱 확률 (학습 전이거나 실패하면 None)"""
+    try:
+        probas = online_phishing_model.predict_proba([_online_sample(msg)])
+    except Exception as e:
+        print(f"⚠️ [온라인 모델] 예측 실패: {str(e)}")
+        return None
+    return float(probas[0]) if probas is not None else None
+
+def forget_mail_content(message_id: str) -> None:
+    """삭제된 메일의 세션/디스크 캐시 제거"""
+    forget_mail_contents([message_id])
+
+def forget_mail_contents(message_ids) -> None:
+    """삭제된 여러 메일을 UI 목록과 세션/디스크 캐시, 로컬 인덱스에서 한 번에 제거"""
+    message_ids = list(message_ids)
+    if not message_ids:
+        return
+    if 'deleted_mail_ids' not in st.session_state:
+        st.session_state.deleted_mail_ids = set()
+    st.session_state.deleted_mail_ids.update(message_ids)
+    for message_id in message_ids:
+        st.session_state.pop(f"mail_content_{message_id}", None)
+        content_store.delete(message_id)
+    mail_index.delete(message_ids)
+    forget_attachments(message_ids)
+    html_processor.forget(message_ids)
+    feature_extractor.forget(message_ids)
+
+def _index_body_text(message_id: str, result: dict) -> None:
+    """검색용 본문 텍스트를 로컬 인덱스에 저장"""
+    body_text = result.get('body_text') or email_parser.extract_text_from_html(result.get('body_html', ''), message_id)
+    mail_index.set_body_text(message_id, body_text)
+
+def load_attachment(message_id: str, attachment: dict):
+    """첨부파일 내용을 필요할 때만 첨부파일 API로 가져와 디코딩
+
+    작은 첨부파일은 bytes로, max_in_memory_bytes보다 큰 첨부파일은
+    임시 파일 경로(str)로 반환합니다. 실패 시 None을 반환합니다.
+    """
+    # 예전 캐시 형식 (bytes를 함께 저장한 경우)
+    if attachment.get('data') is not None:
+        return attachment['data']
+
+    part_path = attachment.get('part_path')
+    if part_path is None:
+        return None
+
+    large = attachment.get('size', 0) > ATTACHMENT_CONFIG['max_in_memory_bytes']
+    if large:
+        safe_name = re.sub(r'[^\w.-]', '_', attachment.get('filename', 'attachment'))
+        temp_path = os.path.join(
+            ATTACHMENT_CONFIG['temp_dir'],
+            f"{message_id}_{'_'.join(map(str, part_path))}_{safe_name}"
+        )
+        if os.path.exists(temp_path):
+            return temp_path
+
+    try:
+        if not large:
+            data = gmail_service.get_attachment_data(message_id, part_path)
+            if data is None:
+                return None
+            buffer = io.BytesIO()
+            email_parser.write_base64url(data, buffer)
+            return buffer.getvalue()
+
+        # 큰 첨부파일은 응답을 메모리에 문자열로 올리지 않고 임시 파일에 청크 단위로 기록 후 원자적으로 교체
+        os.makedirs(ATTACHMENT_CONFIG['temp_dir'], exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=ATTACHMENT_CONFIG['temp_dir'], suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                found = gmail_service.download_attachment(message_id, part_path, f)
+            if not found:
+                return None
+            os.replace(tmp_path, temp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return temp_path
+    except Exception as e:
+        st.error(f"❌ 첨부파일 {attachment.get('filename', '')} 불러오기 실패: {str(e)}")
+        return None
+
+def forget_attachments(message_ids=None) -> None:
+    """불러온 첨부파일의 세션 캐시와 임시 파일 삭제 (message_ids가 None이면 전체, 로그아웃 시)"""
+    prefixes = None if message_ids is None else tuple(f"{message_id}_" for message_id in message_ids)
+    for key in [key for key in st.session_state.keys() if str(key).startswith('attachment_opened_')]:
+        if prefixes is None or str(key)[len('attachment_opened_'):].startswith(prefixes):
+            del st.session_state[key]
+
+    temp_dir = ATTACHMENT_CONFIG['temp_dir']
+    if not os.path.isdir(temp_dir):
+        return
+    for name in os.listdir(temp_dir):
+        if prefixes is None or name.startswith(prefixes):
+            try:
+                os.remove(os.path.join(temp_dir, name))
+            except OSError as e:
+                print(f"⚠️ [첨부파일] 임시 파일 삭제 실패: {name} ({str(e)})")
 
 def _create_error_result(cache_key: str, error_msg: str) -> dict:
     result = {
@@ -68,8 +312,8 @@ def _parse_email_message(email_message) -> dict:
     to_addr = email_message.get('To', '수신자 없음')
     date = email_message.get('Date', '날짜 없음')
 
-    text_content, html_content = email_parser.extract_text_from_email(email_message)
-    attachments = email_parser.extract_attachments(email_message)
+    parsed = email_parser.parse_parts(email_message)
+    text_content, html_content, attachments = parsed['text'], parsed['html'], parsed['attachments']
 
     return {
         'subject': subject,
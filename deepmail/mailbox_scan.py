@@ -0,0 +1,226 @@
+"""
+DeepMail - 체크포인트 기반 전체 메일함 피싱 검사 모듈
+
+사용 예시 (중단되면 같은 명령으로 이어서 검사):
+    python mailbox_scan.py
+    python mailbox_scan.py --query "newer_than:1y"
+"""
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from config import SCAN_CONFIG, PARSE_CONFIG, BULK_PARSE_CONFIG
+from mail_index import mail_index
+from model_registry import FEATURE_SOURCE_BODY
+from prefilter import phishing_prefilter
+
+
+def _init_worker():
+    """워커 프로세스마다 모델을 한 번 로드"""
+    from model_registry import phishing_model_registry
+    phishing_model_registry.get()
+
+
+def scan_chunk(raw_messages, max_chars):
+    """워커 프로세스에서 청크 하나를 파싱하고 한 번의 배치 예측으로 점수 계산
+
+    raw_messages: [(message_id, RFC 822 바이트), ...]
+    반환값: (모델 해시, [{'id', 'subject', 'from', 'authResults', 'score'}, ...], {message_id: 오류 메시지})
+    """
+    from bulk_parser import parse_compact
+    from model_registry import phishing_model_registry
+    from prefilter import headers_from_raw
+
+    parsed, errors = [], {}
+    for message_id, raw_data in raw_messages:
+        item = parse_compact(message_id, raw_data, max_chars)
+        if item['error']:
+            errors[message_id] = item['body_text']
+        else:
+            # 발신자 평판은 인증을 통과한 메일만 반영하므로 인증 결과 헤더도 함께 반환
+            item['authResults'] = headers_from_raw(raw_data)['authResults']
+            parsed.append(item)
+
+    # 프로세스마다 트리 예측 스레드를 띄우면 코어를 초과하므로 워커 안에서는 단일 스레드
+    scores = phishing_model_registry.score_many(parsed, n_jobs=1) if parsed else []
+    if scores is None:
+        raise RuntimeError(f"피싱 판별 모델 파일이 없습니다. (model_path={phishing_model_registry.path})")
+    results = [
+        {'id': item['id'], 'subject': item['subject'], 'from': item['from'], 'authResults': item['authResults'], 'score': float(score)}
+        for item, score in zip(parsed, scores)
+    ]
+    return phishing_model_registry.model_hash, results, errors
+
+
+class MailboxScanner:
+    """전체 메일함을 청크 단위로 검사하는 작업
+
+    1. 목록 단계: 메일 ID만 페이지 단위로 받아 페이지마다 (ID, 다음 페이지 토큰)을 저장
+    2. 검사 단계: 메인 스레드가 다음 청크의 원본을 배치 요청으로 가져오는 동안
+       프로세스 풀이 이전 청크를 파싱/예측하고, 청크가 끝날 때마다 결과를 커밋
+    진행 상태는 로컬 인덱스(scan_jobs/scan_items)에 있으므로 중단 후 다시 실행하면
+    같은 검색 조건의 끝나지 않은 작업을 찾아 남은 메일만 이어서 검사합니다.
+    점수는 피싱 점수 캐시에도 저장되어 이후 단일/일괄 피싱 검사에서 재사용됩니다.
+    """
+
+    def __init__(self, gmail=None, chunk_size=None, max_workers=None, threshold=None):
+        if gmail is None:
+            from gmail_service import gmail_service as gmail
+        self.gmail = gmail
+        self.chunk_size = chunk_size or SCAN_CONFIG['chunk_size']
+        self.max_workers = max_workers or SCAN_CONFIG['max_workers']
+        self.threshold = threshold if threshold is not None else SCAN_CONFIG['threshold']
+
+    def start(self, query='', resume=True):
+        """이어서 검사할 작업이 있으면 그 작업 ID를, 없으면 새 작업 ID 반환"""
+        job = mail_index.find_unfinished_scan_job(query) if resume else None
+        if job:
+            # 이전 실행에서 일시적 오류(할당량 초과 등)로 실패한 메일도 다시 시도
+            retried = mail_index.retry_failed_scan_items(job['id'])
+            print(f"🔁 [메일함 검사] 작업 {job['id']} 이어서 진행 ({job['scanned']}/{job['total']}, 재시도 {retried}개)")
+            return job['id']
+        return mail_index.create_scan_job(query)
+
+    def list_ids(self, job_id):
+        """저장된 페이지 토큰부터 메일 ID 목록 조회 (페이지마다 체크포인트)"""
+        job = mail_index.get_scan_job(job_id)
+        if job['status'] != 'listing':
+            return
+        pages = self.gmail.iter_message_ids(
+            query=job['query'] or None, page_token=job['page_token'], page_size=SCAN_CONFIG['list_page_size']
+        )
+        for message_ids, page_token in pages:
+            mail_index.add_scan_items(job_id, message_ids, page_token)
+        total = mail_index.get_scan_job(job_id)['total']
+        print(f"📋 [메일함 검사] 작업 {job_id}: 메일 {total}개 목록 완료")
+
+    def _fetch(self, job_id, items):
+        """청크 원본을 가져오고, 현재 모델로 이미 점수가 있는 메일은 건너뜀
+
+        strip_min_bytes보다 큰 메일은 워커로 보내기 전에 분류에 쓰지 않는 첨부파일 본문을 뺍니다.
+        """
+        from gmail_service import email_parser
+        from model_registry import phishing_model_registry
+
+        message_ids = [item['message_id'] for item in items]
+        cached = phishing_model_registry.get_cached_scores(message_ids, FEATURE_SOURCE_BODY)
+        if cached:
+            summaries = {msg['id']: msg for msg in map(mail_index.get, cached) if msg}
+            mail_index.finish_scan_items(job_id, [
+                {
+                    'id': message_id,
+                    'subject': summaries.get(message_id, {}).get('subject', ''),
+                    'from': summaries.get(message_id, {}).get('sender', ''),
+                    'score': score
+                }
+                for message_id, score in cached.items()
+            ], {})
+
+        pending = [message_id for message_id in message_ids if message_id not in cached]
+        raw_messages, errors = self.gmail.get_raw_messages(pending, as_bytes=True) if pending else ({}, {})
+        missing = {message_id: errors.get(message_id, '메일을 가져오지 못했습니다.') for message_id in pending if message_id not in raw_messages}
+        raw_chunk = []
+        for message_id in pending:
+            raw_data = raw_messages.pop(message_id, None)
+            if raw_data is None:
+                continue
+            if len(raw_data) > SCAN_CONFIG['strip_min_bytes']:
+                raw_data = email_parser.strip_capped(raw_data, PARSE_CONFIG['classify_max_chars'])
+            raw_chunk.append((message_id, raw_data))
+        return raw_chunk, missing
+
+    def _record(self, job_id, model_hash, results, errors):
+        """청크 결과 체크포인트 - 작업 진행 상태, 피싱 점수 캐시, 발신자 평판을 함께 갱신"""
+        mail_index.finish_scan_items(job_id, results, errors)
+        scores = {item['id']: item['score'] for item in results}
+        if scores and model_hash:
+            mail_index.put_cached_scores(scores, model_hash, FEATURE_SOURCE_BODY)
+            mail_index.set_phishing_scores(scores)
+            # 모델 점수로 발신자 평판을 쌓아 이후 사전 필터가 명확한 메일을 바로 판정
+            phishing_prefilter.record_model_scores(
+                [{'id': item['id'], 'sender': item['from'], 'authResults': item['authResults']} for item in results],
+                scores, self.threshold
+            )
+
+    def scan(self, job_id):
+        """남은 메일을 청크 단위로 검사 (청크마다 커밋)
+
+        제출한 청크는 끝날 때까지 부모와 워커 양쪽에 원본이 남으므로
+        청크 수(prefetch_chunks)와 원본 크기 합(max_in_flight_bytes)으로 함께 제한합니다.
+        """
+        job = mail_index.get_scan_job(job_id)
+        started, done_before = time.time(), job['scanned'] + job['failed']
+        max_in_flight = self.max_workers * SCAN_CONFIG['prefetch_chunks']
+        context = multiprocessing.get_context(BULK_PARSE_CONFIG['start_method'])
+        last_seq = 0
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context, initializer=_init_worker) as executor:
+            in_flight = {}
+            while True:
+                # 워커가 바쁜 동안 다음 청크들을 미리 가져와 제출
+                while len(in_flight) < max_in_flight and sum(in_flight.values()) < SCAN_CONFIG['max_in_flight_bytes']:
+                    items = mail_index.get_pending_scan_items(job_id, last_seq, self.chunk_size)
+                    if not items:
+                        break
+                    last_seq = items[-1]['seq']
+                    raw_chunk, fetch_errors = self._fetch(job_id, items)
+                    if fetch_errors:
+                        mail_index.finish_scan_items(job_id, [], fetch_errors)
+                    if raw_chunk:
+                        future = executor.submit(scan_chunk, raw_chunk, PARSE_CONFIG['classify_max_chars'])
+                        in_flight[future] = sum(len(raw_data) for _, raw_data in raw_chunk)
+                    raw_chunk = None
+
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del in_flight[future]
+                    self._record(job_id, *future.result())
+
+                job = mail_index.get_scan_job(job_id)
+                done = job['scanned'] + job['failed']
+                rate = (done - done_before) / max(time.time() - started, 1e-6)
+                print(f"📊 [메일함 검사] 작업 {job_id}: {done}/{job['total']} ({rate:.1f}통/초)")
+
+        # 실패한 메일이 남아 있으면 작업을 끝내지 않아 다음 실행에서 그 메일만 재시도
+        if mail_index.get_scan_job(job_id)['failed']:
+            print(f"⚠️ [메일함 검사] 작업 {job_id}: 실패한 메일은 다시 실행하면 재시도합니다.")
+        else:
+            mail_index.set_scan_job_status(job_id, 'done')
+
+    def run(self, query='', resume=True):
+        """작업을 시작(또는 재개)해 목록 조회와 검사를 끝까지 진행하고 작업 정보 반환"""
+        from model_registry import phishing_model_registry
+        if not phishing_model_registry.exists():
+            raise FileNotFoundError(f"피싱 판별 모델 파일이 없습니다. (model_path={phishing_model_registry.path})")
+        job_id = self.start(query, resume)
+        self.list_ids(job_id)
+        self.scan(job_id)
+        return mail_index.get_scan_job(job_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DeepMail 전체 메일함 피싱 검사')
+    parser.add_argument('--query', default='', help='Gmail 검색 조건 (예: newer_than:1y)')
+    parser.add_argument('--new', action='store_true', help='끝나지 않은 작업을 이어서 하지 않고 새로 시작')
+    parser.add_argument('--chunk-size', type=int, default=SCAN_CONFIG['chunk_size'])
+    parser.add_argument('--workers', type=int, default=SCAN_CONFIG['max_workers'])
+    parser.add_argument('--threshold', type=float, default=SCAN_CONFIG['threshold'])
+    args = parser.parse_args(argv)
+
+    from gmail_service import gmail_service
+    if not gmail_service.authenticate():
+        print("❌ [메일함 검사] Gmail 인증에 실패했습니다.")
+        return
+
+    job = MailboxScanner(gmail_service, args.chunk_size, args.workers, args.threshold).run(args.query, resume=not args.new)
+    status = '완료' if job['status'] == 'done' else '재시도 대기'
+    print(f"✅ [메일함 검사] 작업 {job['id']} {status}: 검사 {job['scanned']}개, 실패 {job['failed']}개")
+    for item in mail_index.get_scan_results(job['id'], args.threshold, limit=50):
+        print(f"  🚨 {item['score']:.3f} | {item['sender']} | {item['subject']}")
+
+
+if __name__ == '__main__':
+    main()
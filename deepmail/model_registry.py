@@ -0,0 +1,171 @@
+"""
+DeepMail - 피싱 판별 모델 레지스트리 모듈
+"""
+
+import hashlib
+import os
+import threading
+import joblib
+import numpy as np
+from config import MODEL_CONFIG
+from mail_index import mail_index
+from features import feature_extractor
+from forest_engine import compile_forest
+
+# 점수 캐시의 특징 출처 - 같은 메일도 입력 텍스트가 다르면 점수가 다름
+FEATURE_SOURCE_SNIPPET = 'snippet'   # 제목 + Gmail 스니펫 (대시보드)
+FEATURE_SOURCE_BODY = 'body'         # 제목 + 제한 파싱 본문 (피싱 검사)
+
+
+class ModelRegistry:
+    """프로세스당 한 번만 모델을 로드하고 파일이 바뀌면 다시 로드하는 레지스트리
+
+    - get()은 파일의 (mtime, 크기)만 확인하고, 바뀌었을 때만 해시를 계산합니다.
+    - 해시가 같으면(touch 등) 다시 로드하지 않습니다.
+    - mmap_mode를 지정하면 비압축 모델의 numpy 배열을 메모리 매핑으로 읽습니다.
+    - 분류기가 랜덤 포레스트면 로드할 때 한 번 배열 엔진(FlatForest)으로 컴파일합니다.
+    """
+
+    def __init__(self, path=None, mmap_mode=None):
+        self.path = os.path.abspath(path or MODEL_CONFIG['path'])
+        self.mmap_mode = mmap_mode if mmap_mode is not None else MODEL_CONFIG['mmap_mode']
+        self._model = None
+        self._stat = None
+        self._hash = None
+        self._engine = None
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+        self._pruned_hash = None
+
+    @property
+    def model_hash(self):
+        """현재 로드된 모델 파일의 해시 (로드 전이면 None)"""
+        return self._hash
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @staticmethod
+    def _file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self):
+        """{'vectorizer', 'classifier'} 모델 반환 (파일이 없으면 None)"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        file_stat = (stat.st_mtime_ns, stat.st_size)
+        if self._model is not None and file_stat == self._stat:
+            return self._model
+
+        with self._lock:
+            if self._model is not None and file_stat == self._stat:
+                return self._model
+            file_hash = self._file_hash(self.path)
+            if self._model is None or file_hash != self._hash:
+                print(f"📦 [모델] 피싱 판별 모델 로드: {self.path}")
+                model = joblib.load(self.path, mmap_mode=self.mmap_mode)
+                # 엔진은 어느 모델에서 컴파일했는지와 함께 보관 (재로드 중 다른 모델과 섞이지 않게)
+                self._engine = (model, self._compile(model))
+                self._model = model
+                self._hash = file_hash
+            self._stat = file_stat
+            return self._model
+
+    @staticmethod
+    def _compile(model):
+        if not MODEL_CONFIG['flat_forest'] or not isinstance(model, dict):
+            return None
+        return compile_forest(model.get('classifier'))
+
+    def score_many(self, messages, model=None, n_jobs=None):
+        """여러 메일의 피싱 확률을 한 번에 계산
+
+        messages: [{'id'(선택), 'subject', 'body_text', 'body_html'}, ...]
+        반환값: 입력 순서(메일 ID 순서)와 같은 numpy 확률 배열, 모델이 없으면 None
+        입력 텍스트는 공용 특징 추출기(features)에서 가져오고, 말뭉치 전체를
+        한 번의 희소 행렬 변환과 한 번의 predict_proba로 처리합니다.
+        parallel_min개 미만이면 배열 엔진으로 트리별 호출 없이 한 번에 평가하고(고정 비용 제거),
+        그 이상이면 sklearn 트리 예측을 n_jobs 스레드로 나눕니다.
+        """
+        model = model or self.get()
+        if model is None:
+            return None
+        if not messages:
+            return np.zeros(0)
+
+        vectorizer, classifier = model['vectorizer'], model['classifier']
+        features = feature_extractor.extract_many(messages)
+        X = feature_extractor.raw_text_matrix(features, vectorizer)
+
+        engine_model, engine = self._engine or (None, None)
+        if engine is not None and engine_model is model and len(messages) < MODEL_CONFIG['parallel_min']:
+            probas = engine.predict_proba(X)
+            classes = list(engine.classes_)
+            return probas[:, classes.index(1) if 1 in classes else 1]
+
+        if len(messages) >= MODEL_CONFIG['parallel_min']:
+            n_jobs = n_jobs or MODEL_CONFIG['n_jobs']
+        with joblib.parallel_config(backend='threading', n_jobs=n_jobs):
+            if not hasattr(classifier, 'predict_proba'):
+                return np.asarray(classifier.predict(X), dtype=float)
+            probas = classifier.predict_proba(X)
+
+        classes = list(getattr(classifier, 'classes_', [0, 1]))
+        return probas[:, classes.index(1) if 1 in classes else 1]
+
+    def get_cached_scores(self, message_ids, feature_source):
+        """현재 모델 버전으로 이미 계산된 점수 조회 ({message_id: score})"""
+        if self.get() is None:
+            return {}
+        model_hash = self._hash
+        if self._pruned_hash != model_hash:
+            # 모델 파일이 바뀌었으면 이전 버전 점수를 정리
+            mail_index.prune_cached_scores(model_hash)
+            self._pruned_hash = model_hash
+        return mail_index.get_cached_scores(message_ids, model_hash, feature_source)
+
+    def score_many_cached(self, messages, feature_source):
+        """score_many의 캐시 버전 - 메일당 모델 버전별로 한 번만 계산
+
+        messages: [{'id', 'subject', 'body_text', 'body_html'}, ...]
+        반환값: 입력 순서와 같은 numpy 확률 배열, 모델이 없으면 None
+        """
+        model = self.get()
+        if model is None:
+            return None
+        model_hash = self._hash
+        cached = self.get_cached_scores([message['id'] for message in messages], feature_source)
+
+        missing = [message for message in messages if message['id'] not in cached]
+        if missing:
+            fresh = dict(zip((message['id'] for message in missing), self.score_many(missing, model=model)))
+            mail_index.put_cached_scores(fresh, model_hash, feature_source)
+            cached.update(fresh)
+        return np.array([cached[message['id']] for message in messages], dtype=float)
+
+    def warm_up(self):
+        """백그라운드 스레드에서 모델을 미리 로드하고 예측 경로를 한 번 실행 (중복 호출 무시)"""
+        if self._model is not None or (self._warmup_thread and self._warmup_thread.is_alive()):
+            return self._warmup_thread
+
+        def _run():
+            try:
+                model = self.get()
+                if model is not None:
+                    self.score_many([{'subject': 'warm up'}], model=model)
+            except Exception as e:
+                print(f"⚠️ [모델] 워밍업 실패: {str(e)}")
+
+        self._warmup_thread = threading.Thread(target=_run, name='model-warmup', daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+
+# 전역 피싱 모델 레지스트리
+phishing_model_registry = ModelRegistry()
@@ -0,0 +1,96 @@
+"""
+DeepMail - 사용자 피드백으로 갱신되는 온라인 학습 피싱 모델 모듈
+"""
+
+import os
+import tempfile
+import threading
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from config import ONLINE_MODEL_CONFIG
+from features import feature_extractor
+
+CLASSES = np.array([0, 1])
+
+
+class OnlinePhishingModel:
+    """HashingVectorizer + partial_fit 선형 분류기로 구성된 증분 학습 모델
+
+    - 벡터라이저는 상태가 없으므로 어휘 학습 없이 바로 변환합니다.
+    - 메일 삭제(피싱 쪽 약한 신호)와 "피싱 아님" 피드백(정상)을 받을 때마다
+      partial_fit 한 번으로 갱신하고 분류기만 디스크에 저장합니다.
+    - 두 클래스를 모두 학습하기 전에는 예측하지 않습니다(RF 모델의 보조 의견).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or ONLINE_MODEL_CONFIG['path']
+        self.vectorizer = HashingVectorizer(
+            n_features=ONLINE_MODEL_CONFIG['n_features'], alternate_sign=False, norm='l2'
+        )
+        self._lock = threading.Lock()
+        self._classifier = None
+        self._class_counts = None
+
+    def _load(self):
+        if self._classifier is not None:
+            return
+        state = None
+        if os.path.exists(self.path):
+            try:
+                state = joblib.load(self.path)
+            except Exception as e:
+                print(f"⚠️ [온라인 모델] 저장된 모델을 읽지 못해 새로 시작합니다: {str(e)}")
+        if state:
+            self._classifier, self._class_counts = state['classifier'], state['class_counts']
+        else:
+            self._classifier = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=0)
+            self._class_counts = [0, 0]
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                joblib.dump({'classifier': self._classifier, 'class_counts': self._class_counts}, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _transform(self, messages):
+        return self.vectorizer.transform([item.raw_text for item in feature_extractor.extract_many(messages)])
+
+    @property
+    def is_ready(self):
+        """정상/피싱 예시를 모두 학습했는지 여부"""
+        with self._lock:
+            self._load()
+            return all(self._class_counts)
+
+    def learn(self, messages, label, weight=1.0):
+        """메일 목록을 label(1=피싱, 0=정상)로 한 번에 증분 학습"""
+        if not messages:
+            return
+        X = self._transform(messages)
+        y = np.full(len(messages), label)
+        with self._lock:
+            self._load()
+            self._classifier.partial_fit(X, y, classes=CLASSES, sample_weight=np.full(len(messages), weight))
+            self._class_counts[label] += len(messages)
+            self._save()
+
+    def predict_proba(self, messages):
+        """피싱 확률 배열 (아직 두 클래스를 모두 학습하지 않았으면 None)"""
+        if not messages or not self.is_ready:
+            return None
+        X = self._transform(messages)
+        with self._lock:
+            return self._classifier.predict_proba(X)[:, 1]
+
+
+# 전역 온라인 모델 인스턴스
+online_phishing_model = OnlinePhishingModel()
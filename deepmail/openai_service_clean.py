@@ -5,16 +5,31 @@ DeepMail - OpenAI 서비스 모듈 (정리된 버전)
 import streamlit as st
 import os
 import json
-import joblib
 from openai import OpenAI
-from config import OPENAI_CONFIG
+from config import OPENAI_CONFIG, PARSE_CONFIG
 from gmail_service import gmail_service, email_parser
+from rate_limiter import gmail_rate_limiter
 from typing import List, Dict, Any, Optional, Union
-from mail_utils import get_mail_full_content
+from mail_utils import (
+    get_mail_full_content, get_mail_text_preview, forget_mail_contents,
+    learn_from_feedback, get_online_phishing_score
+)
+from mail_index import mail_index
+from bulk_parser import bulk_parse
+from model_registry import phishing_model_registry, FEATURE_SOURCE_BODY
+from prefilter import phishing_prefilter, headers_from_raw, TIER_MODEL
 
 
-# 모델 경로 정의
-MODEL_PATH = os.path.join(os.path.dirname(__file__), '../models/rf_phishing_model.pkl')
+# 메일 통계용 키워드
+STATISTICS_KEYWORDS = [
+    'urgent', 'important', 'notice', 'alert', 'warning',
+    'payment', 'invoice', 'order', 'delivery', 'shipping',
+    'account', 'security', 'password', 'login', 'verify',
+    'confirm', 'update', 'expire', 'limited', 'offer',
+    'free', 'discount', 'sale', 'promotion', 'deal',
+    'newsletter', 'subscription', 'unsubscribe',
+    'support', 'help', 'contact', 'service'
+]
 
 # Function Calling 스키마 정의 (상수)
 FUNCTION_SCHEMA = [
@@ -65,6 +80,17 @@ FUNCTION_SCHEMA = [
             "required": ["indices"]
         }
     },
+    {
+        "name": "mark_not_phishing",
+        "description": "선택한 번호의 Gmail 메일이 피싱이 아니라는 사용자 피드백을 기록하여 온라인 피싱 모델을 갱신합니다. 사용자가 '3번 메일은 피싱 아니야'라고 하면 인덱스 2를 의미합니다.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "indices": {"type": "array", "items": {"type": "integer"}, "description": "피싱이 아닌 메일의 인덱스 (사용자 번호 - 1). 예: 사용자가 '3번 메일'이라고 하면 2"}
+            },
+            "required": ["indices"]
+        }
+    },
     {
         "name": "get_mail_content",
         "description": "번호로 Gmail 메일의 제목, 발신자, 내용을 반환합니다. 사용자가 '8번 메일'이라고 하면 인덱스 7을 의미합니다.",
@@ -244,39 +270,70 @@ class OpenAIService:
             subject = msg_info['subject']
             sender = msg_info['sender']
             
-            print(f"[DEBUG] Step 2: Raw 메일 가져오기, message_id={repr(message_id)}, subject={repr(subject)}")
+            if phishing_model_registry.get() is None:
+                return {'error': f'[3] 피싱 판별 모델 파일이 없습니다. (model_path={phishing_model_registry.path})'}
 
-            email_message = gmail_service.get_raw_message(message_id)
-            print(f"[DEBUG] email_message is None? {email_message is None}")
-            if email_message is None:
-                return {'error': f'[2] 메일 본문을 불러올 수 없습니다. (message_id={message_id})'}
+            # 현재 모델 버전으로 이미 검사한 메일이면 본문을 다시 가져오지 않음
+            cached = phishing_model_registry.get_cached_scores([message_id], FEATURE_SOURCE_BODY)
+            decision = None
+            if message_id in cached:
+                print(f"[DEBUG] 캐시된 점수 사용: message_id={repr(message_id)}")
+                probas = [cached[message_id]]
+            else:
+                # 요약 헤더(발신자 평판/인증 결과)만으로 명확한 메일은 본문을 가져오지 않음
+                decision = phishing_prefilter.decide(msg_info)
+                if decision is None:
+                    print(f"[DEBUG] Step 2: Raw 메일 가져오기, message_id={repr(message_id)}, subject={repr(subject)}")
 
-            print(f"[DEBUG] Step 3: 본문 추출")
-            text, html = email_parser.extract_text_from_email(email_message)
-            full_text = (subject or '') + ' ' + (text or '') + ' ' + (html or '')
-            print(f"[DEBUG] 본문 길이: text={len(text)}, html={len(html)}, full_text={len(full_text)}")
+                    raw_data = gmail_service.get_raw_bytes(message_id)
+                    print(f"[DEBUG] raw_data is None? {raw_data is None}")
+                    if raw_data is None:
+                        return {'error': f'[2] 메일 본문을 불러올 수 없습니다. (message_id={message_id})'}
 
-            print(f"[DEBUG] Step 4: 모델 로드 및 예측")
-            model_path = os.path.abspath(MODEL_PATH)
-            print(f"[DEBUG] model_path={model_path}, exists={os.path.exists(model_path)}")
+                    # 요약에 인증 헤더가 없었으면(예전 인덱스) 원본 헤더로 한 번 더 사전 필터
+                    if not msg_info.get('authResults'):
+                        msg_info = {**msg_info, **headers_from_raw(raw_data)}
+                        decision = phishing_prefilter.decide(msg_info)
+
+                if decision is not None:
+                    print(f"[DEBUG] 사전 필터 판정: {decision['rule']} ({decision['reason']})")
+                    phishing_prefilter.record({message_id: decision})
+                    probas = [decision['probability']]
+                else:
+                    print(f"[DEBUG] Step 3: 본문 추출 (최대 {PARSE_CONFIG['classify_max_chars']}자)")
+                    parsed = email_parser.parse_capped(raw_data, PARSE_CONFIG['classify_max_chars'])
+                    print(f"[DEBUG] 본문 길이: text={len(parsed['text'])}, html={len(parsed['html'])}")
+
+                    print(f"[DEBUG] Step 4: 모델 예측")
+                    probas = phishing_model_registry.score_many_cached([
+                        {'id': message_id, 'subject': subject, 'body_text': parsed['text'], 'body_html': parsed['html']}
+                    ], FEATURE_SOURCE_BODY)
+                    if probas is None:
+                        return {'error': f'[3] 피싱 판별 모델 파일이 없습니다. (model_path={phishing_model_registry.path})'}
+                    phishing_prefilter.record_model_scores([msg_info], {message_id: float(probas[0])})
             
-            if not os.path.exists(model_path):
-                return {'error': f'[3] 피싱 판별 모델 파일이 없습니다. (model_path={model_path})'}
+            proba = float(probas[0])
+            # predict()와 같은 기준 (두 클래스 중 확률이 더 높은 쪽), 사전 필터는 판정을 그대로 사용
+            if decision is not None:
+                result = 'phishing' if decision['verdict'] == 'phishing' else 'not phishing'
+            else:
+                result = 'phishing' if proba > 0.5 else 'not phishing'
+            print(f"[DEBUG] 예측 결과: proba={proba}")
+            # 사전 필터 판정은 phishing_decisions에만 남기고 메일의 피싱 점수는 모델 점수만 저장
+            if decision is None:
+                mail_index.set_phishing_scores({message_id: proba})
             
-            model_obj = joblib.load(model_path)
-            vectorizer = model_obj['vectorizer']
-            classifier = model_obj['classifier']
-            X = vectorizer.transform([full_text])
-            pred = classifier.predict(X)[0]
-            proba = classifier.predict_proba(X)[0][1] if hasattr(classifier, 'predict_proba') else None
-            result = 'phishing' if pred == 1 else 'not phishing'
-            print(f"[DEBUG] 예측 결과: pred={pred}, proba={proba}")
+            # 사용자 피드백으로 학습한 온라인 모델의 보조 의견
+            online_proba = get_online_phishing_score(msg_info)
             
             return {
                 'subject': subject, 
                 'sender': sender, 
                 'result': result, 
-                'probability': float(proba) if proba is not None else None
+                'probability': proba,
+                'online_probability': online_proba,
+                'tier': decision['tier'] if decision else TIER_MODEL,
+                'decision_reason': decision['reason'] if decision else ''
             }
         except Exception as e:
             import traceback
@@ -299,57 +356,97 @@ class OpenAIService:
             
             print(f"📧 [일괄 피싱 검사] {total_checked}개 메일 검사 중...")
             
-            # 모델 로드
-            model_path = os.path.abspath(MODEL_PATH)
-            if not os.path.exists(model_path):
-                return {'error': f'피싱 판별 모델 파일이 없습니다. (model_path={model_path})'}
+            # 모델 확인 (레지스트리에 캐시된 모델 재사용)
+            if phishing_model_registry.get() is None:
+                return {'error': f'피싱 판별 모델 파일이 없습니다. (model_path={phishing_model_registry.path})'}
+            
+            # 현재 모델 버전으로 이미 검사한 메일은 저장된 점수만 다시 필터링
+            scores = phishing_model_registry.get_cached_scores(
+                [msg['id'] for msg in messages_to_check], FEATURE_SOURCE_BODY
+            )
+            unscored_ids = list(dict.fromkeys(msg['id'] for msg in messages_to_check if msg['id'] not in scores))
+            cached_count = len(scores)
+            
+            # 발신자 평판/인증 결과로 명확한 메일은 본문을 가져오지 않고 사전 필터에서 판정
+            summaries = {msg['id']: msg for msg in messages_to_check}
+            decisions = phishing_prefilter.decide_many([summaries[message_id] for message_id in unscored_ids])
+            fetch_ids = [message_id for message_id in unscored_ids if decisions[message_id] is None]
+            
+            # 본문을 배치 요청으로 한 번에 가져오기
+            raw_messages, fetch_errors = gmail_service.get_raw_messages(fetch_ids, as_bytes=True) if fetch_ids else ({}, {})
+            if fetch_ids and gmail_rate_limiter.last_wait > 0:
+                print(f"⏳ [일괄 피싱 검사] Gmail 요청 한도로 본문 조회 중 {gmail_rate_limiter.last_wait:.1f}초 대기")
+            # 요약에 인증 헤더가 없던 메일(예전 인덱스)은 원본 헤더로 한 번 더 사전 필터
+            recheck = [
+                message_id for message_id in fetch_ids
+                if message_id in raw_messages and not summaries[message_id].get('authResults')
+            ]
+            for message_id in recheck:
+                summaries[message_id] = {**summaries[message_id], **headers_from_raw(raw_messages[message_id])}
+            for message_id, decision in phishing_prefilter.decide_many([summaries[message_id] for message_id in recheck]).items():
+                if decision is not None:
+                    decisions[message_id] = decision
+                    raw_messages.pop(message_id)
+            decided = {message_id: decision for message_id, decision in decisions.items() if decision is not None}
+            phishing_prefilter.record(decided)
+            scores.update({message_id: decision['probability'] for message_id, decision in decided.items()})
+            print(f"📦 [일괄 피싱 검사] 캐시된 점수 {cached_count}개, 사전 필터 판정 {len(decided)}개, 모델 검사 {len(raw_messages)}개")
+            
+            # 본문 파싱은 CPU 작업이므로 메일이 많으면 프로세스 풀에서 병렬 처리
+            parsed_messages = bulk_parse(raw_messages, PARSE_CONFIG['classify_max_chars'])
+            raw_messages = None
             
-            model_obj = joblib.load(model_path)
-            vectorizer = model_obj['vectorizer']
-            classifier = model_obj['classifier']
+            # 검사 가능한 메일만 모아 한 번에 점수 계산
+            subjects = {msg['id']: msg['subject'] for msg in messages_to_check}
+            checkable = []
+            for message_id in unscored_ids:
+                if message_id in decided:
+                    continue
+                parsed = parsed_messages.get(message_id)
+                if parsed is None or parsed['error']:
+                    reason = parsed['body_text'] if parsed else fetch_errors.get(message_id, '')
+                    print(f"⚠️ [일괄 피싱 검사] 메일 {message_id} 본문 로드 실패, 건너뜀: {reason}")
+                    continue
+                checkable.append({
+                    'id': message_id,
+                    'subject': subjects[message_id],
+                    'body_text': parsed['body_text'],
+                    'body_html': parsed['body_html']
+                })
             
+            if checkable:
+                print(f"🔍 [일괄 피싱 검사] {len(checkable)}개 메일 점수 계산 중...")
+                probas = phishing_model_registry.score_many_cached(checkable, FEATURE_SOURCE_BODY)
+                model_scores = dict(zip((mail['id'] for mail in checkable), map(float, probas)))
+                phishing_prefilter.record_model_scores([summaries[mail['id']] for mail in checkable], model_scores, threshold)
+                scores.update(model_scores)
+            
+            # 임계값 이상이면 피싱으로 판단 (임계값만 바뀌면 여기만 다시 실행됨), 사전 필터는 판정을 그대로 사용
             phishing_mails = []
             checked_count = 0
-            
+            tier_counts = {}
             for i, msg in enumerate(messages_to_check):
-                try:
-                    print(f"🔍 [일괄 피싱 검사] {i+1}/{total_checked}번째 메일 검사 중...")
-                    
-                    message_id = msg['id']
-                    subject = msg['subject']
-                    sender = msg['sender']
-                    
-                    # 메일 본문 가져오기
-                    email_message = gmail_service.get_raw_message(message_id)
-                    if email_message is None:
-                        print(f"⚠️ [일괄 피싱 검사] {i+1}번째 메일 본문 로드 실패, 건너뜀")
-                        continue
-                    
-                    # 본문 추출
-                    text, html = email_parser.extract_text_from_email(email_message)
-                    full_text = (subject or '') + ' ' + (text or '') + ' ' + (html or '')
-                    
-                    # 피싱 검사
-                    X = vectorizer.transform([full_text])
-                    proba = classifier.predict_proba(X)[0][1] if hasattr(classifier, 'predict_proba') else 0.5
-                    
-                    checked_count += 1
-                    
-                    # 임계값 이상이면 피싱으로 판단
-                    if proba >= threshold:
-                        phishing_mails.append({
-                            'index': i,
-                            'message_id': message_id,
-                            'subject': subject,
-                            'sender': sender,
-                            'probability': float(proba)
-                        })
-                        print(f"🚨 [일괄 피싱 검사] 피싱 메일 발견: {subject[:50]}... (확률: {proba:.2f})")
-                    
-                except Exception as e:
-                    print(f"❌ [일괄 피싱 검사] {i+1}번째 메일 검사 실패: {str(e)}")
+                if msg['id'] not in scores:
                     continue
+                checked_count += 1
+                proba = float(scores[msg['id']])
+                decision = decided.get(msg['id'])
+                tier = decision['tier'] if decision else TIER_MODEL
+                tier_counts[tier] = tier_counts.get(tier, 0) + 1
+                if (decision['verdict'] == 'phishing') if decision else proba >= threshold:
+                    phishing_mails.append({
+                        'index': i,
+                        'message_id': msg['id'],
+                        'subject': msg['subject'],
+                        'sender': msg['sender'],
+                        'probability': proba,
+                        'tier': tier
+                    })
+                    print(f"🚨 [일괄 피싱 검사] 피싱 메일 발견: {msg['subject'][:50]}... (확률: {proba:.2f})")
             
+            mail_index.set_phishing_scores({
+                message_id: score for message_id, score in scores.items() if message_id not in decided
+            })
             print(f"✅ [일괄 피싱 검사] 검사 완료! 총 {checked_count}개 검사, 피싱 {len(phishing_mails)}개 발견")
             
             # 피싱 메일 삭제
@@ -357,24 +454,26 @@ class OpenAIService:
             if phishing_mails:
                 print(f"🗑️ [일괄 피싱 검사] {len(phishing_mails)}개 피싱 메일 삭제 시작...")
                 
+                outcomes = gmail_service.trash_many([mail['message_id'] for mail in phishing_mails])
+                if gmail_rate_limiter.last_wait > 0:
+                    print(f"⏳ [일괄 피싱 검사] Gmail 요청 한도로 삭제 중 {gmail_rate_limiter.last_wait:.1f}초 대기")
+                deleted_ids = [msg_id for msg_id, success in outcomes.items() if success]
+                deleted_count = len(deleted_ids)
+                forget_mail_contents(deleted_ids)
+                
                 for phishing_mail in phishing_mails:
-                    try:
-                        success = gmail_service.move_to_trash(phishing_mail['message_id'])
-                        if success:
-                            deleted_count += 1
-                            print(f"✅ [일괄 피싱 검사] 삭제 성공: {phishing_mail['subject'][:50]}...")
-                        else:
-                            print(f"❌ [일괄 피싱 검사] 삭제 실패: {phishing_mail['subject'][:50]}...")
-                    except Exception as e:
-                        print(f"❌ [일괄 피싱 검사] 삭제 중 오류: {str(e)}")
-                        continue
+                    if outcomes.get(phishing_mail['message_id'], False):
+                        print(f"✅ [일괄 피싱 검사] 삭제 성공: {phishing_mail['subject'][:50]}...")
+                    else:
+                        print(f"❌ [일괄 피싱 검사] 삭제 실패: {phishing_mail['subject'][:50]}...")
             
             return {
                 'total_checked': checked_count,
                 'phishing_found': len(phishing_mails),
                 'deleted_count': deleted_count,
                 'phishing_mails': phishing_mails,
-                'threshold': threshold
+                'threshold': threshold,
+                'tier_counts': tier_counts
             }
             
         except Exception as e:
@@ -388,84 +487,11 @@ class OpenAIService:
         try:
             print(f"📊 [메일 통계] 최대 {max_mails}개 메일 분석 시작...")
             
-            messages = self.get_gmail_messages()
-            if not messages:
+            # 로컬 인덱스에서 SQL 집계로 통계 계산
+            stats = mail_index.get_statistics(max_mails, STATISTICS_KEYWORDS)
+            if not stats['total_messages']:
                 return {'error': '메일이 없습니다.'}
             
-            # 분석할 메일 수 제한
-            messages_to_analyze = messages[:max_mails]
-            total_messages = len(messages_to_analyze)
-            
-            print(f"📧 [메일 통계] {total_messages}개 메일 분석 중...")
-            
-            # 기본 통계
-            stats = {
-                'total_messages': total_messages,
-                'total_all_messages': len(messages),
-                'sender_stats': {},
-                'domain_stats': {},
-                'keyword_stats': {}
-            }
-            
-            # 발신자별 통계
-            sender_counts = {}
-            domain_counts = {}
-            
-            # 키워드 통계
-            keyword_counts = {}
-            
-            for i, msg in enumerate(messages_to_analyze):
-                try:
-                    print(f"📊 [메일 통계] {i+1}/{total_messages}번째 메일 분석 중...")
-                    
-                    # 발신자 통계
-                    sender = msg.get('sender', 'Unknown')
-                    sender_counts[sender] = sender_counts.get(sender, 0) + 1
-                    
-                    # 도메인 추출
-                    if '@' in sender:
-                        domain = sender.split('@')[-1]
-                        domain_counts[domain] = domain_counts.get(domain, 0) + 1
-                    
-                    # 키워드 분석 (제목 + 내용)
-                    subject = msg.get('subject', '')
-                    snippet = msg.get('snippet', '')
-                    text_for_keywords = (subject + ' ' + snippet).lower()
-                    
-                    # 일반적인 키워드들
-                    keywords = [
-                        'urgent', 'important', 'notice', 'alert', 'warning',
-                        'payment', 'invoice', 'order', 'delivery', 'shipping',
-                        'account', 'security', 'password', 'login', 'verify',
-                        'confirm', 'update', 'expire', 'limited', 'offer',
-                        'free', 'discount', 'sale', 'promotion', 'deal',
-                        'newsletter', 'subscription', 'unsubscribe',
-                        'support', 'help', 'contact', 'service'
-                    ]
-                    
-                    for keyword in keywords:
-                        if keyword in text_for_keywords:
-                            keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
-                    
-                except Exception as e:
-                    print(f"❌ [메일 통계] {i+1}번째 메일 분석 실패: {str(e)}")
-                    continue
-            
-            # 통계 정리
-            stats['sender_stats'] = {
-                'unique_senders': len(sender_counts),
-                'top_senders': sorted(sender_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-            }
-            
-            stats['domain_stats'] = {
-                'unique_domains': len(domain_counts),
-                'top_domains': sorted(domain_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-            }
-            
-            stats['keyword_stats'] = {
-                'top_keywords': sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)[:15]
-            }
-            
             print(f"✅ [메일 통계] 분석 완료!")
             
             return stats
@@ -497,7 +523,7 @@ class OpenAIService:
                     if full_content['body_text']:
                         content_text = full_content['body_text']
                     elif full_content['body_html']:
-                        content_text = email_parser.extract_text_from_html(full_content['body_html'])
+                        content_text = email_parser.extract_text_from_html(full_content['body_html'], msg['id'])
                     else:
                         content_text = msg['snippet']
                 prompt = f"""다음 이메일을 요약해줘.\n\n제목: {msg['subject']}\n발신자: {msg['sender']}\n내용: {content_text[:2000]}"""
@@ -508,6 +534,7 @@ class OpenAIService:
                         temperature=temperature
                     )
                     summary = response.choices[0].message.content.strip()
+                    mail_index.set_summary(msg['id'], summary)
                 except Exception as e:
                     summary = f"[{idx+1}] 요약 실패: {str(e)}"
                 summaries.append(f"[{idx+1}] {msg['subject']}\n{summary}")
@@ -548,6 +575,8 @@ class OpenAIService:
 발신자: {function_result.get('sender', 'N/A')}
 결과: {function_result.get('result', 'N/A')}
 확률: {function_result.get('probability', 'N/A')}
+사용자 피드백 모델 확률(보조 의견, 없으면 학습 전): {function_result.get('online_probability', 'N/A')}
+판정 단계(prefilter=발신자 평판/인증 규칙, model=ML 모델): {function_result.get('tier', 'N/A')} {function_result.get('decision_reason', '')}
 
 이 결과를 바탕으로 사용자에게 친화적이고 명확한 설명을 제공해주세요. 
 피싱 메일인 경우 주의사항과 권장 조치를 포함하고, 
@@ -589,12 +618,15 @@ class OpenAIService:
                             
                             st.success(f"✅ 피싱 메일 일괄 삭제 완료!")
                             st.info(f"📊 검사 결과: 총 {total_checked}개 메일 검사, 피싱 {phishing_found}개 발견, {deleted_count}개 삭제 (임계값: {threshold*100:.0f}%)")
+                            tier_counts = function_result.get("tier_counts", {})
+                            if tier_counts.get('prefilter'):
+                                st.caption(f"사전 필터 판정 {tier_counts['prefilter']}개, 모델 판정 {tier_counts.get('model', 0)}개")
                             
                             # 삭제된 메일 목록 표시
                             if function_result.get("phishing_mails"):
                                 with st.expander("🗑️ 삭제된 피싱 메일 목록"):
                                     for mail in function_result["phishing_mails"]:
-                                        st.write(f"• {mail['subject']} (확률: {mail['probability']*100:.1f}%)")
+                                        st.write(f"• {mail['subject']} (확률: {mail['probability']*100:.1f}%, 판정: {mail.get('tier', 'model')})")
                         else:
                             st.error(f"❌ 피싱 메일 삭제 중 오류: {function_result.get('error', '알 수 없는 오류')}")
                 
@@ -660,6 +692,14 @@ class OpenAIService:
                     return {"summary": summary, "message": f"{len(indices)}개 메일 요약 완료"}
                 else:
                     return {"success": False, "error": "indices가 필요합니다."}
+            elif function_name == "mark_not_phishing":
+                indices = arguments.get("indices", [])
+                if indices:
+                    results = self.mark_not_phishing_by_indices(indices)
+                    marked = [r["subject"] for r in results if r.get("success", False)]
+                    return {"results": results, "message": f"✅ {len(marked)}개 메일을 정상 메일로 학습했습니다."}
+                else:
+                    return {"success": False, "error": "indices가 필요합니다."}
             elif function_name == "get_mail_content":
                 index = arguments.get("index")
                 messages = self.get_gmail_messages()
@@ -718,27 +758,21 @@ class OpenAIService:
         results = []
         messages = self.get_gmail_messages()
         
-        # 삭제된 메일 ID들을 추적하기 위한 세션 상태 초기화
-        if 'deleted_mail_ids' not in st.session_state:
-            st.session_state.deleted_mail_ids = set()
+        # 유효한 번호의 메일을 batchModify 한 번으로 휴지통 이동
+        target_ids = [messages[idx]['id'] for idx in indices if 0 <= idx < len(messages)]
+        outcomes = gmail_service.trash_many(target_ids) if target_ids else {}
+        
+        # 삭제한 메일로 온라인 모델을 갱신한 뒤(캐시된 본문 사용), UI 목록/캐시/인덱스에서 한 번에 제거
+        trashed_ids = {msg_id for msg_id, success in outcomes.items() if success}
+        learn_from_feedback([msg for msg in messages if msg['id'] in trashed_ids], is_phishing=True)
+        forget_mail_contents(list(trashed_ids))
         
         for idx in indices:
             if 0 <= idx < len(messages):
                 msg_id = messages[idx]['id']
-                result = gmail_service.move_to_trash(msg_id)
-                
-                if result:
-                    # 성공적으로 삭제된 경우 UI에서 즉시 사라지도록 세션에 추가
-                    st.session_state.deleted_mail_ids.add(msg_id)
-                    
-                    # 해당 메일의 캐시도 제거
-                    cache_key = f"mail_content_{msg_id}"
-                    if cache_key in st.session_state:
-                        del st.session_state[cache_key]
-                
                 results.append({
                     "index": idx, 
-                    "success": result, 
+                    "success": outcomes.get(msg_id, False), 
                     "message_id": msg_id,
                     "subject": messages[idx]['subject']
                 })
@@ -747,6 +781,17 @@ class OpenAIService:
         
         return results
 
+    def mark_not_phishing_by_indices(self, indices: List[int]) -> List[Dict[str, Any]]:
+        """번호(인덱스) 리스트의 메일을 "피싱 아님"으로 온라인 모델에 학습"""
+        messages = self.get_gmail_messages()
+        targets = [messages[idx] for idx in indices if 0 <= idx < len(messages)]
+        learn_from_feedback(targets, is_phishing=False)
+        return [
+            {"index": idx, "success": True, "subject": messages[idx]['subject']}
+            if 0 <= idx < len(messages) else {"index": idx, "success": False, "error": "존재하지 않는 번호"}
+            for idx in indices
+        ]
+
     def get_mail_content(self, index: int) -> Dict[str, Any]:
         """번호(인덱스)로 메일의 제목/내용을 반환"""
         messages = self.get_gmail_messages()
@@ -764,30 +809,27 @@ class OpenAIService:
         """제목, 발신자, 본문(snippet)에서 키워드로 검색하고 스니펫 기반 요약 생성"""
         messages = self.get_gmail_messages()
         results = []
-        query_lower = query.lower()
         
-        # 검색 결과 수집
+        # 로컬 인덱스 전문 검색 (FTS5)
+        index_by_id = {msg['id']: idx for idx, msg in enumerate(messages)}
         search_results = []
-        for idx, msg in enumerate(messages):
-            if (query_lower in msg.get('subject', '').lower() or
-                query_lower in msg.get('sender', '').lower() or
-                query_lower in msg.get('snippet', '').lower()):
-                search_results.append({
-                    "index": idx,
-                    "mail_number": idx + 1,  # 사용자 번호 (1부터 시작)
-                    "subject": msg.get('subject', ''),
-                    "sender": msg.get('sender', ''),
-                    "snippet": msg.get('snippet', '')
-                })
-            if len(search_results) >= max_results:
-                break
+        for msg in mail_index.search(query, max_results):
+            idx = index_by_id.get(msg['id'])
+            search_results.append({
+                "index": idx,
+                "mail_number": idx + 1 if idx is not None else None,  # 현재 목록에 없는 메일은 번호 없음
+                "subject": msg.get('subject', ''),
+                "sender": msg.get('sender', ''),
+                "snippet": msg.get('snippet', '')
+            })
         
         # 각 검색 결과에 대해 개별 요약 생성
         for result in search_results:
             if self.client:
                 try:
                     # 개별 메일 요약 생성 (메일 번호 포함)
-                    summary_prompt = f"""다음 {result['mail_number']}번 메일을 간단히 요약해주세요:
+                    mail_label = f"{result['mail_number']}번 메일" if result['mail_number'] else "메일"
+                    summary_prompt = f"""다음 {mail_label}을 간단히 요약해주세요:
 
 제목: {result['subject']}
 발신자: {result['sender']}
@@ -826,9 +868,8 @@ class OpenAIService:
             msg = messages[email_index]
             subject = msg['subject']
             
-            # 메일 전체 내용 가져오기
-            from mail_utils import get_mail_full_content
-            mail_content = get_mail_full_content(msg['id'])
+            # 링크 추출에 필요한 만큼만 본문 가져오기
+            mail_content = get_mail_text_preview(msg['id'], PARSE_CONFIG['link_scan_max_chars'])
             
             if mail_content.get('error', False):
                 return "❌ 메일 내용을 가져올 수 없습니다."
@@ -888,6 +929,9 @@ class OpenAIService:
         
         messages = self.get_gmail_messages()
         results = []
+        # 발신자 평판/인증 결과로 이미 명확한 메일은 웹서치를 생략
+        decisions = phishing_prefilter.decide_many(messages[:n])
+        phishing_prefilter.record(decisions)
         
         for i, msg in enumerate(messages[:n]):
             print(f"📧 [링크분석] {i+1}/{n}번째 메일 분석 중...")
@@ -895,6 +939,18 @@ class OpenAIService:
             subject = msg.get('subject', '')
             print(f"   제목: {subject[:50]}...")
             
+            decision = decisions[msg['id']]
+            if decision is not None:
+                verdict = '피싱' if decision['verdict'] == 'phishing' else '정상'
+                print(f"   ⏭️ [링크분석] 사전 필터 판정({decision['rule']})으로 웹서치 생략")
+                results.append({
+                    "mail_number": i + 1,
+                    "subject": subject,
+                    "link_analysis": f"⏭️ 사전 필터에서 {verdict}으로 판정되어 웹서치를 생략했습니다: {decision['reason']}",
+                    "tier": decision['tier']
+                })
+                continue
+            
             try:
                 # 개별 메일 링크 분석
                 analysis_result = self.analyze_link_risk(i)
@@ -907,7 +963,8 @@ class OpenAIService:
             results.append({
                 "mail_number": i + 1,
                 "subject": subject,
-                "link_analysis": analysis_result
+                "link_analysis": analysis_result,
+                "tier": "web_search"
             })
         
         print(f"🎉 [링크분석] 전체 {len(results)}개 메일 링크 위험도 분석 완료!")
@@ -928,9 +985,8 @@ class OpenAIService:
             msg = messages[email_index]
             subject = msg['subject']
             
-            # 메일 전체 내용 가져오기
-            from mail_utils import get_mail_full_content
-            mail_content = get_mail_full_content(msg['id'])
+            # 프롬프트에 들어갈 만큼만 본문 가져오기
+            mail_content = get_mail_text_preview(msg['id'], PARSE_CONFIG['llm_max_chars'])
             
             if mail_content.get('error', False):
                 return "❌ 메일 내용을 가져올 수 없습니다."
@@ -944,8 +1000,8 @@ class OpenAIService:
                 print(f"🔍 [웹서치] 특정 검색어 분석: {search_query[:50]}...")
             else:
                 # 검색어가 없으면 메일 전체 내용 사용 (길이 제한)
-                search_content = body_text[:2000]  # 처음 2000자만 사용
-                print(f"🔍 [웹서치] 메일 전체 내용 분석 (처음 2000자)")
+                search_content = body_text[:PARSE_CONFIG['llm_max_chars']]
+                print(f"🔍 [웹서치] 메일 전체 내용 분석 (처음 {PARSE_CONFIG['llm_max_chars']}자)")
             
             # 웹서치 분석 수행
             web_search_prompt = f"""
@@ -992,9 +1048,7 @@ openai_service = OpenAIService()
 
 # 세션에 인증 정보가 있으면 gmail_service에 credentials와 service를 복구
 if st.session_state.get('gmail_credentials'):
-    gmail_service.credentials = st.session_state['gmail_credentials']
     try:
-        from googleapiclient.discovery import build
-        gmail_service.service = build('gmail', 'v1', credentials=gmail_service.credentials)
+        gmail_service.set_credentials(st.session_state['gmail_credentials'])
     except Exception as e:
         gmail_service.service = None 
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+DeepMail - ML 모델 앞단의 규칙 기반 피싱 사전 필터 모듈
+"""
+
+import re
+from email.parser import BytesHeaderParser
+from email.utils import parseaddr
+from config import PREFILTER_CONFIG
+from mail_index import mail_index
+
+TIER_PREFILTER = 'prefilter'
+TIER_MODEL = 'model'
+
+# 누구나 주소를 만들 수 있어 도메인 평판을 쓰지 않는 무료 메일 도메인
+FREEMAIL_DOMAINS = {
+    'gmail.com', 'googlemail.com', 'naver.com', 'daum.net', 'hanmail.net', 'kakao.com', 'nate.com',
+    'outlook.com', 'hotmail.com', 'live.com', 'yahoo.com', 'icloud.com', 'me.com', 'proton.me', 'protonmail.com'
+}
+
+AUTH_COMMENT_RE = re.compile(r'\([^)]*\)')
+AUTH_RESULT_RE = re.compile(r'^(spf|dkim|dmarc)\s*=\s*([a-z]+)', re.IGNORECASE)
+AUTH_PROPERTY_RE = re.compile(r'(header\.d|header\.i|header\.from|smtp\.mailfrom)\s*=\s*"?([^\s;"]+)', re.IGNORECASE)
+
+
+def parse_authentication_results(value):
+    """Authentication-Results 헤더를 방식별 (결과, 도메인) 목록으로 변환
+
+    반환값 예시: {'dkim': [('pass', 'github.com')], 'spf': [('pass', 'github.com')], 'dmarc': [('pass', 'github.com')]}
+    """
+    results = {'spf': [], 'dkim': [], 'dmarc': []}
+    # 첫 조각은 인증 서버 이름(authserv-id)
+    for segment in AUTH_COMMENT_RE.sub('', value or '').split(';')[1:]:
+        segment = segment.strip()
+        match = AUTH_RESULT_RE.match(segment)
+        if not match:
+            continue
+        domain = ''
+        for _, prop in AUTH_PROPERTY_RE.findall(segment):
+            domain = prop.rsplit('@', 1)[-1].lower()
+            break
+        results[match.group(1).lower()].append((match.group(2).lower(), domain))
+    return results
+
+
+def headers_from_raw(raw_data):
+    """원본 메일 바이트에서 본문 파싱 없이 사전 필터용 헤더만 추출"""
+    headers = BytesHeaderParser().parsebytes(raw_data)
+    return {
+        'authResults': str(headers.get('Authentication-Results', '') or ''),
+        'listUnsubscribe': str(headers.get('List-Unsubscribe', '') or '')
+    }
+
+
+def _aligned(auth_domain, sender_domain):
+    """인증된 도메인이 발신 도메인과 같거나 그 상위/하위 도메인인지"""
+    if not auth_domain or not sender_domain:
+        return False
+    return (
+        auth_domain == sender_domain
+        or sender_domain.endswith('.' + auth_domain)
+        or auth_domain.endswith('.' + sender_domain)
+    )
+
+
+def _trusted_results(auth_results):
+    """수신 서버(authserv_ids)가 붙인 헤더만 파싱, 아니면 None
+
+    발신자가 직접 넣은 Authentication-Results 헤더로는 인증 통과가 되지 않도록 합니다.
+    """
+    segments = AUTH_COMMENT_RE.sub('', auth_results or '').split(';', 1)
+    server = segments[0].split()[:1]
+    if not server or server[0].lower() not in PREFILTER_CONFIG['authserv_ids']:
+        return None
+    return parse_authentication_results(auth_results)
+
+
+def _passed_domain(results, sender_domain):
+    """발신 도메인으로 정렬되어 통과한 DMARC/DKIM 도메인, 없으면 ''"""
+    for result, domain in results['dmarc'] + results['dkim']:
+        if result == 'pass' and _aligned(domain, sender_domain):
+            return domain
+    return ''
+
+
+def auth_status(auth_results, sender_domain):
+    """인증 결과를 'pass'(발신 도메인으로 정렬된 통과), 'fail', 'unknown' 중 하나로 요약"""
+    results = _trusted_results(auth_results)
+    if results is None:
+        return 'unknown'
+    if any(result == 'fail' for result, _ in results['dmarc']):
+        return 'fail'
+    spf_failed = any(result in ('fail', 'softfail') for result, _ in results['spf'])
+    dkim_failed = results['dkim'] and all(result != 'pass' for result, _ in results['dkim'])
+    if spf_failed and dkim_failed:
+        return 'fail'
+    return 'pass' if _passed_domain(results, sender_domain) else 'unknown'
+
+
+def authenticated_domain(auth_results, sender_domain):
+    """인증을 통과한 도메인 (auth_status가 'pass'가 아니면 '')"""
+    if auth_status(auth_results, sender_domain) != 'pass':
+        return ''
+    return _passed_domain(_trusted_results(auth_results), sender_domain)
+
+
+def sender_identity(sender):
+    """'이름 <user@example.com>'에서 (소문자 주소, 도메인)"""
+    address = parseaddr(sender or '')[1].lower()
+    return address, address.rsplit('@', 1)[-1] if '@' in address else ''
+
+
+class PhishingPreFilter:
+    """ML 모델과 웹서치 전에 명확한 메일만 걸러내는 규칙 기반 단계
+
+    - 차단: 같은 주소/도메인의 과거 메일 대부분(blocked_ratio)이 피싱 점수를 받은 경우
+      (인증된 메일의 인증 도메인은 항상 발신 도메인과 정렬되므로 평판 대상과 일치)
+    - 신뢰: 발신 도메인으로 인증(DMARC/정렬된 DKIM)을 통과하고,
+      같은 주소에서 trusted_min_mails개 이상 받은 메일이 모두 정상이었던 경우
+    - 뉴스레터: 인증 통과 + List-Unsubscribe 헤더가 있고, 무료 메일이 아닌 도메인의
+      과거 메일이 trusted_min_mails개 이상 모두 정상이었던 경우
+    인증 실패 메일은 평판과 관계없이 정상으로 판단하지 않습니다(발신자 위장).
+    평판은 발신 도메인으로 인증을 통과한 메일의 모델 점수로만 쌓으므로
+    From 헤더만 위장한 메일로는 다른 도메인의 평판을 떨어뜨릴 수 없습니다.
+    판단하지 못한 메일은 None을 반환하여 모델로 보냅니다.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or PREFILTER_CONFIG
+
+    def decide_many(self, messages):
+        """메일 요약 목록을 판단 ({message_id: 판정 dict 또는 None})
+
+        messages: [{'id', 'sender', 'authResults'(선택), 'listUnsubscribe'(선택)}, ...]
+        판정 dict: {'tier', 'rule', 'verdict', 'probability', 'reason'}
+        """
+        if not self.config['enabled'] or not messages:
+            return {message['id']: None for message in messages}
+
+        identities = {message['id']: sender_identity(message.get('sender')) for message in messages}
+        threshold = self.config['score_threshold']
+        by_sender = mail_index.get_sender_reputation('sender', (address for address, _ in identities.values()), threshold)
+        by_domain = mail_index.get_sender_reputation(
+            'domain', (domain for _, domain in identities.values() if domain not in FREEMAIL_DOMAINS), threshold
+        )
+
+        decisions = {}
+        for message in messages:
+            address, domain = identities[message['id']]
+            decisions[message['id']] = self._decide(
+                message, address, domain, by_sender.get(address), None if domain in FREEMAIL_DOMAINS else by_domain.get(domain)
+            )
+        return decisions
+
+    def decide(self, message):
+        return self.decide_many([message])[message['id']]
+
+    def _decide(self, message, address, domain, sender_rep, domain_rep):
+        config = self.config
+        auth_domain = authenticated_domain(message.get('authResults'), domain)
+        for rule, key, rep in (('blocked_sender', address, sender_rep), ('blocked_domain', domain, domain_rep)):
+            if rep and rep['mails'] >= config['blocked_min_mails'] and rep['phishing'] / rep['mails'] >= config['blocked_ratio']:
+                return self._decision(
+                    rule, 'phishing', rep['phishing'] / rep['mails'],
+                    f"{key}: 과거 메일 {rep['mails']}개 중 {rep['phishing']}개 피싱"
+                )
+
+        if not auth_domain:
+            return None
+
+        if sender_rep and sender_rep['mails'] >= config['trusted_min_mails'] and not sender_rep['phishing']:
+            return self._decision(
+                'trusted_sender', 'clean', 0.0, f"{address}: 인증 통과, 과거 메일 {sender_rep['mails']}개 모두 정상"
+            )
+        if message.get('listUnsubscribe') and domain_rep and domain_rep['mails'] >= config['trusted_min_mails'] and not domain_rep['phishing']:
+            return self._decision(
+                'known_newsletter', 'clean', 0.0,
+                f"{domain}: 인증 통과, 구독 해지 헤더, 과거 메일 {domain_rep['mails']}개 모두 정상"
+            )
+        return None
+
+    @staticmethod
+    def _decision(rule, verdict, probability, reason):
+        return {'tier': TIER_PREFILTER, 'rule': rule, 'verdict': verdict, 'probability': float(probability), 'reason': reason}
+
+    def record(self, decisions):
+        """사전 필터 판정 저장 (판단하지 못한 메일은 제외)"""
+        decided = {message_id: decision for message_id, decision in decisions.items() if decision}
+        if decided:
+            mail_index.record_phishing_decisions(decided)
+
+    def record_model_scores(self, messages, scores, threshold=0.5):
+        """모델 점수를 판정으로 기록하고 발신자 평판에 반영
+
+        사전 필터가 내린 판정은 평판에 넣지 않아 스스로를 강화하지 않도록 합니다.
+        발신 도메인으로 인증을 통과하지 못한 메일은 From 헤더를 믿을 수 없으므로 평판에서 제외합니다.
+        messages: [{'id', 'sender', 'authResults'}, ...], scores: {message_id: 확률}
+        """
+        rows, decisions = [], {}
+        for message in messages:
+            if message['id'] not in scores:
+                continue
+            score = float(scores[message['id']])
+            address, domain = sender_identity(message.get('sender'))
+            auth_domain = authenticated_domain(message.get('authResults'), domain)
+            if address and auth_domain:
+                rows.append({'id': message['id'], 'sender': address, 'domain': domain, 'auth_domain': auth_domain, 'score': score})
+            decisions[message['id']] = {
+                'tier': TIER_MODEL, 'rule': 'rf_model', 'verdict': 'phishing' if score >= threshold else 'clean',
+                'probability': score, 'reason': ''
+            }
+        if rows:
+            mail_index.put_sender_scores(rows)
+        if decisions:
+            mail_index.record_phishing_decisions(decisions)
+
+
+# 전역 사전 필터 인스턴스
+phishing_prefilter = PhishingPreFilter()
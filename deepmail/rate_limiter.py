@@ -0,0 +1,105 @@
+"""
+DeepMail - Gmail API 할당량 기반 속도 제한 모듈
+"""
+
+import threading
+import time
+from googleapiclient.errors import HttpError
+from config import RATE_LIMIT_CONFIG
+
+# Gmail API 메서드별 할당량 단위 (배치 하위 요청은 개별 요청으로 계산)
+QUOTA_UNITS = {
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.attachments.get': 5,
+    'messages.trash': 5,
+    'messages.batchModify': 50,
+    'history.list': 2,
+    'getProfile': 1,
+}
+
+
+class QuotaRateLimiter:
+    """사용자별 할당량 단위를 모델링한 토큰 버킷
+
+    예산이 남아 있으면 바로 통과하고, 부족할 때만 필요한 만큼 대기합니다.
+    한 번에 버킷 용량보다 큰 요청(대용량 배치)은 용량만큼 모이면 통과시키고
+    초과분은 이후 호출이 대기하는 방식으로 갚습니다.
+    """
+
+    def __init__(self, units_per_second=None, capacity=None):
+        self.rate = units_per_second or RATE_LIMIT_CONFIG['units_per_second']
+        self.capacity = capacity or RATE_LIMIT_CONFIG['burst']
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.total_wait = 0.0
+
+    @property
+    def last_wait(self):
+        """현재 스레드의 마지막 Gmail 호출 대기 시간(초) - acquire 또는 record_wait로 기록"""
+        return getattr(self._local, 'last_wait', 0.0)
+
+    def record_wait(self, seconds):
+        """워커 스레드들에서 나눠 대기한 시간 합계를 호출한 스레드의 last_wait로 기록 (total_wait에는 이미 포함)"""
+        self._local.last_wait = seconds
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, method, count=1):
+        """method 호출 count번에 필요한 할당량을 확보하고 실제 대기한 시간(초)을 반환"""
+        cost = QUOTA_UNITS.get(method, 5) * count
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = max(0.0, self._blocked_until - now)
+                if delay == 0.0:
+                    needed = min(cost, self.capacity)
+                    if self._tokens >= needed:
+                        self._tokens -= cost
+                        self.total_wait += waited
+                        self._local.last_wait = waited
+                        return waited
+                    delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def backoff(self, seconds):
+        """429 응답 후 모든 호출을 seconds 동안 멈추고 버킷을 비움"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+def is_rate_limit_error(error):
+    """HttpError 상태 코드로 할당량 초과(429 / 403 rateLimitExceeded) 여부 판단"""
+    if not isinstance(error, HttpError):
+        return False
+    status = getattr(error.resp, 'status', None)
+    if status == 429:
+        return True
+    if status == 403:
+        reason = getattr(error, 'error_details', None) or []
+        return any(
+            isinstance(detail, dict) and detail.get('reason') in ('rateLimitExceeded', 'userRateLimitExceeded')
+            for detail in reason
+        )
+    return False
+
+
+def get_retry_after(error, default):
+    """Retry-After 헤더가 있으면 그 값을, 없으면 default를 반환"""
+    try:
+        return float(error.resp.get('retry-after', default))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+# 전역 Gmail 속도 제한기 (모든 Gmail 호출이 공유)
+gmail_rate_limiter = QuotaRateLimiter()
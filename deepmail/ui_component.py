@@ -11,6 +11,9 @@ from typing import Dict, List, Tuple, Optional, Any
 from config import SESSION_KEYS, MAIL_CONFIG, PAGE_CONFIG
 from gmail_service import gmail_service, email_parser
 from openai_service_clean import openai_service
+from mail_index import mail_index
+from content_store import content_store
+from model_registry import phishing_model_registry, FEATURE_SOURCE_SNIPPET
 from googleapiclient.errors import HttpError
 import pandas as pd
 
@@ -92,6 +95,7 @@ class UIComponents:
             'gmail_credentials': None,
             'gmail_messages': None,
             'gmail_last_fetch': None,
+            'gmail_history_id': None,
             'mail_page': 0,
             'mail_page_size': MAIL_CONFIG['default_page_size'],
             'sidebar_model': 'gpt-4',
@@ -109,10 +113,8 @@ class UIComponents:
     @staticmethod
     def _restore_gmail_service():
         """Gmail 서비스 복구"""
-        gmail_service.credentials = st.session_state['gmail_credentials']
         try:
-            from googleapiclient.discovery import build
-            gmail_service.service = build('gmail', 'v1', credentials=gmail_service.credentials)
+            gmail_service.set_credentials(st.session_state['gmail_credentials'])
         except Exception:
             gmail_service.service = None
 
@@ -232,6 +234,8 @@ class UIComponents:
             # Gmail API를 통해 사용자 정보 가져오기
             from gmail_service import gmail_service
             if gmail_service.service:
+                from rate_limiter import gmail_rate_limiter
+                gmail_rate_limiter.acquire('getProfile')
                 profile = gmail_service.service.users().getProfile(userId='me').execute()
                 
                 # 프로필 정보
@@ -384,6 +388,14 @@ class UIComponents:
         st.session_state.gmail_authenticated = False
         st.session_state.gmail_credentials = None
         st.session_state.gmail_messages = None
+        st.session_state.gmail_history_id = None
+        # 다른 계정으로 로그인해도 이전 계정의 메일 본문이 보이지 않도록 인덱스와 본문 캐시를 함께 비움
+        mail_index.clear()
+        content_store.clear()
+        for key in [key for key in st.session_state.keys() if str(key).startswith('mail_content_')]:
+            del st.session_state[key]
+        from mail_utils import forget_attachments
+        forget_attachments()
         import os
         if os.path.exists('token.pickle'):
             os.remove('token.pickle')
@@ -391,7 +403,55 @@ class UIComponents:
 
     @staticmethod
     def refresh_gmail_messages():
-        """Gmail 메시지 스마트 새로고침 (캐시 유지 + 새 메일만 추가)"""
+        """Gmail 메시지 스마트 새로고침 (historyId 기반 증분 동기화)"""
+        history_id = st.session_state.get('gmail_history_id')
+        current_messages = st.session_state.get('gmail_messages')
+        
+        # 이전 동기화 지점이 있으면 변경분만 반영
+        if history_id and current_messages is not None:
+            changes = gmail_service.get_history_changes(history_id)
+            if changes is not None:
+                UIComponents._apply_history_changes(current_messages, changes)
+                return
+        
+        # historyId가 없거나 만료된 경우 전체 동기화
+        UIComponents._full_resync()
+
+    @staticmethod
+    def _apply_history_changes(current_messages: List[Dict], changes: Dict):
+        """history.list 결과(추가/삭제된 메일)를 현재 메일 목록에 반영"""
+        current_ids = {msg['id'] for msg in current_messages}
+        deleted_mail_ids = set(changes['deleted']) & current_ids
+        # 목록에는 최신 max_results개만 남으므로 요약도 그만큼만 요청 (history는 오래된 순)
+        newly_added_ids = [mail_id for mail_id in changes['added'] if mail_id not in current_ids][-MAIL_CONFIG['max_results']:]
+        
+        # 삭제된 메일의 캐시 정리 (디스크 캐시 포함)
+        from mail_utils import forget_mail_contents
+        forget_mail_contents(deleted_mail_ids)
+        
+        # 새 메일은 최신순으로 목록 앞에 추가 (history는 오래된 순)
+        new_messages = gmail_service.get_message_summaries(newly_added_ids)[::-1]
+        updated_messages = new_messages + [msg for msg in current_messages if msg['id'] not in deleted_mail_ids]
+        mail_index.upsert_summaries(updated_messages)
+        
+        if new_messages:
+            st.success(f"✅ {len(new_messages)}개의 새 메일이 추가되었습니다!")
+        if deleted_mail_ids:
+            st.info(f"📭 {len(deleted_mail_ids)}개의 메일이 삭제되었습니다.")
+        
+        UIComponents._preload_mail_contents({msg['id'] for msg in new_messages})
+        
+        st.session_state.gmail_messages = updated_messages[:MAIL_CONFIG['max_results']]
+        st.session_state.gmail_history_id = changes['history_id']
+        st.session_state.gmail_last_fetch = datetime.now()
+        st.session_state.deleted_mail_ids = set()
+
+    @staticmethod
+    def _full_resync():
+        """Gmail 메시지 전체 동기화 (캐시 유지 + 새 메일만 추가)"""
+        # 목록 조회 전에 historyId를 먼저 받아 두어 조회 중 변경분도 다음 동기화에 반영
+        history_id = gmail_service.get_history_id()
+        
         # 현재 캐시된 메일 ID들 확인
         cached_mail_ids = set()
         for key in st.session_state.keys():
@@ -424,11 +484,15 @@ class UIComponents:
             if deleted_mail_ids:
                 st.info(f"📭 {len(deleted_mail_ids)}개의 메일이 삭제되었습니다.")
             
+            # 로컬 인덱스를 이번 목록 기준으로 동기화
+            mail_index.sync_window(new_messages)
+            
             # 새 메일들의 상세 내용 사전 로딩 (백그라운드)
             UIComponents._preload_mail_contents(newly_added_ids)
         
         # 메일 목록 업데이트
         st.session_state.gmail_messages = new_messages
+        st.session_state.gmail_history_id = history_id
         st.session_state.gmail_last_fetch = datetime.now()
         
         # 삭제 추적 초기화 (실제 Gmail 상태와 동기화)
@@ -440,28 +504,27 @@ class UIComponents:
         if not mail_ids:
             return
             
-        # 백그라운드에서 메일 내용 로딩
-        for mail_id in mail_ids:
-            cache_key = f"mail_content_{mail_id}"
-            if cache_key not in st.session_state:
-                try:
-                    from mail_utils import get_mail_full_content
-                    # 비동기적으로 로딩 (실제로는 동기적이지만 백그라운드 느낌)
-                    full_content = get_mail_full_content(mail_id)
-                    if not full_content.get('error', False):
-                        st.session_state[cache_key] = full_content
-                except Exception as e:
-                    # 로딩 실패 시 에러 결과 캐싱
-                    st.session_state[cache_key] = {
-                        'subject': '로딩 실패',
-                        'from': '오류',
-                        'to': '오류',
-                        'date': '오류',
-                        'body_text': f'메일 로딩 중 오류가 발생했습니다: {str(e)}',
-                        'body_html': '',
-                        'attachments': [],
-                        'error': True
-                    }
+        # 캐시에 없는 메일만 배치 요청으로 한 번에 로딩
+        missing_ids = [mail_id for mail_id in mail_ids if f"mail_content_{mail_id}" not in st.session_state]
+        if not missing_ids:
+            return
+        
+        try:
+            from mail_utils import get_mail_full_contents
+            get_mail_full_contents(missing_ids)
+        except Exception as e:
+            # 로딩 실패 시 에러 결과 캐싱
+            for mail_id in missing_ids:
+                st.session_state[f"mail_content_{mail_id}"] = {
+                    'subject': '로딩 실패',
+                    'from': '오류',
+                    'to': '오류',
+                    'date': '오류',
+                    'body_text': f'메일 로딩 중 오류가 발생했습니다: {str(e)}',
+                    'body_html': '',
+                    'attachments': [],
+                    'error': True
+                }
 
     @staticmethod
     def _clear_mail_cache():
@@ -671,18 +734,15 @@ class UIComponents:
 
         # 실제 모델과 메일 리스트가 들어왔을 때
         if model_dict and messages and len(messages) > 0:
-            texts = []
+            mails = []
             for msg in messages:
-                subject = msg.get('subject', '') or ''
                 # 본문 필드명은 네 데이터 구조에 따라 맞춰줘!
                 body = msg.get('body', '') or msg.get('snippet', '') or msg.get('body_text', '') or ''
-                texts.append(subject + ' ' + body)
+                mails.append({'id': msg['id'], 'subject': msg.get('subject', ''), 'body_text': body})
 
             try:
-                X_vec = model_dict['vectorizer'].transform(texts)
-                probas = model_dict['classifier'].predict_proba(X_vec)
-                phishing_idx = list(model_dict['classifier'].classes_).index(1)
-                scores = probas[:, phishing_idx]
+                # 이미 점수를 매긴 메일은 저장된 점수 사용 (모델이 바뀌면 자동 재계산)
+                scores = phishing_model_registry.score_many_cached(mails, FEATURE_SOURCE_SNIPPET)
                 avg_score = float(np.mean(scores)) * 100  # %
                 total_count = len(messages)
             except Exception as e:
@@ -826,10 +886,20 @@ class UIComponents:
                                     # 결과를 친화적으로 포맷팅
                                     risk_level = "🔴 높음" if phishing_result['result'] == 'phishing' else "🟢 낮음"
                                     probability = phishing_result.get('probability', 0)
-                                    if probability:
+                                    if probability is not None:
                                         probability_percent = f"{probability * 100:.1f}%"
                                     else:
                                         probability_percent = "확률 계산 불가"
+                                    online_probability = phishing_result.get('online_probability')
+                                    online_percent = (
+                                        f"{online_probability * 100:.1f}%" if online_probability is not None
+                                        else "학습 데이터 부족 (삭제/피싱 아님 피드백 필요)"
+                                    )
+                                    
+                                    tier_label = (
+                                        f"사전 필터 ({phishing_result.get('decision_reason', '')})"
+                                        if phishing_result.get('tier') == 'prefilter' else "ML 모델"
+                                    )
                                     
                                     result = f"""
 **📊 피싱 위험도 분석 결과**
@@ -838,6 +908,8 @@ class UIComponents:
 **발신자:** {phishing_result['sender']}
 **위험도:** {risk_level}
 **피싱 확률:** {probability_percent}
+**사용자 피드백 모델 (보조):** {online_percent}
+**판정 단계:** {tier_label}
 
 **분석 결과:** {phishing_result['result'] == 'phishing' and '이 메일은 피싱 메일로 판별되었습니다.' or '이 메일은 정상 메일로 판별되었습니다.'}
 
@@ -965,6 +1037,8 @@ class UIComponents:
         """메일 목록 렌더링"""
         start_idx = st.session_state.mail_page * st.session_state.mail_page_size
         end_idx = min(start_idx + st.session_state.mail_page_size, len(messages))
+        
+        # 번호/삭제 버튼이 세션 목록(gmail_messages)의 인덱스와 일치하도록 전달받은 목록에서 슬라이싱
         current_messages = messages[start_idx:end_idx]
         
         for i, msg in enumerate(current_messages):
@@ -986,20 +1060,22 @@ class UIComponents:
             st.write(f"**📧 발신자:** {msg['sender']}")
             st.write(f"**📄 내용:** {msg['snippet']}")
             
-            # 삭제 버튼 추가
+            # 피싱 아님 피드백 / 삭제 버튼 추가
             col1, col2 = st.columns([3, 1])
+            with col1:
+                if st.button("✅ 피싱 아님", key=f"not_phishing_{msg['id']}"):
+                    from mail_utils import learn_from_feedback
+                    learn_from_feedback([msg], is_phishing=False)
+                    st.success("✅ 정상 메일로 학습했습니다.")
             with col2:
                 if st.button("🗑️ 삭제", key=f"delete_{msg['id']}"):
                     # 메일 삭제 처리
                     success = gmail_service.move_to_trash(msg['id'])
                     if success:
-                        # 삭제된 메일 ID를 세션에 추가
-                        if 'deleted_mail_ids' not in st.session_state:
-                            st.session_state.deleted_mail_ids = set()
-                        st.session_state.deleted_mail_ids.add(msg['id'])
-                        # 해당 메일의 캐시도 제거
-                        if cache_key in st.session_state:
-                            del st.session_state[cache_key]
+                        # 삭제한 메일로 온라인 모델을 갱신한 뒤 목록에서 숨기고 캐시도 제거
+                        from mail_utils import forget_mail_content, learn_from_feedback
+                        learn_from_feedback([msg], is_phishing=True)
+                        forget_mail_content(msg['id'])
                         st.success("✅ 메일이 삭제되었습니다!")
                         # 즉시 페이지 다시 렌더링
                         st.rerun()
@@ -1061,16 +1137,16 @@ class UIComponents:
         
         if has_html:
             tab1, tab2, tab3 = st.tabs(["🌐 HTML 보기", "📄 텍스트 보기", "📎 첨부파일"])
-            UIComponents._render_html_tab(tab1, full_content)
+            UIComponents._render_html_tab(tab1, full_content, msg_id)
             UIComponents._render_text_tab(tab2, full_content, msg_id, has_html)
-            UIComponents._render_attachments_tab(tab3, full_content)
+            UIComponents._render_attachments_tab(tab3, full_content, msg_id)
         else:
             tab1, tab2 = st.tabs(["📄 텍스트 보기", "📎 첨부파일"])
             UIComponents._render_text_tab(tab1, full_content, msg_id, has_html)
-            UIComponents._render_attachments_tab(tab2, full_content)
+            UIComponents._render_attachments_tab(tab2, full_content, msg_id)
 
     @staticmethod
-    def _render_html_tab(tab, full_content: Dict):
+    def _render_html_tab(tab, full_content: Dict, msg_id: str):
         """HTML 탭 렌더링"""
         with tab:
             st.markdown("**HTML 렌더링:**")
@@ -1080,7 +1156,8 @@ class UIComponents:
                     st.info("HTML 내용이 없습니다.")
                     return
                     
-                cleaned_html = email_parser.clean_html_content(html_content)
+                from mail_utils import get_sanitized_html
+                cleaned_html = get_sanitized_html(msg_id, full_content)
                 st.markdown("""
                 <style>
                 .email-scroll-container {
@@ -1102,7 +1179,7 @@ class UIComponents:
             except Exception as e:
                 st.error(f"HTML 렌더링 실패: {str(e)}")
                 st.info("텍스트 버전으로 표시합니다.")
-                text_content = email_parser.extract_text_from_html(full_content.get('body_html', ''))
+                text_content = email_parser.extract_text_from_html(full_content.get('body_html', ''), msg_id)
                 st.text_area("정리된 텍스트", text_content, height=300)
 
     @staticmethod
@@ -1114,37 +1191,60 @@ class UIComponents:
             if body_text:
                 st.text_area("텍스트 본문", body_text, height=300, key=f"text_{msg_id}")
             elif has_html:
-                text_content = email_parser.extract_text_from_html(full_content.get('body_html', ''))
+                text_content = email_parser.extract_text_from_html(full_content.get('body_html', ''), msg_id)
                 st.text_area("HTML에서 추출한 텍스트", text_content, height=300, key=f"extracted_{msg_id}")
             else:
                 st.info("텍스트 본문이 없습니다.")
 
     @staticmethod
-    def _render_attachments_tab(tab, full_content: Dict):
+    def _render_attachments_tab(tab, full_content: Dict, msg_id: str):
         """첨부파일 탭 렌더링"""
         with tab:
             attachments = full_content.get('attachments', [])
             if attachments:
                 st.markdown("**첨부파일 목록:**")
-                for attachment in attachments:
-                    UIComponents._render_attachment_item(attachment)
+                for i, attachment in enumerate(attachments):
+                    UIComponents._render_attachment_item(attachment, msg_id, i)
             else:
                 st.info("첨부파일이 없습니다.")
 
     @staticmethod
-    def _render_attachment_item(attachment: Dict):
-        """개별 첨부파일 렌더링"""
+    def _render_attachment_item(attachment: Dict, msg_id: str, position: int):
+        """개별 첨부파일 렌더링 (내용은 '불러오기'를 눌렀을 때만 디코딩)"""
         with st.expander(f"📎 {attachment['filename']} ({attachment['size']} bytes)"):
             st.write(f"**파일명:** {attachment['filename']}")
             st.write(f"**크기:** {attachment['size']} bytes")
             st.write(f"**타입:** {attachment['content_type']}")
             
+            # 불러온 내용(bytes 또는 임시 파일 경로)을 세션에 두어 재실행마다 다시 받지 않음
+            opened_key = f"attachment_opened_{msg_id}_{position}"
+            data = st.session_state.get(opened_key)
+            if data is None:
+                if not st.button("📂 첨부파일 불러오기", key=f"open_{msg_id}_{position}"):
+                    return
+                from mail_utils import load_attachment
+                with st.spinner("첨부파일을 불러오는 중..."):
+                    data = load_attachment(msg_id, attachment)
+                if data is None:
+                    return
+                st.session_state[opened_key] = data
+            
+            # 큰 첨부파일은 임시 파일 경로(str)로 전달됨 - st.image는 경로를 직접 사용
             if attachment['content_type'].startswith('image/'):
-                st.image(attachment['data'], caption=attachment['filename'])
+                st.image(data, caption=attachment['filename'])
+            elif isinstance(data, str):
+                with open(data, 'rb') as f:
+                    UIComponents._render_download_button(attachment, f, msg_id, position)
             else:
-                st.download_button(
-                    label=f"📥 {attachment['filename']} 다운로드",
-                    data=attachment['data'],
-                    file_name=attachment['filename'],
-                    mime=attachment['content_type']
-                )
+                UIComponents._render_download_button(attachment, data, msg_id, position)
+
+    @staticmethod
+    def _render_download_button(attachment: Dict, data, msg_id: str, position: int):
+        """첨부파일 다운로드 버튼"""
+        st.download_button(
+            label=f"📥 {attachment['filename']} 다운로드",
+            data=data,
+            file_name=attachment['filename'],
+            mime=attachment['content_type'],
+            key=f"download_{msg_id}_{position}"
+        )
@@ -1,66 +1,89 @@
-import re
-import pandas as pd
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+import os
+import sys
+import warnings
+from functools import lru_cache
 import joblib
+import numpy as np
+
+# 앱과 같은 특징 추출 모듈(deepmail/features.py)을 사용
+DEEPMAIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'deepmail')
+if DEEPMAIL_DIR not in sys.path:
+    sys.path.append(DEEPMAIL_DIR)
+from features import feature_extractor, clean_text, extract_urls, extract_domains, NUMERIC_FEATURES
+
+
+class PhishingPredictor:
+    """
+    TF-IDF 벡터라이저와 모델을 한 번만 로드해 두고 재사용하는 예측기입니다.
+    TF-IDF 희소 행렬에 수치 피처를 scipy.sparse.hstack으로 붙이므로
+    어휘 크기만큼의 dense 배열/DataFrame을 만들지 않습니다.
+    사용 예시: PhishingPredictor().predict([(subject, body), ...])
+    """
+
+    def __init__(self, tfidf_path='tfidf_vectorizer.joblib', model_path='phishing_Detecting_model.joblib', batch_size=256):
+        self.tfidf_vectorizer = joblib.load(tfidf_path)
+        self.model = joblib.load(model_path)
+        self.batch_size = batch_size
+
+        # 학습 시 컬럼 이름이 저장된 모델이면 피처 순서가 맞는지 한 번만 확인
+        expected = getattr(self.model, 'feature_names_in_', None)
+        if expected is not None:
+            columns = list(self.tfidf_vectorizer.get_feature_names_out()) + NUMERIC_FEATURES
+            if list(expected) != columns:
+                raise ValueError('모델의 피처 순서가 TF-IDF 어휘 + 수치 피처와 일치하지 않습니다.')
+
+    def transform(self, pairs):
+        """(subject, body) 목록을 CSR 피처 행렬로 변환"""
+        return self.transform_messages([{'subject': subject, 'body': body} for subject, body in pairs])
+
+    def transform_messages(self, messages):
+        """앱 메일 dict 목록을 CSR 피처 행렬로 변환 (특징은 메일별로 캐시됨)"""
+        features = feature_extractor.extract_many(messages)
+        return feature_extractor.tfidf_numeric_matrix(features, self.tfidf_vectorizer)
+
+    def predict_proba(self, pairs):
+        """(subject, body) 목록의 피싱 확률 배열 (batch_size 단위로 처리)"""
+        return self._predict_proba(pairs, self.transform)
+
+    def predict_proba_messages(self, messages):
+        """앱 메일 dict({'id', 'subject', 'body_text', 'body_html'}) 목록의 피싱 확률 배열"""
+        return self._predict_proba(messages, self.transform_messages)
+
+    def _predict_proba(self, items, transform):
+        probs = []
+        for start in range(0, len(items), self.batch_size):
+            X = transform(items[start:start + self.batch_size])
+            with warnings.catch_warnings():
+                # DataFrame으로 학습한 모델에 이름 없는 행렬을 넣을 때의 경고 (순서는 __init__에서 확인)
+                warnings.filterwarnings('ignore', message='X does not have valid feature names')
+                try:
+                    batch_probs = self.model.predict_proba(X)
+                except (TypeError, ValueError):
+                    # 희소 입력을 지원하지 않는 모델은 배치 단위로만 dense 변환
+                    batch_probs = self.model.predict_proba(X.toarray())
+            probs.append(batch_probs[:, 1])
+        return np.concatenate(probs) if probs else np.zeros(0)
+
+    def predict(self, pairs, threshold=0.5):
+        """
+        (subject, body) 목록을 받아 메일별 피싱 여부와 확률을 반환합니다.
+        반환값 예시: [{'label': 1, 'phishing_prob': 0.87}, ...]
+        """
+        probs = self.predict_proba(pairs)
+        return [{'label': int(prob > threshold), 'phishing_prob': float(prob)} for prob in probs]
+
+
+@lru_cache(maxsize=4)
+def get_predictor(tfidf_path='tfidf_vectorizer.joblib', model_path='phishing_Detecting_model.joblib'):
+    """경로별로 한 번만 만든 PhishingPredictor 반환"""
+    return PhishingPredictor(tfidf_path, model_path)
 
 def predict_phishing(subject, body, tfidf_path='tfidf_vectorizer.joblib', model_path='phishing_Detecting_model.joblib'):
     """
     제목(subject)과 본문(body) 문자열을 받아 피싱 여부와 확률을 반환합니다.
     반환값 예시: {'label': 1, 'phishing_prob': 0.87}
     """
-    # 데이터프레임 생성
-    df_new = pd.DataFrame([{'subject': subject, 'body': body}])
-
-    # 텍스트 전처리 함수
-    def clean_text(text):
-        if pd.isna(text):
-            return ''
-        text = BeautifulSoup(text, 'html.parser').get_text()
-        text = re.sub(r'[^a-zA-Z0-9가-힣\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip().lower()
-        return text
-
-    def extract_urls(text):
-        return re.findall(r'http[s]?://\S+', str(text))
-
-    def extract_domains(urls):
-        domains = []
-        for url in urls:
-            try:
-                domain = urlparse(url).netloc
-                if domain:
-                    domains.append(domain.lower())
-            except:
-                continue
-        return domains
-
-    # 피처 생성
-    df_new['clean_subject'] = df_new['subject'].apply(clean_text)
-    df_new['clean_body'] = df_new['body'].apply(clean_text)
-    df_new['subject_len'] = df_new['clean_subject'].apply(len)
-    df_new['body_len'] = df_new['clean_body'].apply(len)
-    df_new['extracted_urls'] = df_new['body'].apply(extract_urls)
-    df_new['num_urls'] = df_new['extracted_urls'].apply(len)
-    df_new['url_domains'] = df_new['extracted_urls'].apply(extract_domains)
-    df_new['num_unique_domains'] = df_new['url_domains'].apply(lambda x: len(set(x)))
-
-    # TF-IDF
-    tfidf_vectorizer = joblib.load(tfidf_path)
-    X_tfidf_new = tfidf_vectorizer.transform(df_new['clean_body'])
-    tfidf_df_new = pd.DataFrame(
-        X_tfidf_new.toarray(),
-        columns=tfidf_vectorizer.get_feature_names_out(),
-        index=df_new.index
-    )
-    num_feats_new = df_new[['subject_len', 'body_len', 'num_urls', 'num_unique_domains']].reset_index(drop=True)
-    X_final_new = pd.concat([tfidf_df_new, num_feats_new], axis=1)
-
-    # 모델 예측
-    model = joblib.load(model_path)
-    pred = model.predict(X_final_new)[0]
-    prob = model.predict_proba(X_final_new)[:, 1][0]
-    return {'label': int(pred), 'phishing_prob': float(prob)}
+    return get_predictor(tfidf_path, model_path).predict([(subject, body)])[0]
 
 def get_best_body_text(full_content, snippet=None):
     """
@@ -76,6 +99,7 @@ def get_best_body_text(full_content, snippet=None):
             body = snippet or ''
     return body
 
-full_content = UIComponents.get_mail_full_content(msg['id'])
-body = get_best_body_text(full_content, msg.get('snippet', ''))
-result = predict_phishing(full_content['subject'], body) 
\ No newline at end of file
+if __name__ == '__main__':
+    # 사용 예시 (같은 폴더에 tfidf_vectorizer.joblib, phishing_Detecting_model.joblib 필요)
+    result = predict_phishing('[긴급] 계정 확인 필요', '<p>아래 링크에서 로그인하세요 http://example.com/login</p>')
+    print(result)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 앱 모듈은 deepmail 폴더 기준의 평면 import를 사용
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'deepmail'))
@@ -0,0 +1,61 @@
+import email
+from email import policy
+from email.mime.application import MIMEApplication
+from email.mime.message import MIMEMessage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import pytest
+
+from gmail_service import EmailParser
+
+
+def _forwarded_mail(disposition):
+    """본문 + 첨부파일 + 전달된 메일(message/rfc822, 안쪽에도 첨부파일)로 이루어진 메일"""
+    inner = MIMEMultipart('mixed')
+    inner['Subject'] = 'inner'
+    inner['From'] = 'bank@example.com'
+    alternative = MIMEMultipart('alternative')
+    alternative.attach(MIMEText('forwarded text http://phish.example/login', 'plain', 'utf-8'))
+    alternative.attach(MIMEText('<p>forwarded <a href="http://phish.example/login">html</a></p>', 'html', 'utf-8'))
+    inner.attach(alternative)
+    inner_attachment = MIMEApplication(b'\x00inner' * 300, Name='inner.bin')
+    inner_attachment.add_header('Content-Disposition', 'attachment', filename='inner.bin')
+    inner.attach(inner_attachment)
+
+    outer = MIMEMultipart('mixed')
+    outer['Subject'] = 'Fwd: inner'
+    outer['From'] = 'user@example.com'
+    outer.attach(MIMEText('see below 안녕하세요', 'plain', 'utf-8'))
+    attachment = MIMEApplication(b'%PDF' * 500, Name='report.pdf')
+    attachment.add_header('Content-Disposition', 'attachment', filename='report.pdf')
+    outer.attach(attachment)
+    forwarded = MIMEMessage(inner)
+    if disposition:
+        forwarded.add_header('Content-Disposition', disposition, filename='inner.eml')
+    outer.attach(forwarded)
+    outer.attach(MIMEText('<p>outer html</p>', 'html', 'utf-8'))
+    return outer.as_bytes()
+
+
+@pytest.mark.parametrize('disposition', [None, 'inline', 'attachment'])
+def test_parse_capped_matches_parse_parts(disposition):
+    raw = _forwarded_mail(disposition)
+    expected = EmailParser.parse_parts(email.message_from_bytes(raw, policy=policy.default))
+
+    capped = EmailParser.parse_capped(raw, 100_000)
+
+    assert 'forwarded text' in expected['text']
+    assert capped['text'] == expected['text']
+    assert capped['html'] == expected['html']
+    assert capped['attachments'] == expected['attachments']
+
+
+def test_parse_capped_limits_forwarded_text_to_budget():
+    raw = _forwarded_mail('attachment')
+    full = EmailParser.parse_parts(email.message_from_bytes(raw, policy=policy.default))
+
+    capped = EmailParser.parse_capped(raw, 30)
+
+    assert len(capped['text']) + len(capped['html']) <= 30
+    assert full['text'].startswith(capped['text'])
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+from forest_engine import FlatForest, compile_forest
+
+
+def _sparse_data(n_rows, n_features, seed, density=0.05):
+    X = sparse.random(n_rows, n_features, density=density, format='csr', random_state=seed)
+    half = n_features // 2
+    y = (X[:, :half].sum(axis=1).A1 > X[:, half:].sum(axis=1).A1).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize('forest', [
+    RandomForestClassifier(n_estimators=30, random_state=0),
+    ExtraTreesClassifier(n_estimators=30, random_state=0),
+    RandomForestClassifier(n_estimators=30, class_weight='balanced', random_state=0),
+    RandomForestClassifier(n_estimators=30, class_weight={0: 1, 1: 5}, max_depth=6, random_state=0),
+], ids=['rf', 'extra_trees', 'rf_balanced', 'rf_weighted_shallow'])
+def test_predict_proba_matches_sklearn(forest):
+    X_train, y_train = _sparse_data(400, 300, seed=1)
+    forest.fit(X_train, y_train)
+    engine = FlatForest.from_sklearn(forest)
+
+    X_test, _ = _sparse_data(257, 300, seed=2)
+    np.testing.assert_allclose(engine.predict_proba(X_test), forest.predict_proba(X_test), atol=1e-9)
+    np.testing.assert_array_equal(engine.predict(X_test), forest.predict(X_test))
+    # 임계값 주변 입력으로 양쪽 분기를 모두 지나는 경우
+    assert engine.verify(forest, n_rows=128, seed=3) <= 1e-9
+
+
+def test_predict_proba_splits_large_batches():
+    X_train, y_train = _sparse_data(300, 200, seed=4)
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X_train, y_train)
+    engine = FlatForest.from_sklearn(forest)
+    engine.max_cells = 1000
+
+    X_test, _ = _sparse_data(500, 200, seed=5)
+    np.testing.assert_allclose(engine.predict_proba(X_test), forest.predict_proba(X_test), atol=1e-9)
+
+
+def test_single_row_and_dense_input():
+    X_train, y_train = _sparse_data(300, 100, seed=6)
+    forest = RandomForestClassifier(n_estimators=10, random_state=0).fit(X_train, y_train)
+    engine = FlatForest.from_sklearn(forest)
+
+    X_test, _ = _sparse_data(5, 100, seed=7)
+    np.testing.assert_allclose(engine.predict_proba(X_test[:1]), forest.predict_proba(X_test[:1]), atol=1e-9)
+    np.testing.assert_allclose(engine.predict_proba(X_test.toarray()), forest.predict_proba(X_test), atol=1e-9)
+
+
+def test_compile_forest_ignores_non_forests():
+    assert compile_forest(object()) is None
@@ -0,0 +1,144 @@
+import base64
+import io
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+import gmail_service as gmail_module
+from gmail_service import GmailService
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append(request_id)
+
+    def execute(self):
+        for message_id in self.requests:
+            self.service.calls.append(message_id)
+            if message_id in self.service.rate_limited:
+                error = HttpError(httplib2.Response({'status': 429}), b'{"error": {"code": 429}}')
+                self.callback(message_id, None, error)
+            else:
+                raw = base64.urlsafe_b64encode(f"Subject: {message_id}\r\n\r\nbody".encode()).decode()
+                self.callback(message_id, {'id': message_id, 'raw': raw}, None)
+
+
+class FakeGmailApi:
+    """messages().get 배치 요청만 흉내 내는 Gmail API"""
+
+    def __init__(self, rate_limited):
+        self.rate_limited = set(rate_limited)
+        self.calls = []
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, **kwargs):
+        return kwargs
+
+
+def test_get_raw_messages_reports_ids_still_rate_limited(monkeypatch):
+    monkeypatch.setitem(gmail_module.RATE_LIMIT_CONFIG, 'backoff_seconds', 0.0)
+    backoffs = []
+    monkeypatch.setattr(gmail_module.gmail_rate_limiter, 'backoff', backoffs.append)
+    api = FakeGmailApi(rate_limited=['bad'])
+    service = GmailService()
+    service.service = api
+
+    messages, errors = service.get_raw_messages(['ok1', 'bad', 'ok2'], as_bytes=True)
+
+    assert set(messages) == {'ok1', 'ok2'}
+    assert set(errors) == {'bad'}
+    max_retries = gmail_module.RATE_LIMIT_CONFIG['max_retries']
+    assert api.calls.count('bad') == max_retries
+    # 마지막 시도 뒤에는 재시도가 없으므로 대기하지 않음
+    assert len(backoffs) == max_retries - 1
+
+
+def test_get_raw_messages_reports_worker_waits_to_caller(monkeypatch):
+    monkeypatch.setitem(gmail_module.MAIL_CONFIG, 'batch_size', 1)
+    monkeypatch.setattr(gmail_module.gmail_rate_limiter, 'acquire', lambda method, count=1: 0.25)
+    service = GmailService()
+    service.service = FakeGmailApi(rate_limited=[])
+
+    service.get_raw_messages(['a', 'b', 'c', 'd'], as_bytes=True)
+
+    # 배치 4개를 워커 스레드에서 나눠 실행해도 호출한 스레드에서 대기 합계를 볼 수 있음
+    assert gmail_module.gmail_rate_limiter.last_wait == 1.0
+
+
+class FakeHttp:
+    def __init__(self, content):
+        self.content = content
+
+    def request(self, uri, method='GET', **kwargs):
+        return httplib2.Response({'status': 200, 'content-length': str(len(self.content))}), self.content
+
+
+class FakeRequest:
+    def __init__(self, content):
+        self.uri = 'https://gmail.googleapis.com/attachments/att1?fields=data'
+        self.headers = {}
+        self.http = FakeHttp(content)
+
+
+class FakeAttachmentApi:
+    """format=full 파트 트리와 attachments().get 응답만 흉내 내는 Gmail API"""
+
+    def __init__(self, payload, content):
+        self.payload = payload
+        self.content = content
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def attachments(self):
+        return self
+
+    def get(self, **kwargs):
+        if 'messageId' in kwargs:
+            return FakeRequest(self.content)
+        return self
+
+    def execute(self):
+        return {'payload': self.payload}
+
+
+def test_download_attachment_decodes_response_file(monkeypatch):
+    monkeypatch.setattr(gmail_module.gmail_rate_limiter, 'acquire', lambda method, count=1: 0.0)
+    data = bytes(range(256)) * 41
+    encoded = base64.urlsafe_b64encode(data).rstrip(b'=')
+    payload = {'partId': '', 'parts': [{'partId': '1', 'body': {'attachmentId': 'att1', 'size': len(data)}}]}
+    service = GmailService()
+    service.service = FakeAttachmentApi(payload, b'{\n  "data": "' + encoded + b'"\n}\n')
+
+    out = io.BytesIO()
+    assert service.download_attachment('m1', [1], out)
+    assert out.getvalue() == data
+    assert not service.download_attachment('m1', [2], io.BytesIO())
+
+
+def test_write_base64url_stream_matches_string_decoder():
+    data = bytes(range(256)) * 3 + b'tail'
+    encoded = base64.urlsafe_b64encode(data).rstrip(b'=')
+    expected = io.BytesIO()
+    gmail_module.EmailParser.write_base64url(encoded.decode(), expected)
+
+    # 청크 경계가 4글자 단위와 어긋나도 같은 결과
+    out = io.BytesIO()
+    gmail_module.EmailParser.write_base64url_stream(io.BytesIO(encoded + b'"\n}'), out, chunk_bytes=7)
+    assert out.getvalue() == expected.getvalue() == data